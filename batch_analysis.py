@@ -0,0 +1,324 @@
+"""
+Analyse d'émotions hors ligne de fichiers vidéo, sur tous les cœurs
+
+Chaque vidéo est découpée en segments de frames consécutives (par défaut
+20 s) répartis sur un pool de processus. Chaque processus charge une fois
+le classifieur NumPy et sa réduction, puis, pour chaque segment, décode
+les frames avec OpenCV, les passe dans un graphe MediaPipe Holistic propre
+au segment (suivi temporel sur des frames consécutives) et le classifieur.
+
+Sorties, dans le dossier `--out` :
+- `{video}.frames.{csv|parquet|npz}` : une ligne par frame analysée
+  (frame, temps, émotion, confiance, probabilité de chaque classe) ;
+- `{video}.seconds.csv` : une ligne par seconde (frames, visages
+  détectés, émotion majoritaire, confiance et probabilités moyennes) ;
+- `summary.json` : répartition des émotions par vidéo, émotion dominante,
+  débit (frames/s) et vitesse par rapport au temps réel.
+
+Les frames sont mises en miroir comme dans l'application (`--no-mirror`
+pour des vidéos déjà en miroir).
+
+Usage :
+    python batch_analysis.py session1.mp4 [session2.mp4 ...] [--out analysis]
+                             [--workers N] [--every 1] [--segment 20]
+                             [--format csv|parquet|npz] [--model model.npz]
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from holistic_pool import default_workers
+from numpy_model import NPZ_PATH
+from reduction import REDUCTION_PATH
+
+FORMATS = ("csv", "parquet", "npz")
+
+# État de chaque processus du pool, initialisé une seule fois
+_worker = {}
+
+
+def _init_worker(model_path, reduction_path, labels_path, options):
+    from numpy_model import NumpyModel
+    from reduction import FeatureReducer
+
+    _worker["model"] = NumpyModel.load(model_path)
+    _worker["reducer"] = FeatureReducer.load(reduction_path) if os.path.exists(reduction_path) else FeatureReducer()
+    _worker["n_classes"] = len(np.load(labels_path))
+    _worker["options"] = options
+
+
+def _analyze_segment(path, start, stop, every, mirror):
+    """Analyse les frames [start, stop) d'une vidéo ; retourne des colonnes NumPy."""
+    import cv2
+    import mediapipe
+
+    from features import N_FEATURES, extract_features
+
+    model, reducer = _worker["model"], _worker["reducer"]
+    cap = cv2.VideoCapture(path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    holis = mediapipe.solutions.holistic.Holistic(**_worker["options"])
+    buf = np.empty(N_FEATURES, dtype=np.float32)
+
+    frames, probs = [], []
+    began = time.perf_counter()
+    index = start
+    while stop is None or index < stop:
+        if (index - start) % every:
+            # Frame ignorée : avancer sans décoder l'image
+            if not cap.grab():
+                break
+            index += 1
+            continue
+        ok, frm = cap.read()
+        if not ok:
+            break
+        if mirror:
+            frm = cv2.flip(frm, 1)
+        res = holis.process(cv2.cvtColor(frm, cv2.COLOR_BGR2RGB))
+        features = extract_features(res, out=buf)
+        frames.append(index)
+        if features is None:
+            probs.append(np.full(_worker["n_classes"], np.nan, dtype=np.float32))
+        else:
+            probs.append(model.predict(reducer.transform(features))[0])
+        index += 1
+    holis.close()
+    cap.release()
+
+    probs = np.array(probs, dtype=np.float32).reshape(-1, _worker["n_classes"])
+    return {
+        "frame": np.array(frames, dtype=np.int64),
+        "probs": probs,
+        "seconds": time.perf_counter() - began,
+    }
+
+
+def video_info(path):
+    """(fps, nombre de frames) ; nombre de frames None s'il est inconnu."""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Impossible d'ouvrir la vidéo {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return fps, (count if count > 0 else None)
+
+
+def segments(count, fps, seconds):
+    """Découpe [0, count) en segments de `seconds` secondes."""
+    if count is None:
+        return [(0, None)]
+    size = max(1, int(round(fps * seconds)))
+    return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+
+def frame_table(parts, fps, labels):
+    """Assemble les segments d'une vidéo en colonnes triées par frame."""
+    frame = np.concatenate([p["frame"] for p in parts]) if parts else np.empty(0, dtype=np.int64)
+    probs = np.concatenate([p["probs"] for p in parts]) if parts else np.empty((0, len(labels)), np.float32)
+    order = np.argsort(frame, kind="stable")
+    frame, probs = frame[order], probs[order]
+
+    face = ~np.isnan(probs[:, 0]) if len(probs) else np.zeros(0, dtype=bool)
+    best = np.where(face, np.nan_to_num(probs, nan=-1.0).argmax(axis=1), -1)
+    confidence = np.where(face, np.nan_to_num(probs).max(axis=1), np.nan)
+    return {
+        "frame": frame,
+        "time": frame / fps,
+        "emotion": best,
+        "confidence": confidence.astype(np.float32),
+        "probs": probs,
+    }
+
+
+def second_table(table, n_classes):
+    """Agrège la table des frames par seconde de vidéo."""
+    second = np.floor(table["time"]).astype(np.int64)
+    face = table["emotion"] >= 0
+    n = int(second.max()) + 1 if len(second) else 0
+
+    frames = np.bincount(second, minlength=n)
+    faces = np.bincount(second[face], minlength=n)
+    votes = np.zeros((n, n_classes), dtype=np.int64)
+    np.add.at(votes, (second[face], table["emotion"][face]), 1)
+    prob_sum = np.zeros((n, n_classes), dtype=np.float64)
+    np.add.at(prob_sum, second[face], table["probs"][face])
+    conf_sum = np.bincount(second[face], weights=table["confidence"][face], minlength=n)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "second": np.arange(n),
+            "frames": frames,
+            "faces": faces,
+            "emotion": np.where(faces > 0, votes.argmax(axis=1), -1),
+            "confidence": conf_sum / faces,
+            "probs": prob_sum / faces[:, None],
+        }
+
+
+def _rows(table, labels):
+    """Lignes CSV : les probabilités sont éclatées en une colonne par classe."""
+    columns = [k for k in table if k != "probs"]
+    header = columns + [f"p_{label}" for label in labels]
+    names = np.array(list(labels) + [""])  # indice -1 : aucun visage
+    rows = []
+    for i in range(len(table[columns[0]])):
+        row = []
+        for k in columns:
+            value = table[k][i]
+            row.append(names[value] if k == "emotion" else _fmt(value))
+        row.extend(_fmt(p) for p in table["probs"][i])
+        rows.append(row)
+    return header, rows
+
+
+def _fmt(value):
+    if isinstance(value, (float, np.floating)):
+        return "" if np.isnan(value) else f"{value:.4f}"
+    return int(value)
+
+
+def write_csv(path, table, labels):
+    header, rows = _rows(table, labels)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+
+def write_columns(path, table, labels, fmt):
+    """Table des frames en colonnes : Parquet (pyarrow) ou npz."""
+    columns = {k: v for k, v in table.items() if k != "probs"}
+    columns["emotion_label"] = np.array(list(labels) + [""])[table["emotion"]]
+    for j, label in enumerate(labels):
+        columns[f"p_{label}"] = table["probs"][:, j]
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_table(pa.table(columns), path)
+    else:
+        np.savez_compressed(path, **columns)
+    return path
+
+
+def summarize(table, labels, fps, seconds):
+    face = table["emotion"] >= 0
+    counts = np.bincount(table["emotion"][face], minlength=len(labels))
+    duration = float(table["frame"][-1] + 1) / fps if len(table["frame"]) else 0.0
+    return {
+        "fps": fps,
+        "duration": duration,
+        "frames": int(len(table["frame"])),
+        "face_rate": float(face.mean()) if len(face) else 0.0,
+        "distribution": {
+            label: float(c / face.sum()) if face.sum() else 0.0 for label, c in zip(labels, counts)
+        },
+        "dominant": labels[int(counts.argmax())] if face.any() else None,
+        "mean_confidence": float(np.nanmean(table["confidence"])) if face.any() else None,
+        "cpu_seconds": seconds,
+    }
+
+
+def analyze(videos, out="analysis", workers=None, every=1, segment=20.0, fmt="csv",
+            model_path=NPZ_PATH, reduction_path=REDUCTION_PATH, labels_path="labels.npy",
+            mirror=True, **options):
+    """Analyse une liste de vidéos ; retourne le résumé global (aussi écrit dans summary.json)."""
+    os.makedirs(out, exist_ok=True)
+    labels = [str(label) for label in np.load(labels_path)]
+    workers = workers or default_workers()
+
+    info = {path: video_info(path) for path in videos}
+    tasks = [
+        (path, start, stop)
+        for path, (fps, count) in info.items()
+        for start, stop in segments(count, fps, segment)
+    ]
+
+    began = time.perf_counter()
+    parts = {path: [] for path in videos}
+    # Contexte spawn, comme holistic_pool : MediaPipe ne supporte pas fork
+    with ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"), initializer=_init_worker,
+                             initargs=(model_path, reduction_path, labels_path, options)) as pool:
+        futures = {pool.submit(_analyze_segment, path, start, stop, every, mirror): path
+                   for path, start, stop in tasks}
+        for done, future in enumerate(as_completed(futures), 1):
+            parts[futures[future]].append(future.result())
+            print(f"\rsegments: {done}/{len(tasks)}", end="", flush=True)
+    print()
+    elapsed = time.perf_counter() - began
+
+    summary = {"workers": workers, "every": every, "seconds": elapsed, "videos": {}}
+    for path in videos:
+        fps = info[path][0]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        table = frame_table(parts[path], fps, labels)
+        if fmt == "csv":
+            write_csv(os.path.join(out, f"{stem}.frames.csv"), table, labels)
+        else:
+            write_columns(os.path.join(out, f"{stem}.frames.{fmt}"), table, labels, fmt)
+        write_csv(os.path.join(out, f"{stem}.seconds.csv"), second_table(table, len(labels)), labels)
+        summary["videos"][path] = summarize(table, labels, fps, sum(p["seconds"] for p in parts[path]))
+
+    frames = sum(v["frames"] for v in summary["videos"].values())
+    duration = sum(v["duration"] for v in summary["videos"].values())
+    summary["frames_per_second"] = frames / elapsed if elapsed else 0.0
+    summary["realtime_factor"] = duration / elapsed if elapsed else 0.0
+    with open(os.path.join(out, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def print_summary(summary):
+    print("vidéo                          | durée s | frames | visages | dominante | répartition")
+    for path, v in summary["videos"].items():
+        distribution = " ".join(f"{k}:{p:.0%}" for k, p in v["distribution"].items() if p)
+        print(
+            f"{os.path.basename(path)[:30]:30s} | {v['duration']:7.1f} | {v['frames']:6d} | "
+            f"{v['face_rate']:7.0%} | {str(v['dominant']):9s} | {distribution}"
+        )
+    print(
+        f"{summary['workers']} workers : {summary['seconds']:.1f} s, "
+        f"{summary['frames_per_second']:.1f} frames/s, x{summary['realtime_factor']:.1f} temps réel"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse d'émotions hors ligne de fichiers vidéo")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--out", default="analysis")
+    parser.add_argument("--workers", type=int, default=None, help="défaut : HOLISTIC_WORKERS ou nb de cœurs")
+    parser.add_argument("--every", type=int, default=1, help="analyser une frame sur N")
+    parser.add_argument("--segment", type=float, default=20.0, help="durée d'un segment (s)")
+    parser.add_argument("--format", choices=FORMATS, default="csv", help="format de la table des frames")
+    parser.add_argument("--model", default=NPZ_PATH)
+    parser.add_argument("--reduction", default=REDUCTION_PATH)
+    parser.add_argument("--labels", default="labels.npy")
+    parser.add_argument("--no-mirror", action="store_true")
+    parser.add_argument("--model-complexity", type=int, choices=(0, 1, 2), default=1)
+    args = parser.parse_args(argv)
+
+    summary = analyze(
+        args.videos, args.out, args.workers, args.every, args.segment, args.format,
+        args.model, args.reduction, args.labels, mirror=not args.no_mirror,
+        model_complexity=args.model_complexity,
+    )
+    print_summary(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
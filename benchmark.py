@@ -0,0 +1,371 @@
+"""
+Benchmark par étape du pipeline vidéo et de l'entraînement
+
+Rejoue des frames et des résultats Holistic (fixture enregistrée avec
+`python fixtures.py record`, ou fixtures synthétiques par défaut, sans
+caméra) à travers chaque étape de `EmotionProcessor.recv` puis à travers
+le pipeline complet, et mesure p50/p95/p99 et frames/s pour chacune :
+
+    to_ndarray, flip, bgr2rgb, holistic et holistic.roi (--holistic), features, reduce,
+    predict, publish, np.save (ancienne écriture d'emotion.npy), draw,
+    from_ndarray, pipeline.sync (recv sans worker), pipeline.infer,
+    pipeline.recv
+
+Les étapes d'entraînement (chargement de `load_dataset`, époque de
+`batch_generator`, prédiction par lots, `model.fit` Keras) sont mesurées
+sur un dataset synthétique, en lignes/s.
+
+Une étape dont la dépendance n'est pas installée (av, cv2, mediapipe,
+keras) est ignorée.
+
+Usage :
+    python benchmark.py [--fixture fixture.npz] [--frames 60] [--repeat 5] [--runs 3]
+                        [--holistic] [--no-training] [--train-rows 20000]
+                        [--only features predict ...]
+                        [--save-baseline] [--check] [--baseline bench_baseline.json]
+                        [--threshold 1.25] [--tolerance-ms 0.05] [--tolerance-rows-ms 1.0]
+
+Chaque mesure est refaite `--runs` fois et le rapport garde, par étape,
+la meilleure de ces passes (les interruptions de la machine ne font que
+ralentir une mesure). `--check` compare p50 et p95 à la baseline et sort avec le
+code 1 si une étape est plus lente que `threshold` fois sa valeur de
+référence et d'au moins `tolerance-ms` par frame (`tolerance-rows-ms` par
+millier de lignes pour l'entraînement) : les étapes de quelques
+microsecondes ne font pas échouer le contrôle sur du bruit de mesure.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from emotion_state import EmotionState
+from features import N_FEATURES, extract_features, synthetic_result
+from numpy_model import NPZ_PATH, NumpyModel
+from reduction import REDUCTION_PATH, FeatureReducer
+
+BASELINE_PATH = "bench_baseline.json"
+DEFAULT_LABELS = ["angry", "happy", "neutral", "sad", "surprise"]
+
+
+def _optional(name):
+    """Importe un module optionnel ; None s'il n'est pas installé."""
+    try:
+        return __import__(name)
+    except ImportError:
+        return None
+
+
+def summarize(samples, unit="frames"):
+    """p50/p95/p99 (ms) et débit d'une liste de durées (s) par élément."""
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    mean = ms.mean()
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "per_s": float(1000.0 / mean) if mean > 0 else float("inf"),
+        "unit": unit,
+        "n": len(ms),
+    }
+
+
+def time_stage(fn, n, repeat=5, warmup=3):
+    """Durée (s) de chaque appel `fn(i)`, pour i parcourant les n frames `repeat` fois."""
+    for i in range(min(warmup, n)):
+        fn(i)
+    samples = []
+    clock = time.perf_counter
+    for _ in range(repeat):
+        for i in range(n):
+            start = clock()
+            fn(i)
+            samples.append(clock() - start)
+    return samples
+
+
+def load_inputs(fixture=None, n_frames=60, size=(480, 640)):
+    """Frames BGR et résultats Holistic : fixture enregistrée ou synthétiques (hauteur, largeur)."""
+    from fixtures import load_fixture, synthetic_frames, synthetic_results
+
+    if fixture:
+        return load_fixture(fixture)
+    frames = synthetic_frames(n_frames, *size)
+    if _optional("mediapipe") is not None:
+        return frames, synthetic_results(n_frames)
+    # Sans MediaPipe : landmarks factices, suffisants pour extract_features
+    return frames, [synthetic_result(seed=i) for i in range(n_frames)]
+
+
+def load_classifier():
+    """Modèle, labels et réduction de l'application, ou un modèle aléatoire de même forme."""
+    reducer = FeatureReducer.load(REDUCTION_PATH) if os.path.exists(REDUCTION_PATH) else FeatureReducer()
+    label = list(np.load("labels.npy")) if os.path.exists("labels.npy") else DEFAULT_LABELS
+    if os.path.exists(NPZ_PATH):
+        return NumpyModel.load(NPZ_PATH), label, reducer
+
+    rng = np.random.default_rng(0)
+    dims = [reducer.output_dim, 512, 256, len(label)]
+    weights = [rng.normal(scale=0.05, size=(a, b)).astype(np.float32) for a, b in zip(dims, dims[1:])]
+    biases = [np.zeros(b, dtype=np.float32) for b in dims[1:]]
+    return NumpyModel(weights, biases, ["relu", "relu", "softmax"]), label, reducer
+
+
+def video_stages(frames, results, use_holistic=False):
+    """
+    Retourne (n, étapes, nettoyages) : une liste de (nom, fn(i)) pour chaque
+    étape du traitement d'une frame, et les fonctions à appeler ensuite.
+    """
+    av, cv2, mp = _optional("av"), _optional("cv2"), _optional("mediapipe")
+    model, label, reducer = load_classifier()
+    n = len(frames)
+    stages = []
+    cleanups = []
+
+    buf = np.empty(N_FEATURES, dtype=np.float32)
+    feats = [extract_features(r) for r in results]
+    feats = [f if f is not None else np.zeros(N_FEATURES, dtype=np.float32) for f in feats]
+    reduced = [reducer.transform(f) for f in feats]
+    state = EmotionState()
+    tmp = tempfile.TemporaryDirectory()
+    cleanups.append(tmp.cleanup)
+    legacy_path = os.path.join(tmp.name, "emotion.npy")
+
+    if av is not None:
+        vframes = [av.VideoFrame.from_ndarray(f, format="bgr24") for f in frames]
+        stages.append(("to_ndarray", lambda i: vframes[i].to_ndarray(format="bgr24")))
+    if cv2 is not None:
+        flipped = [cv2.flip(f, 1) for f in frames]
+        rgb = [cv2.cvtColor(f, cv2.COLOR_BGR2RGB) for f in flipped]
+        stages.append(("flip", lambda i: cv2.flip(frames[i], 1)))
+        stages.append(("bgr2rgb", lambda i: cv2.cvtColor(flipped[i], cv2.COLOR_BGR2RGB)))
+        if use_holistic and mp is not None:
+            holis = mp.solutions.holistic.Holistic()
+            cleanups.append(holis.close)
+            stages.append(("holistic", lambda i: holis.process(rgb[i])))
+            # Même détection, recadrée sur le visage et réduite (roi.py)
+            from roi import RoiTracker
+
+            tracker = RoiTracker(mp.solutions.holistic.Holistic())
+            cleanups.append(tracker.detector.close)
+            stages.append(("holistic.roi", lambda i: tracker.process(rgb[i])))
+
+    stages.append(("features", lambda i: extract_features(results[i], out=buf)))
+    stages.append(("reduce", lambda i: reducer.transform(feats[i])))
+    stages.append(("predict", lambda i: model.predict(reduced[i])))
+    stages.append(("publish", lambda i: state.publish(label[i % len(label)], 0.9)))
+    # Ancienne écriture de l'émotion sur disque à chaque frame
+    stages.append(("np.save (ancien)", lambda i: np.save(legacy_path, np.array([label[i % len(label)]]))))
+
+    if av is not None and cv2 is not None and mp is not None:
+        from fixtures import ReplayHolistic
+        from processor import EmotionProcessor, draw_landmarks
+
+        canvas = [f.copy() for f in flipped]
+        stages.append(("draw", lambda i: draw_landmarks(canvas[i], results[i])))
+        stages.append(("from_ndarray", lambda i: av.VideoFrame.from_ndarray(canvas[i], format="bgr24")))
+
+        # recv synchrone (sans worker), comme avant le thread d'inférence
+        sync = EmotionProcessor(EmotionState(), ReplayHolistic(results), model, label, reducer)
+        sync.worker.stop()
+        cleanups.append(sync.on_ended)
+
+        def sync_recv(i):
+            frm = cv2.flip(vframes[i].to_ndarray(format="bgr24"), 1)
+            res, pred = sync.infer(cv2.cvtColor(frm, cv2.COLOR_BGR2RGB))
+            if pred is not None:
+                cv2.putText(frm, f"Emotion: {pred}", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+            draw_landmarks(frm, res)
+            return av.VideoFrame.from_ndarray(frm, format="bgr24")
+
+        stages.append(("pipeline.sync", sync_recv))
+        stages.append(("pipeline.infer", lambda i: sync.infer(rgb[i])))
+
+        # recv réel : inférence confiée au worker, chaque frame soumise
+        proc = EmotionProcessor(EmotionState(), ReplayHolistic(results), model, label, reducer)
+        proc.scheduler.every_n = 1
+        stages.append(("pipeline.recv", lambda i: proc.recv(vframes[i])))
+        cleanups.append(proc.on_ended)
+    return n, stages, cleanups
+
+
+def run_video(args):
+    frames, results = load_inputs(args.fixture, args.frames)
+    n, stages, cleanups = video_stages(frames, results, args.holistic)
+    report = {}
+    for name, fn in stages:
+        if args.only and not any(name.startswith(p) for p in args.only):
+            continue
+        report[name] = summarize(time_stage(fn, n, args.repeat))
+    for cleanup in cleanups:
+        cleanup()
+    return report
+
+
+def _write_dataset(directory, rows, n_classes=5, n_features=N_FEATURES, seed=0):
+    from dataset_store import DatasetStore
+    from data_loader import discover_manifest
+
+    rng = np.random.default_rng(seed)
+    for k in range(n_classes):
+        with DatasetStore(os.path.join(directory, f"class{k}.npy"), chunk_rows=4096) as store:
+            for row in rng.random((rows // n_classes, n_features), dtype=np.float32):
+                store.append(row)
+    return discover_manifest(directory)
+
+
+def run_training(args):
+    """Débit (lignes/s) du chargement, des lots, de la prédiction et de l'entraînement."""
+    from data_loader import batch_generator, load_dataset, steps_per_epoch
+
+    report = {}
+    wanted = lambda name: not args.only or any(name.startswith(p) for p in args.only)
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = _write_dataset(directory, args.train_rows)
+        X, y, labels = load_dataset(manifest, directory)
+        rows = len(X)
+
+        def per_row(fn):
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                fn()
+                samples.append((time.perf_counter() - start) / rows)
+            return summarize(samples, unit="lignes")
+
+        if wanted("train.load"):
+            report["train.load"] = per_row(lambda: load_dataset(manifest, directory))
+        if wanted("train.batches"):
+            report["train.batches"] = per_row(
+                lambda: sum(1 for _ in batch_generator(X, y, len(labels), batch_size=32, epochs=1)))
+        if wanted("train.predict"):
+            model, _, _ = load_classifier()
+            if model.input_dim == N_FEATURES:
+                report["train.predict"] = per_row(
+                    lambda: [model.predict(X[s:s + 256]) for s in range(0, rows, 256)])
+
+        if wanted("train.fit") and _optional("keras") is not None:
+            from keras.layers import Dense, Input
+            from keras.models import Model
+
+            ip = Input(shape=(X.shape[1],))
+            m = Dense(512, activation="relu")(ip)
+            m = Dense(256, activation="relu")(m)
+            op = Dense(len(labels), activation="softmax")(m)
+            keras_model = Model(inputs=ip, outputs=op)
+            keras_model.compile(optimizer="rmsprop", loss="categorical_crossentropy", metrics=["acc"])
+            batches = batch_generator(X, y, len(labels), batch_size=32)
+            steps = steps_per_epoch(rows, 32)
+            # Première époque : compilation du graphe, non mesurée
+            keras_model.fit(batches, steps_per_epoch=steps, epochs=1, verbose=0)
+            report["train.fit"] = per_row(
+                lambda: keras_model.fit(batches, steps_per_epoch=steps, epochs=1, verbose=0))
+            batches.close()
+    return report
+
+
+def merge_runs(reports):
+    """Meilleure passe, étape par étape : minimum des durées, maximum du débit."""
+    merged = {}
+    for name, first in reports[0].items():
+        runs = [r[name] for r in reports if name in r]
+        merged[name] = dict(first, **{
+            key: float(min(r[key] for r in runs)) for key in ("p50_ms", "p95_ms", "p99_ms")
+        }, per_s=float(max(r["per_s"] for r in runs)), runs=len(runs))
+    return merged
+
+
+def print_report(report):
+    print(f"{'étape':18s} | {'p50 ms':>9s} | {'p95 ms':>9s} | {'p99 ms':>9s} | débit")
+    for name, s in report.items():
+        print(
+            f"{name:18s} | {s['p50_ms']:9.3f} | {s['p95_ms']:9.3f} | {s['p99_ms']:9.3f} | "
+            f"{s['per_s']:,.0f} {s['unit']}/s"
+        )
+
+
+def save_baseline(report, path=BASELINE_PATH):
+    with open(path, "w") as f:
+        json.dump({
+            "machine": platform.platform(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "created": time.time(),
+            "stages": report,
+        }, f, indent=2)
+    return path
+
+
+def check_regressions(report, path=BASELINE_PATH, threshold=1.25, tolerance_ms=0.05,
+                      tolerance_rows_ms=1.0):
+    """
+    Étapes dont p50 ou p95 dépasse `threshold` fois la baseline et d'au
+    moins `tolerance_ms` par frame (`tolerance_rows_ms` par millier de lignes).
+    """
+    with open(path) as f:
+        baseline = json.load(f)["stages"]
+    regressions = []
+    for name, s in report.items():
+        ref = baseline.get(name)
+        if ref is None:
+            continue
+        if s.get("unit") == "lignes":
+            scale, tolerance = 1000.0, tolerance_rows_ms
+        else:
+            scale, tolerance = 1.0, tolerance_ms
+        for key in ("p50_ms", "p95_ms"):
+            slower = ref[key] > 0 and s[key] > threshold * ref[key]
+            if slower and (s[key] - ref[key]) * scale >= tolerance:
+                regressions.append((name, key, ref[key], s[key]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark par étape du pipeline d'émotions")
+    parser.add_argument("--fixture", help="fixture enregistrée (python fixtures.py record)")
+    parser.add_argument("--frames", type=int, default=60, help="frames synthétiques sans fixture")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=3, help="passes complètes, meilleure gardée")
+    parser.add_argument("--holistic", action="store_true", help="mesurer aussi MediaPipe Holistic")
+    parser.add_argument("--no-training", action="store_true")
+    parser.add_argument("--train-rows", type=int, default=20000)
+    parser.add_argument("--only", nargs="*", help="préfixes des étapes à mesurer")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--tolerance-ms", type=float, default=0.05,
+                        help="écart absolu ignoré par frame")
+    parser.add_argument("--tolerance-rows-ms", type=float, default=1.0,
+                        help="écart absolu ignoré par millier de lignes (entraînement)")
+    args = parser.parse_args(argv)
+
+    reports = []
+    for _ in range(max(1, args.runs)):
+        report = run_video(args)
+        if not args.no_training:
+            report.update(run_training(args))
+        reports.append(report)
+    report = merge_runs(reports)
+    print_report(report)
+
+    if args.save_baseline:
+        print(f"Baseline enregistrée dans {save_baseline(report, args.baseline)}")
+    if args.check:
+        regressions = check_regressions(report, args.baseline, args.threshold, args.tolerance_ms,
+                                        args.tolerance_rows_ms)
+        for name, key, ref, got in regressions:
+            print(f"RÉGRESSION {name} {key}: {ref:.3f} -> {got:.3f} ms (x{got / ref:.2f})")
+        if regressions:
+            return 1
+        print(f"Aucune régression (seuil x{args.threshold}, tolérance {args.tolerance_ms} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
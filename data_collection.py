@@ -1,14 +1,38 @@
-
 """
 Collecte de données de landmarks (visage et mains) avec MediaPipe
 
-Ce script ouvre la caméra, extrait les landmarks du visage et des mains,
-et enregistre des vecteurs de features relatifs dans un fichier NumPy.
+Ce script ouvre la caméra (ou une vidéo), extrait les landmarks du visage
+et des mains, et enregistre des vecteurs de features relatifs dans un
+fichier NumPy.
 
 Usage:
 1. Lancez le script.
 2. Entrez un nom pour le fichier de sortie (ex: "happy", "sad").
-3. Le script collecte 100 échantillons puis sauvegarde `{name}.npy`.
+3. Entrez le nombre d'échantillons voulu (vide = jusqu'à la touche Échap).
+4. Les échantillons sont ajoutés au fur et à mesure à `{name}.npy`
+   (float32) ; relancer le script avec le même nom reprend la collecte.
+   Le schéma des features et les métadonnées de capture sont dans `{name}.json`,
+   et la classe est ajoutée au manifeste d'entraînement (`manifest.json`).
+
+Le nom et le nombre d'échantillons peuvent aussi être passés en arguments,
+par exemple sur un serveur sans écran :
+    python data_collection.py happy --source happy.mp4 --samples 5000 --workers 4 --no-preview
+    python data_collection.py sad --source 0 --rate 10
+
+La collecte est un pipeline :
+- un thread de capture lit les frames et les dépose dans une file bornée.
+  Caméra : la frame la plus ancienne est jetée si la file est pleine (les
+  workers traitent toujours une image récente), et `--rate` limite le
+  nombre de frames envoyées par seconde. Vidéo : aucune frame n'est jetée,
+  `--rate` sous-échantillonne la vidéo (frames par seconde de vidéo) ;
+- `--workers` threads de traitement (MediaPipe dans un processus par
+  worker au-delà d'un) produisent les vecteurs de features ;
+- le thread principal écarte les quasi-doublons (`dedup.DuplicateFilter`,
+  seuil `--dedup-threshold`, 0 pour tout garder), écrit les échantillons
+  et affiche l'aperçu, que `--no-preview` désactive (il l'est d'office
+  sans écran).
+Avec plusieurs workers, l'ordre des lignes peut différer de celui des
+frames (sans effet sur l'entraînement, qui mélange les lignes).
 
 Les vecteurs contiennent des coordonnées x et y relatives par rapport
 à certains points de référence (par exemple landmark 1 pour le visage,
@@ -19,90 +43,357 @@ NumPy pour la manipulation des tableaux (données d'entraînement), et
  OpenCV (cv2) pour la gestion de la caméra et de la fenêtre d'affichage.
 """
 
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
 import mediapipe as mp
-import numpy as np
 import cv2
+import numpy as np
 
-# Ouvre la première caméra disponible (index 0)
-cap = cv2.VideoCapture(0)
+from data_loader import MANIFEST_PATH, register_class
+from dataset_store import DatasetStore
+from dedup import DEFAULT_THRESHOLD, DuplicateFilter
+from features import extract_features
+from roi import RoiTracker
 
-# Nom du fichier de sortie fourni par l'utilisateur
-name = input("Enter the name of the data : ")
+# Détection sur la région du visage, à résolution réduite (landmarks
+# ramenés dans les coordonnées de la frame entière : features inchangées)
+ROI_TRACKING = True
+WORKING_SIZE = 640
+
+# Échecs consécutifs de MediaPipe au-delà desquels un worker abandonne
+MAX_FRAME_ERRORS = 10
 
 # Initialisation des modules MediaPipe
 holistic = mp.solutions.holistic  #détecter et de suivre simultanément les points clés (landmarks) du visage et des mains en temps réel.
 hands = mp.solutions.hands  #Je prépare les informations sur les connexions spécifiques aux mains pour le dessin.
-holis = holistic.Holistic() #Je charge et active le modèle d'IA qui fera le travail de détection.
 drawing = mp.solutions.drawing_utils #Je prépare l'outil qui va afficher les résultats de la détection à l'écran.
 
-# Liste pour stocker tous les vecteurs de caractéristiques
-X = []
-data_size = 0  # compteur d'échantillons collectés
-
-# Boucle principale de capture
-while True:
-	# Liste temporaire pour stocker les coordonnées d'un seul échantillon
-	lst = []
-
-	# Lecture d'une frame depuis la caméra
-	_, frm = cap.read()
-
-	# Miroir de l'image pour correspondre à l'orientation webcam habituelle
-	frm = cv2.flip(frm, 1)
-
-	# Traitement MediaPipe (convertir en RGB avant) , envoie l'image brute de la caméra au modèle d'intelligence artificielle de MediaPipe pour la détection des points clés.
-	res = holis.process(cv2.cvtColor(frm, cv2.COLOR_BGR2RGB))
-
-	# Si des landmarks du visage sont détectés, extraire les coordonnées
-	if res.face_landmarks:
-		# Pour chaque landmark du visage, on enregistre la position relative
-		# par rapport au landmark 1 (comme référence) — x puis y
-		for i in res.face_landmarks.landmark:
-			lst.append(i.x - res.face_landmarks.landmark[1].x)
-			lst.append(i.y - res.face_landmarks.landmark[1].y)
-
-		# Main gauche: si présente, ajouter coordonnées relatives, sinon 42 zéros
-		if res.left_hand_landmarks:
-			for i in res.left_hand_landmarks.landmark:
-				lst.append(i.x - res.left_hand_landmarks.landmark[8].x)
-				lst.append(i.y - res.left_hand_landmarks.landmark[8].y)
-		else:
-			# 21 landmarks * 2 (x,y) = 42 valeurs de remplissage
-			for i in range(42):
-				lst.append(0.0)
-
-		# Main droite: si présente, ajouter coordonnées relatives, sinon 42 zéros
-		if res.right_hand_landmarks:
-			for i in res.right_hand_landmarks.landmark:
-				lst.append(i.x - res.right_hand_landmarks.landmark[8].x)
-				lst.append(i.y - res.right_hand_landmarks.landmark[8].y)
+
+def has_display():
+	"""Faux sur un serveur Linux sans serveur graphique."""
+	if sys.platform.startswith("linux"):
+		return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+	return True
+
+
+def capture(cap, frames, stop, stats, live, rate, n_workers):
+	"""Thread de capture : lit les frames et les dépose dans la file `frames`."""
+	if live:
+		interval = 1.0 / rate if rate else 0.0
+		next_due = 0.0
+	else:
+		# Vidéo : une frame sur `step` pour obtenir `rate` frames par seconde de vidéo
+		fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+		step = max(1, round(fps / rate)) if rate else 1
+		index = 0
+
+	while not stop.is_set():
+		if not live and index % step:
+			# Frame sautée : avancer sans la décoder
+			index += 1
+			if not cap.grab():
+				break
+			continue
+
+		ok, frm = cap.read()
+		if not ok:
+			break  # fin de la vidéo ou caméra indisponible
+		stats["read"] += 1
+
+		if live:
+			now = time.perf_counter()
+			if now < next_due:
+				continue
+			next_due = max(next_due + interval, now) if interval else now
+			try:
+				frames.put_nowait(frm)
+			except queue.Full:
+				# Jeter la frame la plus ancienne : garder les workers sur une image récente
+				try:
+					frames.get_nowait()
+					stats["dropped"] += 1
+				except queue.Empty:
+					pass
+				frames.put_nowait(frm)
 		else:
-			for i in range(42):
-				lst.append(0.0)
+			index += 1
+			# Vidéo : attendre une place dans la file, sans rien jeter
+			while not stop.is_set():
+				try:
+					frames.put(frm, timeout=0.1)
+					break
+				except queue.Full:
+					continue
+
+	# Un signal de fin par worker
+	for _ in range(n_workers):
+		frames.put(None)
+
+
+class FrameError(Exception):
+	"""Échec du traitement d'une frame ; le worker passe à la suivante."""
+
+
+# Frame sans résultat (délai d'un worker Holistic dépassé, worker relancé)
+FRAME_DROPPED = "frame_dropped"
+
+
+def process_frames(detector, frames, results, stop, mirror, preview):
+	"""
+	Worker : landmarks puis vecteur de features pour chaque frame de la file.
+
+	Une frame sans résultat du détecteur est signalée par `FRAME_DROPPED`,
+	une frame en échec par un `FrameError` ; après
+	`MAX_FRAME_ERRORS` échecs consécutifs, l'exception elle-même est envoyée
+	au thread principal, qui arrête la collecte. Le signal de fin (None) est
+	toujours envoyé.
+	"""
+	errors = 0
+	try:
+		while not stop.is_set():
+			try:
+				frm = frames.get(timeout=0.1)
+			except queue.Empty:
+				continue
+			if frm is None:
+				break
+			# Miroir de l'image pour correspondre à l'orientation webcam habituelle
+			if mirror:
+				frm = cv2.flip(frm, 1)
 
-		# Ajouter l'échantillon à la liste principale et incrémenter le compteur
-		X.append(lst)
-		data_size = data_size + 1
+			try:
+				# Traitement MediaPipe (convertir en RGB avant) , envoie l'image brute de la caméra au modèle d'intelligence artificielle de MediaPipe pour la détection des points clés.
+				res = detector.process(cv2.cvtColor(frm, cv2.COLOR_BGR2RGB))
+				if res is None:
+					# Pas de landmarks à enregistrer ni à dessiner : frame perdue
+					results.put(FRAME_DROPPED)
+					continue
 
+				# Si des landmarks du visage sont détectés, extraire le vecteur de features
+				# (coordonnées relatives au landmark 1 du visage et au landmark 8 des mains,
+				# mains absentes remplies de zéros) avec le même extracteur que l'application
+				features = extract_features(res)
+			except Exception as e:
+				errors += 1
+				if errors >= MAX_FRAME_ERRORS:
+					results.put(e)
+					break
+				results.put(FrameError(repr(e)))
+				continue
+			errors = 0
+			# La frame et les landmarks ne sont gardés que pour l'aperçu
+			results.put((features, frm, res) if preview else (features, None, None))
+	except Exception as e:
+		results.put(e)
+	finally:
+		results.put(None)
 
+
+def make_detectors(n_workers, roi_tracking, working_size):
+	"""Un détecteur par worker, et la fonction qui les libère tous."""
+	if n_workers == 1:
+		# Un seul worker : Holistic dans ce processus, comme avant
+		holis = holistic.Holistic() #Je charge et active le modèle d'IA qui fera le travail de détection.
+		return [RoiTracker(holis, working_size, enabled=roi_tracking)], holis.close
+
+	# Plusieurs workers : un processus Holistic chacun (le GIL ne limite plus le débit)
+	from holistic_pool import HolisticPool
+
+	pool = HolisticPool(n_workers, timeout=5.0)
+	leases = [pool.lease() for _ in range(n_workers)]
+	return [RoiTracker(lease, working_size, enabled=roi_tracking) for lease in leases], pool.close
+
+
+def draw_preview(frm, res, data_size, total):
 	# Dessiner les landmarks sur la frame pour retour visuel
 	drawing.draw_landmarks(frm, res.face_landmarks, holistic.FACEMESH_CONTOURS)
 	drawing.draw_landmarks(frm, res.left_hand_landmarks, hands.HAND_CONNECTIONS)
 	drawing.draw_landmarks(frm, res.right_hand_landmarks, hands.HAND_CONNECTIONS)
 
 	# Afficher le nombre d'échantillons collectés sur la fenêtre
-	cv2.putText(frm, str(data_size), (50,50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0),2)
+	cv2.putText(frm, f"{data_size} ({total})", (50,50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0),2)
 
 	# Afficher la fenêtre de la caméra
 	cv2.imshow("window", frm)
 
-	# Quitter si l'utilisateur appuie sur Échap (27) ou si on a 100 échantillons
-	if cv2.waitKey(1) == 27 or data_size > 99:
-		cv2.destroyAllWindows()
+
+def collect(name, source=0, max_samples=None, rate=None, n_workers=1, queue_size=8, preview=True,
+		mirror=True, roi_tracking=ROI_TRACKING, working_size=WORKING_SIZE, dedup_threshold=DEFAULT_THRESHOLD):
+	"""Collecte des échantillons dans `{name}.npy` ; retourne les statistiques de la session."""
+	cap = cv2.VideoCapture(source)
+	if not cap.isOpened():
+		raise SystemExit(f"Impossible d'ouvrir la source vidéo {source!r}")
+	live = isinstance(source, int)
+
+	# Fichier de données, écrit par blocs pendant la collecte (reprise si existant)
+	store = DatasetStore(f"{name}.npy", label=name, metadata={
+		"source": source,
+		"width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+		"height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+		"rate": rate,
+		"workers": n_workers,
+		"dedup_threshold": dedup_threshold,
+	})
+	data_size = 0  # compteur d'échantillons collectés pendant cette session
+
+	# Quasi-doublons écartés avant l'écriture ; à la reprise, le réservoir
+	# part des dernières lignes déjà enregistrées
+	dedup = DuplicateFilter(dedup_threshold)
+	if dedup_threshold and store.rows:
+		store.flush()
+		dedup.seed(np.load(store.path, mmap_mode="r")[-dedup.capacity:])
+
+	detectors, close_detectors = make_detectors(n_workers, roi_tracking, working_size)
+	frames = queue.Queue(maxsize=queue_size)
+	results = queue.Queue()
+	stop = threading.Event()
+	stats = {"read": 0, "dropped": 0, "processed": 0, "no_face": 0, "duplicates": 0, "errors": 0}
+	error = None  # exception d'un worker, relancée après l'arrêt du pipeline
+
+	threads = [threading.Thread(target=capture, name="capture", daemon=True,
+		args=(cap, frames, stop, stats, live, rate, n_workers))]
+	threads += [
+		threading.Thread(target=process_frames, name=f"collect-{i}", daemon=True,
+			args=(detector, frames, results, stop, mirror, preview))
+		for i, detector in enumerate(detectors)
+	]
+	start = time.perf_counter()
+	last_report = start
+	for thread in threads:
+		thread.start()
+
+	finished = 0
+	try:
+		while error is None and finished < n_workers and (max_samples is None or data_size < max_samples):
+			try:
+				item = results.get(timeout=0.1)
+			except queue.Empty:
+				continue
+
+			# Écrire tous les résultats disponibles ; n'afficher que le plus récent
+			latest = None
+			while True:
+				if item is None:
+					finished += 1
+				elif item is FRAME_DROPPED:
+					stats["dropped"] += 1
+				elif isinstance(item, FrameError):
+					if not stats["errors"]:
+						print(f"Frame ignorée après une erreur de MediaPipe : {item}", file=sys.stderr)
+					stats["errors"] += 1
+				elif isinstance(item, Exception):
+					error = item
+					break
+				else:
+					features, frm, res = item
+					stats["processed"] += 1
+					if features is None:
+						stats["no_face"] += 1
+					elif not dedup.accept(features):
+						stats["duplicates"] += 1
+					elif max_samples is None or data_size < max_samples:
+						# Ajouter l'échantillon au fichier et incrémenter le compteur
+						store.append(features)
+						data_size = data_size + 1
+					if frm is not None:
+						latest = (frm, res)
+				try:
+					item = results.get_nowait()
+				except queue.Empty:
+					break
+
+			if preview and latest is not None:
+				draw_preview(latest[0], latest[1], data_size, len(store))
+				# Quitter si l'utilisateur appuie sur Échap (27)
+				if cv2.waitKey(1) == 27:
+					break
+			elif not preview and time.perf_counter() - last_report >= 2.0:
+				last_report = time.perf_counter()
+				print(f"\r{data_size} échantillons ({len(store)} au total), "
+					f"{data_size / (last_report - start):.1f}/s", end="", flush=True)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		stop.set()
+		# Vider la file pour débloquer la capture, puis attendre les threads
+		for thread in threads:
+			while thread.is_alive():
+				try:
+					frames.get_nowait()
+				except queue.Empty:
+					pass
+				thread.join(0.05)
+		if preview:
+			cv2.destroyAllWindows()
 		cap.release()
-		break
+		close_detectors()
+		# Écrire le dernier bloc et mettre à jour l'en-tête
+		store.close()
+	# Nouvelle classe (ou nouveau fichier) : inscrite au manifeste d'entraînement
+	if len(store) and register_class(name, os.path.basename(store.path)):
+		print(f"Classe {name} ajoutée à {MANIFEST_PATH}")
+	if error is not None:
+		raise error
+
+	elapsed = time.perf_counter() - start
+	stats.update(samples=data_size, total=len(store), seconds=elapsed,
+		rate=data_size / elapsed if elapsed else 0.0)
+	return stats
+
+
+def parse_source(value):
+	"""Index de caméra ("0") ou chemin d'une vidéo."""
+	return int(value) if value.isdigit() else value
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Collecte d'échantillons de landmarks pour une émotion")
+	parser.add_argument("name", nargs="?", help="nom de l'émotion / du fichier de sortie (demandé si absent)")
+	parser.add_argument("--source", type=parse_source, default=0, help="index de caméra ou fichier vidéo")
+	parser.add_argument("--samples", type=int, default=None, help="échantillons à collecter (défaut : illimité)")
+	parser.add_argument("--rate", type=float, default=None,
+		help="frames analysées par seconde (caméra : temps réel ; vidéo : temps de la vidéo)")
+	parser.add_argument("--workers", type=int, default=1, help="workers MediaPipe en parallèle")
+	parser.add_argument("--queue", type=int, default=8, help="taille de la file de frames")
+	parser.add_argument("--no-preview", action="store_true", help="pas de fenêtre d'aperçu (serveur sans écran)")
+	parser.add_argument("--no-mirror", action="store_true", help="ne pas retourner les frames (vidéo déjà en miroir)")
+	parser.add_argument("--no-roi", action="store_true", help="détection plein cadre à chaque frame")
+	parser.add_argument("--working-size", type=int, default=WORKING_SIZE, help="résolution de travail MediaPipe (0 = pleine)")
+	parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD,
+		help="écart minimal avec les échantillons gardés (0 = tout garder)")
+	args = parser.parse_args(argv)
+
+	name = args.name
+	max_samples = args.samples
+	if name is None:
+		# Nom du fichier de sortie fourni par l'utilisateur
+		name = input("Enter the name of the data : ")
+		# Nombre d'échantillons à collecter pendant cette session (vide = illimité)
+		if max_samples is None:
+			max_samples = input("Number of samples to collect (empty = until Esc) : ").strip()
+			max_samples = int(max_samples) if max_samples else None
+
+	preview = not args.no_preview
+	if preview and not has_display():
+		print("Aucun écran détecté : aperçu désactivé")
+		preview = False
+
+	stats = collect(name, args.source, max_samples, args.rate, max(1, args.workers), args.queue, preview,
+		not args.no_mirror, not args.no_roi, args.working_size or None, args.dedup_threshold)
+	if not preview:
+		print()
+	print(
+		f"{stats['samples']} échantillons en {stats['seconds']:.1f} s ({stats['rate']:.1f}/s) ; "
+		f"{stats['total']} dans {name}.npy | frames lues {stats['read']}, jetées {stats['dropped']}, "
+		f"sans visage {stats['no_face']}, quasi-doublons écartés {stats['duplicates']}, "
+		f"frames en erreur {stats['errors']}"
+	)
 
 
-# Sauvegarder les données collectées dans un fichier NumPy
-np.save(f"{name}.npy", np.array(X))
-print(np.array(X).shape)
+if __name__ == "__main__":
+	main()
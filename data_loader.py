@@ -0,0 +1,291 @@
+"""
+Chargement des données d'entraînement en temps linéaire
+
+Remplace la boucle de `data_training.py` qui concaténait les fichiers un par
+un (copie quadratique), étiquetait chaque classe avec la taille du premier
+fichier et mélangeait les lignes une à une en Python.
+
+1. Un manifeste explicite (`manifest.json`, propre à chaque dossier de
+   données, non versionné) liste les fichiers de chaque classe ; il est
+   généré à partir des `.npy` du dossier s'il n'existe pas encore, puis
+   peut être édité à la main. `data_collection.py` y ajoute chaque classe
+   collectée (`register_class`), et `load_manifest` signale les fichiers
+   `{emotion}.npy` du dossier qu'il ne liste pas.
+2. La matrice de features est allouée une seule fois (en mémoire, ou en
+   mémoire mappée sur disque pour les datasets plus grands que la RAM) et
+   chaque fichier y est copié une seule fois.
+3. Les labels entiers sont construits de façon vectorisée à partir du
+   nombre réel de lignes de chaque fichier.
+4. `batch_generator` fournit des lots mélangés à chaque époque, préparés en
+   arrière-plan, directement utilisables par `model.fit`.
+
+Usage (benchmark contre l'ancien chargement, datasets synthétiques) :
+    python data_loader.py bench [lignes ...]     # ex: 10000 100000 1000000
+"""
+
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+MANIFEST_PATH = "manifest.json"
+
+# Fichiers .npy du dossier qui ne sont pas des données d'entraînement
+RESERVED = {"labels", "emotion"}
+# Fichiers dérivés d'une classe (`happy.dedup.npy` de dedup.py, fichiers
+# temporaires `happy.npy.tmp.npy` d'une écriture interrompue)
+DERIVED_SUFFIXES = (".dedup", ".tmp")
+
+
+def discover_manifest(directory="."):
+    """Construit un manifeste à partir des fichiers `{emotion}.npy` d'un dossier."""
+    classes = []
+    for filename in sorted(os.listdir(directory)):
+        name, ext = os.path.splitext(filename)
+        if ext == ".npy" and name not in RESERVED and not name.endswith(DERIVED_SUFFIXES):
+            classes.append({"label": name, "files": [filename]})
+    return {"classes": classes}
+
+
+def _write_manifest(manifest, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def unlisted_files(manifest, directory="."):
+    """Fichiers `{emotion}.npy` du dossier absents du manifeste."""
+    listed = {filename for c in manifest["classes"] for filename in c["files"]}
+    found = discover_manifest(directory)["classes"]
+    return [c["files"][0] for c in found if c["files"][0] not in listed]
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Lit le manifeste ; le génère à partir du dossier s'il n'existe pas.
+    Avertit si des fichiers de classe du dossier n'y figurent pas (ajoutés à
+    la main ou par une ancienne version de la collecte).
+    """
+    directory = os.path.dirname(path) or "."
+    if not os.path.exists(path):
+        manifest = discover_manifest(directory)
+        _write_manifest(manifest, path)
+        print(f"Manifeste généré: {path} ({len(manifest['classes'])} classes)")
+        return manifest
+    with open(path) as f:
+        manifest = json.load(f)
+    unlisted = unlisted_files(manifest, directory)
+    if unlisted:
+        print(f"Attention : fichiers absents de {path}, ignorés : {', '.join(unlisted)} "
+              f"(ajoutez-les au manifeste, ou supprimez-le pour le régénérer)")
+    return manifest
+
+
+def register_class(label, filename, path=MANIFEST_PATH):
+    """
+    Ajoute `filename` à la classe `label` du manifeste (créée si besoin).
+    Sans manifeste, rien à faire : il sera généré avec le fichier au prochain
+    chargement.
+    """
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        manifest = json.load(f)
+    for c in manifest["classes"]:
+        if c["label"] == label:
+            if filename in c["files"]:
+                return False
+            c["files"].append(filename)
+            break
+    else:
+        manifest["classes"].append({"label": label, "files": [filename]})
+    _write_manifest(manifest, path)
+    return True
+
+
+def load_dataset(manifest, directory=".", mmap_path=None, dtype=np.float32):
+    """
+    Retourne (X, y, labels) : features (n, d), labels entiers (n,) et noms
+    des classes dans l'ordre des indices.
+
+    Si `mmap_path` est fourni, X est un fichier .npy en mémoire mappée au
+    lieu d'un tableau en RAM.
+    """
+    labels = [c["label"] for c in manifest["classes"]]
+    # Ouvrir chaque fichier en mémoire mappée : seules les dimensions sont lues
+    parts = [
+        [np.load(os.path.join(directory, f), mmap_mode="r") for f in c["files"]]
+        for c in manifest["classes"]
+    ]
+    counts = np.array([sum(len(p) for p in files) for files in parts], dtype=np.int64)
+    n_features = parts[0][0].shape[1]
+    total = int(counts.sum())
+
+    if mmap_path:
+        X = np.lib.format.open_memmap(mmap_path, mode="w+", dtype=dtype, shape=(total, n_features))
+    else:
+        X = np.empty((total, n_features), dtype=dtype)
+
+    offset = 0
+    for files in parts:
+        for part in files:
+            X[offset:offset + len(part)] = part
+            offset += len(part)
+
+    y = np.repeat(np.arange(len(labels), dtype=np.int32), counts)
+    return X, y, labels
+
+
+def split(n, validation=0.2, seed=0):
+    """Indices (entraînement, validation) tirés aléatoirement."""
+    idx = np.random.default_rng(seed).permutation(n)
+    n_val = int(round(n * validation))
+    return idx[n_val:], idx[:n_val]
+
+
+def batch_generator(X, y, n_classes, batch_size=32, indices=None, shuffle=True,
+                    seed=0, prefetch=4, epochs=None):
+    """
+    Génère des lots (X_batch, y_onehot) indéfiniment (ou pendant `epochs`
+    époques), mélangés à chaque époque. Les lots sont préparés par un thread
+    d'arrière-plan, `prefetch` lots à l'avance.
+    """
+    indices = np.arange(len(X)) if indices is None else np.asarray(indices)
+    eye = np.eye(n_classes, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    batches = queue.Queue(maxsize=prefetch)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        # Attendre une place dans la file, sauf si le consommateur a arrêté
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        epoch = 0
+        while epochs is None or epoch < epochs:
+            order = rng.permutation(indices) if shuffle else indices
+            for start in range(0, len(order), batch_size):
+                # Indices triés : lecture séquentielle si X est mappé sur disque
+                batch = np.sort(order[start:start + batch_size])
+                if not put((np.asarray(X[batch], dtype=np.float32), eye[y[batch]])):
+                    return
+            epoch += 1
+        put(done)
+
+    thread = threading.Thread(target=produce, name="batch-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = batches.get()
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def steps_per_epoch(n, batch_size=32):
+    return (n + batch_size - 1) // batch_size
+
+
+def _legacy_load(directory):
+    """Ancien chargement de data_training.py, conservé pour le benchmark."""
+    is_init = False
+    size = -1
+    label = []
+    dictionary = {}
+    c = 0
+    for i in sorted(os.listdir(directory)):
+        if i.split(".")[-1] == "npy" and not (i.split(".")[0] == "labels"):
+            emotion_name = i.split('.')[0]
+            if not is_init:
+                is_init = True
+                X = np.load(os.path.join(directory, i))
+                size = X.shape[0]
+                y = np.array([emotion_name] * size).reshape(-1, 1)
+            else:
+                X = np.concatenate((X, np.load(os.path.join(directory, i))))
+                y = np.concatenate((y, np.array([emotion_name] * size).reshape(-1, 1)))
+            label.append(emotion_name)
+            dictionary[emotion_name] = c
+            c = c + 1
+
+    for i in range(y.shape[0]):
+        y[i, 0] = dictionary[y[i, 0]]
+    y = np.array(y, dtype="int32")
+    y = np.eye(c, dtype=np.float32)[y[:, 0]]
+
+    X_new = X.copy()
+    y_new = y.copy()
+    counter = 0
+    cnt = np.arange(X.shape[0])
+    np.random.shuffle(cnt)
+    for i in cnt:
+        X_new[counter] = X[i]
+        y_new[counter] = y[i]
+        counter = counter + 1
+    return X_new, y_new
+
+
+def _bench(rows_list, n_classes=5, n_features=1020):
+    import tempfile
+    import time
+    import tracemalloc
+
+    def measure(fn):
+        tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak / 2**20
+
+    print("lignes   | ancien: s, Mo pic      | nouveau (RAM): s, Mo pic | nouveau (mmap): s, Mo pic")
+    rng = np.random.default_rng(0)
+    for rows in rows_list:
+        with tempfile.TemporaryDirectory() as directory:
+            per_class = rows // n_classes
+            for k in range(n_classes):
+                # Même format que data_collection.py (float32), écrit par blocs
+                out = np.lib.format.open_memmap(
+                    os.path.join(directory, f"class{k}.npy"), mode="w+",
+                    dtype=np.float32, shape=(per_class, n_features))
+                for start in range(0, per_class, 10000):
+                    stop = min(start + 10000, per_class)
+                    out[start:stop] = rng.random((stop - start, n_features), dtype=np.float32)
+                out.flush()
+                del out
+
+            def new_load(mmap_path=None):
+                manifest = discover_manifest(directory)
+                X, y, labels = load_dataset(manifest, directory, mmap_path=mmap_path)
+                # Une époque complète de lots mélangés
+                for _ in batch_generator(X, y, len(labels), batch_size=256, epochs=1):
+                    pass
+
+            legacy = measure(lambda: _legacy_load(directory))
+            ram = measure(new_load)
+            mapped = measure(lambda: new_load(os.path.join(directory, "X.mmap.npy")))
+            print(
+                f"{rows:8d} | {legacy[0]:7.2f} s {legacy[1]:9.0f} Mo | "
+                f"{ram[0]:7.2f} s {ram[1]:9.0f} Mo   | {mapped[0]:7.2f} s {mapped[1]:9.0f} Mo"
+            )
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != "bench":
+        sys.exit("Usage: python data_loader.py bench [lignes ...]")
+    _bench([int(r) for r in sys.argv[2:]] or [10000, 100000])
@@ -2,110 +2,92 @@
 Entraînement d'un modèle de classification des émotions avec Keras
 
 Ce script :
-1. Charge les données collectées (fichiers .npy) pour différentes émotions.
+1. Charge les données collectées (fichiers .npy listés dans manifest.json).
 2. Encode les labels en vecteurs one-hot.
-3. Mélange aléatoirement les données.
-4. Construit un réseau de neurones dense.
-5. Entraîne le modèle et le sauvegarde.
+3. Mélange aléatoirement les données à chaque époque.
+4. Réduit éventuellement les features (régions du visage, ACP).
+5. Construit un réseau de neurones dense.
+6. Entraîne le modèle (validation, arrêt anticipé, checkpoints), le sauvegarde
+   et le publie comme nouvelle version du registre des modèles.
 
-Prérequis : fichiers .npy nommés par émotion (ex: happy.npy, sad.npy, etc.)
+Pour comparer plusieurs architectures, voir hyperparam_search.py.
+
+Prérequis : fichiers .npy nommés par émotion (ex: happy.npy, sad.npy, etc.) ;
+manifest.json est généré à partir de ces fichiers s'il n'existe pas.
 """
 
 import os
 import numpy as np
 import cv2
-from tensorflow.keras.utils import to_categorical
-
-from keras.layers import Input, Dense
-from keras.models import Model
 
-# Flags et variables d'initialisation
-is_init = False  # indique si le premier dataset a été chargé
-size = -1  # taille du premier dataset
+from data_loader import MANIFEST_PATH, load_dataset, load_manifest, split
+from numpy_model import NumpyModel, export_model, export_variants
+from reduction import FeatureReducer
+from registry import ModelRegistry
+from training import CHECKPOINT_PATH, build_model, fit_model
 
-label = []  # liste des noms d'émotions trouvées
-dictionary = {}  # mappage émotion -> index numérique
-c = 0  # compteur pour créer les indices des émotions
-
-# Boucle de chargement des fichiers de données (un par émotion)
-# Cherche tous les fichiers .npy sauf "labels.npy"
+# Chargement des données (un fichier ou plus par émotion, listés dans manifest.json)
 #Il est essentiel pour transformer des fichiers séparés (angry.npy, sad.npy, etc.) en un grand tableau cohérent que Keras peut ingérer.
-#Le réseau de neurones ne peut traiter que des nombres. Cette section crée la clé de traduction qui sera utilisée juste après pour convertir les noms d'émotion ('angry') en index numériques (0).
-for i in os.listdir():
-	if i.split(".")[-1] == "npy" and not(i.split(".")[0] == "labels"):
-		emotion_name = i.split('.')[0]  # ex: "happy" depuis "happy.npy"
-		
-		if not(is_init):
-			# Premier dataset trouvé : initialiser X et y
-			is_init = True
-			X = np.load(i)
-			size = X.shape[0]
-			# Créer les labels avec le nom de l'émotion (ex: ["happy", "happy", ...])
-			y = np.array([emotion_name]*size).reshape(-1,1)
-		else:
-			# Datasets suivants : concaténer à X et y existants
-			X = np.concatenate((X, np.load(i)))
-			y = np.concatenate((y, np.array([emotion_name]*size).reshape(-1,1)))
-
-		# Ajouter l'émotion à la liste et créer son index dans le dictionnaire
-		label.append(emotion_name)
-		dictionary[emotion_name] = c
-		c = c + 1
-
-
-# Convertir les labels textes en indices numériques
-# ex: "happy" -> 0, "sad" -> 1, etc.
-for i in range(y.shape[0]):
-	y[i, 0] = dictionary[y[i, 0]]
-y = np.array(y, dtype="int32")
-
-# Convertir les indices en vecteurs one-hot    ,Le réseau de neurones que vous avez défini utilise une fonction de coût (categorical_crossentropy) et une couche de sortie (softmax) qui nécessitent un format d'étiquette très spécifique : le One-Hot Encoding.
-# ex: 0 -> [1,0,0,...], 1 -> [0,1,0,...] , La fonction categorical_crossentropy mesure l'erreur en comparant la probabilité de sortie du réseau (ex: [0.1, 0.8, 0.05, 0.05]) avec le vecteur One-Hot cible (ex: [0, 1, 0, 0]). Cela permet un calcul d'erreur précis.
-y = to_categorical(y)
+#La matrice X est allouée une seule fois et chaque fichier y est copié une seule fois ; y contient l'index numérique de chaque émotion (ex: "angry" -> 0), construit à partir du nombre réel de lignes de chaque fichier.
+# Si TRAINING_MMAP est défini, X est un fichier mappé sur disque (datasets plus grands que la RAM)
+manifest = load_manifest(MANIFEST_PATH)
+X, y, label = load_dataset(manifest, mmap_path=os.environ.get("TRAINING_MMAP"))
 
-# Copier les données pour le mélange aléatoire
-X_new = X.copy()
-y_new = y.copy()
-counter = 0
+# Les lots sont mélangés à chaque époque et convertis en vecteurs one-hot    ,Le réseau de neurones que vous avez défini utilise une fonction de coût (categorical_crossentropy) et une couche de sortie (softmax) qui nécessitent un format d'étiquette très spécifique : le One-Hot Encoding.
+# ex: 0 -> [1,0,0,...], 1 -> [0,1,0,...] , La fonction categorical_crossentropy mesure l'erreur en comparant la probabilité de sortie du réseau (ex: [0.1, 0.8, 0.05, 0.05]) avec le vecteur One-Hot cible (ex: [0, 1, 0, 0]). Cela permet un calcul d'erreur précis.
 
-'''Après la concaténation dans la section précédente, vos données sont triées par émotion (ex: les 100 échantillons de "colère" d'abord, puis les 100 de "tristesse", etc.). Si vous entraînez un modèle sur des données triées :
+'''Les données chargées sont triées par émotion (ex: les 100 échantillons de "colère" d'abord, puis les 100 de "tristesse", etc.). Si vous entraînez un modèle sur des données triées :
 
 Pendant les 100 premières étapes, il n'apprend que la "colère".
 
 Il oublie ce qu'il a appris en voyant la "tristesse".
 '''
-# Générer une permutation aléatoire des indices
-cnt = np.arange(X.shape[0])
-np.random.shuffle(cnt)
-
-# Mélanger les données en fonction de la permutation
-for i in cnt:
-	X_new[counter] = X[i]
-	y_new[counter] = y[i]
-	counter = counter + 1
-
-
-# Construction du modèle de réseau de neurones
-# Couche d'entrée : prend en compte le nombre de features
-ip = Input(shape=(X.shape[1],))
 
-# Couches cachées avec activation ReLU
-m = Dense(512, activation="relu")(ip)
-m = Dense(256, activation="relu")(m)
+# Réduction des features (optionnelle) : sous-ensemble de régions du visage
+# (ex: ["lips", "left_eye", "right_eye", "left_eyebrow", "right_eyebrow"])
+# et/ou projection ACP. Sauvegardée dans reduction.npz et appliquée telle
+# quelle par music.py ; None partout = les 1020 features brutes.
+REGIONS = None
+INCLUDE_HANDS = True
+PCA_COMPONENTS = None
 
-# Couche de sortie avec softmax (classification multi-classe)
-op = Dense(y.shape[1], activation="softmax")(m)
+reducer = FeatureReducer(REGIONS, INCLUDE_HANDS, PCA_COMPONENTS).fit(X)
+X = reducer.transform(X)
 
-# Créer le modèle en liant entrée et sortie
-model = Model(inputs=ip, outputs=op)
+# Validation : une part des lignes est mise de côté pour suivre la précision
+# à chaque époque ; l'entraînement s'arrête après PATIENCE époques sans
+# progrès (meilleurs poids restaurés) et les meilleurs poids sont sauvegardés
+# dans CHECKPOINT_PATH à chaque amélioration
+VALIDATION = 0.2
+PATIENCE = 10
+train, val = split(len(X), VALIDATION)
 
-# Compiler le modèle avec optimiseur RMSprop et loss categorical crossentropy
-model.compile(optimizer='rmsprop', loss="categorical_crossentropy", metrics=['acc'])
+# Construction du modèle de réseau de neurones (voir training.py)
+# Couche d'entrée : prend en compte le nombre de features (après réduction)
+# Couches cachées 512 et 256 (ReLU), sortie softmax, optimiseur RMSprop
+model = build_model(X.shape[1], len(label), layers=(512, 256), optimizer="rmsprop")
 
-# Entraîner le modèle sur 50 épochs
-model.fit(X, y, epochs=50)
+# Entraîner le modèle sur 50 époques au plus, avec des lots mélangés préparés en arrière-plan
+history = fit_model(model, X, y, len(label), train, val, epochs=50, batch_size=32,
+	patience=PATIENCE, checkpoint=CHECKPOINT_PATH)
 
 
 # Sauvegarder le modèle entraîné et les labels
 model.save("model.h5")
+# Exporter aussi les poids pour l'inférence NumPy (utilisée par music.py),
+# ainsi que les variantes float16 et int8
+export_model(model, "model.npz", rows=len(X), validation=val)
+export_variants("model.npz")
 np.save("labels.npy", np.array(label))
+reducer.save("reduction.npz")
+
+# Publier une nouvelle version dans le registre des modèles (models/) : music.py
+# la détecte et la charge sans redémarrer ; `python registry.py list` les liste
+val = np.sort(val)
+accuracy = float((NumpyModel.load("model.npz").predict(X[val]).argmax(axis=1) == y[val]).mean())
+version = ModelRegistry().publish("model.npz", label, reducer, {
+	"val_acc": accuracy,
+	"epochs": len(history["loss"]),
+	"rows": len(X),
+}, source="data_training.py")
+print(f"Version {version} publiée (précision de validation {accuracy:.3f})")
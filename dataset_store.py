@@ -0,0 +1,193 @@
+"""
+Stockage incrémental des échantillons de landmarks collectés
+
+`DatasetStore` écrit les vecteurs de features (float32) au fur et à mesure
+de la collecte, par blocs de `chunk_rows` lignes, au lieu de tout garder en
+mémoire jusqu'à la fin. Un arrêt brutal ne perd donc que le bloc en cours,
+et une collecte peut être reprise plus tard dans le même fichier.
+
+Le fichier de données reste un `.npy` standard : son en-tête a une taille
+fixe et n'est réécrit que pour mettre à jour le nombre de lignes. Il se lit
+avec `np.load(path, mmap_mode="r")`, sans charger les données en mémoire.
+
+À côté, un fichier JSON (`happy.npy` -> `happy.json`) décrit le schéma :
+disposition des features, landmarks de référence, label et métadonnées de
+chaque session de capture.
+
+Usage (convertir un ancien `{name}.npy` float64 en dataset appendable) :
+    python dataset_store.py convert happy.npy
+"""
+
+import ast
+import json
+import os
+import time
+
+import numpy as np
+
+from features import (FACE_POINTS, FACE_REF, FACE_SLICE, HAND_POINTS, HAND_REF,
+                      LEFT_HAND_SLICE, N_FEATURES, RIGHT_HAND_SLICE)
+
+DTYPE = np.dtype("<f4")
+HEADER_SIZE = 128  # taille de l'en-tête .npy des nouveaux fichiers (multiple de 64)
+SCHEMA_VERSION = 1
+
+_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def schema_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def _header_bytes(rows, n_features, size):
+    """En-tête .npy (version 1.0) complété par des espaces jusqu'à `size` octets."""
+    text = f"{{'descr': '{DTYPE.str}', 'fortran_order': False, 'shape': ({rows}, {n_features}), }}"
+    body_len = size - len(_MAGIC) - 2
+    if len(text) + 1 > body_len:
+        raise ValueError("En-tête .npy trop petit pour ce nombre de lignes")
+    body = text.ljust(body_len - 1) + "\n"
+    return _MAGIC + body_len.to_bytes(2, "little") + body.encode("latin1")
+
+
+def _read_header(f):
+    """Retourne (taille de l'en-tête, dtype, fortran_order, shape) d'un fichier .npy."""
+    magic = f.read(len(_MAGIC))
+    if magic != _MAGIC:
+        raise ValueError("Fichier .npy non supporté (version 1.0 attendue)")
+    body_len = int.from_bytes(f.read(2), "little")
+    header = ast.literal_eval(f.read(body_len).decode("latin1"))
+    return len(_MAGIC) + 2 + body_len, np.dtype(header["descr"]), header["fortran_order"], header["shape"]
+
+
+def default_schema(label):
+    return {
+        "version": SCHEMA_VERSION,
+        "label": label,
+        "dtype": DTYPE.name,
+        "n_features": N_FEATURES,
+        "layout": {
+            "face": [FACE_SLICE.start, FACE_SLICE.stop],
+            "left_hand": [LEFT_HAND_SLICE.start, LEFT_HAND_SLICE.stop],
+            "right_hand": [RIGHT_HAND_SLICE.start, RIGHT_HAND_SLICE.stop],
+        },
+        "points": {"face": FACE_POINTS, "hand": HAND_POINTS},
+        "references": {"face": FACE_REF, "hand": HAND_REF},
+        "coordinates": ["x", "y"],
+        "rows": 0,
+        "sessions": [],
+    }
+
+
+class DatasetStore:
+    def __init__(self, path, label=None, chunk_rows=64, metadata=None):
+        self.path = path
+        self.schema_path = schema_path(path)
+        self.chunk_rows = chunk_rows
+        self.n_features = N_FEATURES
+        self.row_bytes = DTYPE.itemsize * self.n_features
+
+        label = label or os.path.splitext(os.path.basename(path))[0]
+        if os.path.exists(self.schema_path):
+            with open(self.schema_path) as f:
+                self.schema = json.load(f)
+        else:
+            self.schema = default_schema(label)
+
+        if os.path.exists(path):
+            self._file = open(path, "r+b")
+            self.header_size, dtype, fortran_order, shape = _read_header(self._file)
+            if dtype != DTYPE or fortran_order or len(shape) != 2 or shape[1] != self.n_features:
+                self._file.close()
+                raise ValueError(
+                    f"{path} n'est pas un dataset float32 de {self.n_features} colonnes ; "
+                    f"le convertir d'abord avec `python dataset_store.py convert {path}`"
+                )
+            # Ignorer une éventuelle ligne incomplète (arrêt pendant une écriture)
+            data_bytes = os.path.getsize(path) - self.header_size
+            self.rows = data_bytes // self.row_bytes
+            self._file.truncate(self.header_size + self.rows * self.row_bytes)
+        else:
+            self._file = open(path, "w+b")
+            self.header_size = HEADER_SIZE
+            self.rows = 0
+
+        self._session = dict(metadata or {}, started=time.time(), rows=0)
+        self.schema["sessions"].append(self._session)
+
+        self._buffer = np.empty((chunk_rows, self.n_features), dtype=DTYPE)
+        self._buffered = 0
+        self._write_header()
+
+    def __len__(self):
+        return self.rows + self._buffered
+
+    def append(self, row):
+        """Ajoute un vecteur de features ; écrit sur disque à chaque bloc complet."""
+        self._buffer[self._buffered] = row
+        self._buffered += 1
+        if self._buffered == self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self._buffered:
+            self._file.seek(self.header_size + self.rows * self.row_bytes)
+            self._file.write(self._buffer[:self._buffered].tobytes())
+            self.rows += self._buffered
+            self._session["rows"] += self._buffered
+            self._buffered = 0
+        self._write_header()
+
+    def _write_header(self):
+        # Les données d'abord, l'en-tête ensuite : l'en-tête ne compte
+        # jamais de lignes absentes du fichier
+        self._file.flush()
+        self._file.seek(0)
+        self._file.write(_header_bytes(self.rows, self.n_features, self.header_size))
+        self._file.flush()
+
+        self.schema["rows"] = self.rows
+        tmp = self.schema_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.schema, f, indent=2)
+        os.replace(tmp, self.schema_path)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._session["ended"] = time.time()
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_dataset(path):
+    """Lit un dataset en mémoire mappée (aucune donnée chargée en RAM)."""
+    return np.load(path, mmap_mode="r")
+
+
+def convert(path, chunk_rows=4096):
+    """Réécrit un .npy existant (par ex. float64) au format de `DatasetStore`."""
+    data = np.load(path, mmap_mode="r")
+    tmp = path + ".tmp.npy"
+    with DatasetStore(tmp, label=os.path.splitext(os.path.basename(path))[0],
+                      metadata={"converted_from": path}) as store:
+        for start in range(0, len(data), chunk_rows):
+            for row in data[start:start + chunk_rows]:
+                store.append(row)
+    os.replace(tmp, path)
+    os.replace(schema_path(tmp), schema_path(path))
+    return len(data)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3 or sys.argv[1] != "convert":
+        sys.exit("Usage: python dataset_store.py convert <fichier.npy> [...]")
+    for path in sys.argv[2:]:
+        print(f"{path}: {convert(path)} lignes converties en float32")
@@ -0,0 +1,257 @@
+"""
+Filtrage des échantillons quasi identiques
+
+Deux frames consécutives de la webcam donnent des vecteurs de features
+presque identiques : les fichiers `{name}.npy` sont très redondants, ce
+qui alourdit le stockage et l'entraînement sans apporter d'information.
+
+`DuplicateFilter` n'accepte un vecteur que s'il s'écarte de tous les
+vecteurs déjà acceptés d'au moins `threshold`, en écart quadratique moyen
+par coordonnée (les coordonnées sont relatives et normalisées par la taille
+de l'image : 0.0015 ≈ 1 pixel sur une image de 640 pixels ; deux frames
+consécutives de la webcam sont à environ 0.001 l'une de l'autre). L'index est un
+réservoir borné des `capacity` derniers vecteurs acceptés, avec leurs
+normes précalculées : la comparaison à tout le réservoir est un seul
+produit matrice-vecteur (||a - x||² = ||a||² + ||x||² - 2 a·x).
+
+- En ligne : `data_collection.py` filtre chaque échantillon avant de
+  l'écrire (`--dedup-threshold`, 0 pour désactiver).
+- Hors ligne : `python dedup.py happy.npy ...` filtre des fichiers
+  existants (par blocs de lignes : un produit matriciel par bloc) dans
+  `happy.dedup.npy`, que `data_loader.discover_manifest` ne prend pas pour
+  une classe ; `--in-place` remplace le fichier d'origine.
+- Rapport : `python dedup.py report` mesure, pour plusieurs seuils, les
+  lignes retirées, le temps d'entraînement et la précision de validation.
+  La validation porte sur la fin de chaque fichier, jamais filtrée : un
+  tirage aléatoire mettrait des quasi-doublons des lignes d'entraînement
+  dans la validation et surestimerait la précision. Le seuil par défaut
+  (0.0005) est prudent : sur les fichiers fournis, des seuils de 0.001 et
+  plus retirent plus de la moitié des lignes mais coûtent de la précision.
+
+Usage :
+    python dedup.py happy.npy [sad.npy ...] [--threshold 0.0005] [--in-place]
+    python dedup.py report [--thresholds 0.0005 0.001 ...] [--epochs 30]
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from features import N_FEATURES
+
+DEFAULT_THRESHOLD = 0.0005
+DEFAULT_CAPACITY = 1024
+REPORT_THRESHOLDS = (0.00025, 0.0005, 0.001, 0.0015, 0.003)
+
+
+class DuplicateFilter:
+    def __init__(self, threshold=DEFAULT_THRESHOLD, capacity=DEFAULT_CAPACITY, n_features=N_FEATURES):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.n_features = n_features
+        # Seuil sur la distance euclidienne au carré
+        self._limit = threshold * threshold * n_features
+        self._rows = np.empty((capacity, n_features), dtype=np.float32)
+        self._norms = np.empty(capacity, dtype=np.float32)
+        self._count = 0
+        self._pos = 0
+        self.seen = 0
+        self.accepted = 0
+
+    def _add(self, x, norm):
+        self._rows[self._pos] = x
+        self._norms[self._pos] = norm
+        self._pos = (self._pos + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def seed(self, rows):
+        """Remplit le réservoir avec des vecteurs déjà gardés (reprise d'une collecte)."""
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, self.n_features)[-self.capacity:]
+        for x, norm in zip(rows, np.einsum("ij,ij->i", rows, rows)):
+            self._add(x, norm)
+
+    def accept_many(self, X):
+        """Masque des lignes de X gardées, dans l'ordre ; les lignes gardées entrent dans le réservoir."""
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.n_features)
+        norms = np.einsum("ij,ij->i", X, X)
+        keep = np.zeros(len(X), dtype=bool)
+        self.seen += len(X)
+        if not self.threshold:
+            keep[:] = True
+        else:
+            # Distance minimale au réservoir, pour tout le bloc à la fois
+            if self._count:
+                d2 = norms[:, None] + self._norms[None, :self._count] - 2.0 * (X @ self._rows[:self._count].T)
+                candidates = np.flatnonzero(d2.min(axis=1) > self._limit)
+            else:
+                candidates = np.arange(len(X))
+            # Les candidats sont encore comparés aux lignes gardées plus tôt dans le bloc
+            kept = []
+            for i in candidates:
+                if kept:
+                    previous = X[kept]
+                    d2 = norms[i] + norms[kept] - 2.0 * (previous @ X[i])
+                    if d2.min() <= self._limit:
+                        continue
+                kept.append(i)
+            keep[kept] = True
+        for i in np.flatnonzero(keep):
+            self._add(X[i], norms[i])
+        self.accepted += int(keep.sum())
+        return keep
+
+    def accept(self, x):
+        """True si `x` est gardé (et ajouté au réservoir), False si c'est un quasi-doublon."""
+        return bool(self.accept_many(x)[0])
+
+    def stats(self):
+        return {
+            "threshold": self.threshold,
+            "seen": self.seen,
+            "accepted": self.accepted,
+            "rejected": self.seen - self.accepted,
+            "kept_rate": self.accepted / self.seen if self.seen else 1.0,
+        }
+
+
+def deduplicate(X, threshold=DEFAULT_THRESHOLD, capacity=DEFAULT_CAPACITY, block_rows=512):
+    """Masque des lignes gardées de X (parcourues dans l'ordre, par blocs)."""
+    dedup = DuplicateFilter(threshold, capacity, X.shape[1])
+    return np.concatenate([
+        dedup.accept_many(X[start:start + block_rows]) for start in range(0, len(X), block_rows)
+    ]) if len(X) else np.zeros(0, dtype=bool)
+
+
+def dedup_file(path, threshold=DEFAULT_THRESHOLD, capacity=DEFAULT_CAPACITY, out=None):
+    """
+    Écrit les lignes gardées de `path` dans `out` (`{name}.dedup.npy` par
+    défaut, `path` lui-même pour remplacer le fichier) ; retourne (avant, après).
+    """
+    from dataset_store import schema_path
+
+    X = np.load(path, mmap_mode="r")
+    keep = deduplicate(X, threshold, capacity)
+    out = out or os.path.splitext(path)[0] + ".dedup.npy"
+    tmp = out + ".tmp.npy"
+    np.save(tmp, X[keep])
+    del X
+    os.replace(tmp, out)
+
+    # Schéma à côté du fichier de sortie : nombre de lignes et trace du filtrage
+    source_schema = schema_path(path)
+    if os.path.exists(source_schema):
+        with open(source_schema) as f:
+            schema = json.load(f)
+        schema["rows"] = int(keep.sum())
+        schema.setdefault("deduplication", []).append({
+            "threshold": threshold, "capacity": capacity, "before": len(keep),
+            "after": int(keep.sum()), "time": time.time(),
+        })
+        with open(schema_path(out) + ".tmp", "w") as f:
+            json.dump(schema, f, indent=2)
+        os.replace(schema_path(out) + ".tmp", schema_path(out))
+    return len(keep), int(keep.sum())
+
+
+def _softmax_regression(X, y, n_classes, epochs, lr=0.5, batch_size=32, seed=0):
+    """Classifieur de secours (Keras absent) : régression logistique multinomiale NumPy."""
+    rng = np.random.default_rng(seed)
+    mean, std = X.mean(axis=0), X.std(axis=0) + 1e-6
+    Xn = (X - mean) / std
+    W = np.zeros((X.shape[1], n_classes), dtype=np.float32)
+    b = np.zeros(n_classes, dtype=np.float32)
+    eye = np.eye(n_classes, dtype=np.float32)
+    for _ in range(epochs):
+        order = rng.permutation(len(X))
+        for start in range(0, len(X), batch_size):
+            idx = order[start:start + batch_size]
+            logits = Xn[idx] @ W + b
+            p = np.exp(logits - logits.max(axis=1, keepdims=True))
+            p /= p.sum(axis=1, keepdims=True)
+            grad = (p - eye[y[idx]]) / len(idx)
+            W -= lr * (Xn[idx].T @ grad)
+            b -= lr * grad.sum(axis=0)
+    return lambda Z: ((Z - mean) / std @ W + b).argmax(axis=1)
+
+
+def report(thresholds=REPORT_THRESHOLDS, epochs=30, validation=0.2,
+           manifest_path=None):
+    """Lignes gardées, temps d'entraînement et précision de validation pour chaque seuil."""
+    from data_loader import MANIFEST_PATH, load_manifest
+
+    manifest = load_manifest(manifest_path or MANIFEST_PATH)
+    directory = os.path.dirname(manifest_path or MANIFEST_PATH) or "."
+    labels = [c["label"] for c in manifest["classes"]]
+
+    # Fin de chaque fichier en validation (jamais filtrée), début en entraînement
+    train_parts, val_parts = [], []
+    for index, c in enumerate(manifest["classes"]):
+        for filename in c["files"]:
+            X = np.asarray(np.load(os.path.join(directory, filename), mmap_mode="r"), dtype=np.float32)
+            n_val = int(round(len(X) * validation))
+            train_parts.append((X[:len(X) - n_val], index))
+            val_parts.append((X[len(X) - n_val:], index))
+    X_val = np.concatenate([X for X, _ in val_parts])
+    y_val = np.concatenate([np.full(len(X), i, dtype=np.int32) for X, i in val_parts])
+
+    import importlib.util
+
+    trainer = "Keras" if importlib.util.find_spec("keras") else "régression logistique NumPy (Keras absent)"
+
+    def train(X, y):
+        if trainer == "Keras":
+            from training import build_model, fit_model
+
+            model = build_model(X.shape[1], len(labels))
+            fit_model(model, X, y, len(labels), epochs=epochs, verbose=0)
+            return lambda Z: model.predict(Z, verbose=0).argmax(axis=1)
+        return _softmax_regression(X, y, len(labels), epochs)
+
+    print(f"{len(labels)} classes, validation : {len(X_val)} lignes (fin de chaque fichier) ; "
+          f"entraînement : {trainer}, {epochs} époques")
+    print(f"{'seuil':>8s} | {'lignes':>8s} | {'gardées':>7s} | {'filtrage ms':>11s} | "
+          f"{'entraînement s':>14s} | précision val")
+    for threshold in (0.0,) + tuple(thresholds):
+        start = time.perf_counter()
+        kept = [(X[deduplicate(X, threshold)], i) for X, i in train_parts]
+        filter_ms = (time.perf_counter() - start) * 1000.0
+        X_train = np.concatenate([X for X, _ in kept])
+        y_train = np.concatenate([np.full(len(X), i, dtype=np.int32) for X, i in kept])
+
+        start = time.perf_counter()
+        predict = train(X_train, y_train)
+        train_s = time.perf_counter() - start
+        accuracy = float((predict(X_val) == y_val).mean())
+        total = sum(len(X) for X, _ in train_parts)
+        print(f"{threshold:8.5f} | {len(X_train):8d} | {len(X_train) / total:7.0%} | {filter_ms:11.1f} | "
+              f"{train_s:14.2f} | {accuracy:.3f}")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Filtrage des échantillons quasi identiques")
+    parser.add_argument("files", nargs="+", help="fichiers .npy à filtrer, ou 'report'")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="écart quadratique moyen minimal par coordonnée")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY, help="taille du réservoir")
+    parser.add_argument("--in-place", action="store_true", help="remplacer les fichiers au lieu d'écrire {name}.dedup.npy")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=None, help="seuils comparés par le rapport")
+    parser.add_argument("--epochs", type=int, default=30, help="époques d'entraînement du rapport")
+    parser.add_argument("--manifest", default=None)
+    args = parser.parse_args(argv)
+
+    if args.files == ["report"]:
+        report(tuple(args.thresholds or REPORT_THRESHOLDS), args.epochs,
+               manifest_path=args.manifest)
+        return
+    for path in args.files:
+        out = path if args.in_place else None
+        before, after = dedup_file(path, args.threshold, args.capacity, out)
+        print(f"{path}: {before} -> {after} lignes ({1 - after / before if before else 0:.0%} retirées)")
+
+
+if __name__ == "__main__":
+    main()
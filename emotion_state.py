@@ -0,0 +1,77 @@
+"""
+Canal d'état d'émotion en mémoire, propre à chaque session
+
+Le thread vidéo publie chaque émotion détectée dans un `EmotionState`, et
+le script Streamlit de la même session la relit (affichage, bouton de
+recommandation). Entre deux changements d'émotion, `refresh` tient à jour
+la confiance affichée. Aucun fichier n'est écrit sur le chemin critique, et
+deux utilisateurs connectés en même temps ne partagent plus d'état.
+
+Une persistance sur disque reste possible, mais seulement si un chemin
+est fourni explicitement. Un changement d'émotion est toujours écrit, pour
+que le fichier ne reste jamais sur une émotion périmée ; la même émotion
+n'est réécrite qu'une fois toutes les `persist_interval` secondes.
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+EmotionReading = namedtuple("EmotionReading", ["emotion", "confidence", "timestamp"])
+
+
+class EmotionState:
+    def __init__(self, history_size=50, persist_path=None, persist_interval=5.0):
+        self._lock = threading.Lock()
+        self._latest = None
+        self._history = deque(maxlen=history_size)
+
+        self.persist_path = persist_path
+        self.persist_interval = persist_interval
+        self._last_persist = 0.0
+        self._persisted = None  # dernière émotion écrite sur disque
+
+    def publish(self, emotion, confidence, timestamp=None):
+        """Enregistre une nouvelle détection (appelé depuis le thread vidéo)."""
+        reading = EmotionReading(str(emotion), float(confidence), timestamp or time.time())
+        with self._lock:
+            self._latest = reading
+            self._history.append(reading)
+            persist = self.persist_path is not None and (
+                reading.emotion != self._persisted
+                or reading.timestamp - self._last_persist >= self.persist_interval
+            )
+            if persist:
+                self._last_persist = reading.timestamp
+                self._persisted = reading.emotion
+
+        if persist:
+            # Même format que l'ancien emotion.npy
+            np.save(self.persist_path, np.array([reading.emotion]))
+
+    def refresh(self, confidence, timestamp=None):
+        """
+        Met à jour la confiance de l'émotion courante (appelé à chaque
+        inférence, entre deux changements) ; ni historique, ni écriture.
+        """
+        with self._lock:
+            if self._latest is not None:
+                self._latest = self._latest._replace(
+                    confidence=float(confidence), timestamp=timestamp or time.time())
+
+    def latest(self):
+        """Dernière détection, ou None si aucune émotion n'a encore été vue."""
+        with self._lock:
+            return self._latest
+
+    def history(self):
+        """Copie des détections récentes, de la plus ancienne à la plus récente."""
+        with self._lock:
+            return list(self._history)
+
+    def clear(self):
+        with self._lock:
+            self._latest = None
+            self._history.clear()
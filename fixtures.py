@@ -0,0 +1,174 @@
+"""
+Fixtures enregistrées et synthétiques pour les benchmarks (sans caméra)
+
+Une fixture est un fichier `.npz` contenant :
+- `frames` : frames BGR brutes (n, h, w, 3), telles que lues par la caméra ;
+- les résultats MediaPipe Holistic de chaque frame (après miroir), sous
+  forme de protobufs sérialisés et concaténés (`{champ}_data`,
+  `{champ}_offsets`), lisibles sans pickle.
+
+`ReplayHolistic` rejoue ces résultats à la place d'un vrai détecteur, ce
+qui permet de mesurer le reste du pipeline sans MediaPipe ni caméra.
+
+Usage (enregistrer une fixture depuis une vidéo ou une caméra) :
+    python fixtures.py record <video.mp4 | index_camera> fixture.npz [nb_frames]
+"""
+
+import itertools
+import sys
+
+import numpy as np
+
+from features import FACE_POINTS, HAND_POINTS
+from holistic_pool import HolisticResult
+
+FIELDS = HolisticResult._fields
+
+
+def _pack(blobs):
+    """Concatène des octets (ou None) en un tableau de données et d'offsets."""
+    offsets = [0]
+    present = []
+    for blob in blobs:
+        present.append(blob is not None)
+        offsets.append(offsets[-1] + (len(blob) if blob else 0))
+    data = np.frombuffer(b"".join(b for b in blobs if b), dtype=np.uint8)
+    return data, np.array(offsets, dtype=np.int64), np.array(present)
+
+
+def _unpack(data, offsets, present):
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]] if present[i] else None for i in range(len(present))]
+
+
+def save_fixture(path, frames, results):
+    """Écrit des frames BGR et leurs résultats Holistic dans `path`."""
+    arrays = {"frames": np.asarray(frames, dtype=np.uint8)}
+    for field in FIELDS:
+        blobs = [getattr(r, field).SerializeToString() if getattr(r, field) else None for r in results]
+        arrays[f"{field}_data"], arrays[f"{field}_offsets"], arrays[f"{field}_present"] = _pack(blobs)
+    np.savez_compressed(path, **arrays)
+
+
+def load_fixture(path):
+    """Retourne (frames, [HolisticResult]) d'une fixture enregistrée."""
+    from mediapipe.framework.formats import landmark_pb2
+
+    with np.load(path) as data:
+        frames = data["frames"]
+        columns = [
+            _unpack(data[f"{f}_data"], data[f"{f}_offsets"], data[f"{f}_present"]) for f in FIELDS
+        ]
+    results = [
+        HolisticResult(*(
+            landmark_pb2.NormalizedLandmarkList.FromString(b) if b is not None else None for b in row
+        ))
+        for row in zip(*columns)
+    ]
+    return frames, results
+
+
+def synthetic_frames(n=30, height=480, width=640, seed=0):
+    """Frames BGR aléatoires (bruit) de la taille d'une webcam."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (n, height, width, 3), dtype=np.uint8)
+
+
+def synthetic_results(n=30, hands=(True, False), seed=0):
+    """
+    Résultats Holistic synthétiques : visage centré légèrement bruité et
+    mains optionnelles, au format protobuf de MediaPipe.
+    """
+    from mediapipe.framework.formats import landmark_pb2
+
+    rng = np.random.default_rng(seed)
+    face_base = 0.5 + 0.1 * rng.standard_normal((FACE_POINTS, 3))
+    hand_base = 0.5 + 0.05 * rng.standard_normal((HAND_POINTS, 3))
+
+    def landmark_list(base, jitter):
+        pts = base + jitter * rng.standard_normal(base.shape)
+        lms = landmark_pb2.NormalizedLandmarkList()
+        for x, y, z in pts:
+            lms.landmark.add(x=float(x), y=float(y), z=float(z))
+        return lms
+
+    left, right = hands
+    return [
+        HolisticResult(
+            landmark_list(face_base, 0.002),
+            landmark_list(hand_base - 0.2, 0.005) if left else None,
+            landmark_list(hand_base + 0.2, 0.005) if right else None,
+        )
+        for _ in range(n)
+    ]
+
+
+def burn_cpu(seconds):
+    """
+    Calcul NumPy jusqu'à avoir consommé `seconds` de temps CPU dans ce
+    thread : comme MediaPipe, le coût occupe un cœur (hors GIL) et dure
+    plus longtemps quand les cœurs sont tous occupés.
+    """
+    import time
+
+    buf = np.ones(16384)
+    end = time.thread_time() + seconds
+    while time.thread_time() < end:
+        np.sqrt(buf, out=buf)
+        buf += 1.0
+
+
+class ReplayHolistic:
+    """
+    Détecteur factice qui renvoie en boucle des résultats enregistrés.
+
+    `delay` simule le coût de MediaPipe : du calcul (`burn_cpu`) par défaut,
+    une simple attente avec `cpu=False`.
+    """
+
+    def __init__(self, results, delay=0.0, cpu=True):
+        self._results = itertools.cycle(results)
+        self.delay = delay  # coût simulé de MediaPipe (s)
+        self.cpu = cpu
+        self.saturated = 0
+
+    def process(self, rgb):
+        if self.delay:
+            if self.cpu:
+                burn_cpu(self.delay)
+            else:
+                import time
+
+                time.sleep(self.delay)
+        return next(self._results)
+
+    def release(self):
+        pass
+
+
+def record(source, path, n_frames=100):
+    """Enregistre `n_frames` frames et leurs résultats Holistic (après miroir)."""
+    import cv2
+    import mediapipe as mp
+
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    holis = mp.solutions.holistic.Holistic()
+    frames, results = [], []
+    while len(frames) < n_frames:
+        ok, frm = cap.read()
+        if not ok:
+            break
+        res = holis.process(cv2.cvtColor(cv2.flip(frm, 1), cv2.COLOR_BGR2RGB))
+        frames.append(frm)
+        results.append(HolisticResult(*(getattr(res, f) for f in FIELDS)))
+    cap.release()
+    holis.close()
+    save_fixture(path, frames, results)
+    return len(frames)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "record":
+        sys.exit("Usage: python fixtures.py record <video | index_camera> fixture.npz [nb_frames]")
+    n = record(sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else 100)
+    print(f"{n} frames enregistrées dans {sys.argv[3]}")
@@ -0,0 +1,245 @@
+"""
+Pool de processus MediaPipe Holistic partagé entre les sessions
+
+Un seul `holistic.Holistic()` partagé par toutes les sessions sérialise
+tous les utilisateurs sur un seul graphe, donc sur un seul cœur. Ce module
+lance plusieurs processus, chacun avec son propre graphe Holistic, pour
+échapper au GIL et utiliser tous les cœurs de la machine.
+
+Chaque session « loue » un worker (`HolisticPool.lease`), choisi parmi les
+moins chargés. Le worker est conservé pendant toute la session afin que le
+suivi temporel de MediaPipe voie des frames consécutives du même flux.
+Quand il y a plus de sessions que de workers, plusieurs sessions partagent
+un worker ; si celui-ci est occupé trop longtemps, `process` renvoie None
+et l'appelant réutilise son résultat précédent au lieu d'accumuler du
+retard. Un worker dont le processus meurt est relancé : la frame en cours
+est perdue (None), les suivantes sont servies par le nouveau processus.
+
+Les résultats reviennent sous forme de `HolisticResult`, qui expose les
+mêmes attributs que le résultat de MediaPipe (`face_landmarks`,
+`left_hand_landmarks`, `right_hand_landmarks`).
+
+Usage (débit en fonction du nombre de workers, frames synthétiques) :
+    python holistic_pool.py [nb_workers_max] [secondes_par_mesure]
+"""
+
+import atexit
+import multiprocessing as mp
+import os
+import threading
+from collections import namedtuple
+
+HolisticResult = namedtuple(
+    "HolisticResult", ["face_landmarks", "left_hand_landmarks", "right_hand_landmarks"]
+)
+
+
+def default_workers():
+    """Nombre de workers : HOLISTIC_WORKERS, sinon le nombre de cœurs."""
+    return int(os.environ.get("HOLISTIC_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def _serve(conn, options):
+    """Boucle d'un processus worker : reçoit des images RGB, renvoie les landmarks."""
+    import mediapipe
+
+    holis = mediapipe.solutions.holistic.Holistic(**options)
+    while True:
+        try:
+            rgb = conn.recv()
+        except EOFError:
+            break
+        if rgb is None:
+            break
+        try:
+            res = holis.process(rgb)
+            # Les protobufs sont sérialisés : le résultat natif de MediaPipe
+            # n'est pas transférable entre processus
+            conn.send(tuple(
+                lms.SerializeToString() if lms else None
+                for lms in (getattr(res, f) for f in HolisticResult._fields)
+            ))
+        except Exception as e:
+            conn.send(e)
+    holis.close()
+
+
+def _decode(payload):
+    from mediapipe.framework.formats import landmark_pb2
+
+    return HolisticResult(*(
+        landmark_pb2.NormalizedLandmarkList.FromString(b) if b else None for b in payload
+    ))
+
+
+class _Worker:
+    def __init__(self, ctx, options):
+        self._ctx = ctx
+        self._options = options
+        self.lock = threading.Lock()
+        self.leases = 0
+        self.restarts = 0
+        self._spawn()
+
+    def _spawn(self):
+        self.conn, child = self._ctx.Pipe()
+        self.process = self._ctx.Process(target=_serve, args=(child, self._options), daemon=True)
+        self.process.start()
+        child.close()
+
+    def _respawn(self):
+        """Remplace un processus mort (appelé avec `lock` acquis)."""
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(1.0)
+        self.restarts += 1
+        self._spawn()
+
+    def process_frame(self, rgb, timeout):
+        """Landmarks de `rgb` ; None si le worker est occupé ou vient d'être relancé."""
+        if not self.lock.acquire(timeout=-1 if timeout is None else timeout):
+            return None
+        try:
+            self.conn.send(rgb)
+            payload = self.conn.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            self._respawn()
+            return None
+        finally:
+            self.lock.release()
+        if isinstance(payload, Exception):
+            raise payload
+        return _decode(payload)
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class HolisticLease:
+    """Accès d'une session à un worker du pool."""
+
+    def __init__(self, pool, worker):
+        self._pool = pool
+        self._worker = worker
+        self.saturated = 0  # frames abandonnées car le worker était occupé
+
+    def process(self, rgb, timeout=None):
+        """
+        Retourne un `HolisticResult`, ou None si le worker est resté occupé
+        plus de `timeout` secondes (par défaut celui du pool) ou si son
+        processus est mort pendant la frame (il est alors relancé).
+        """
+        timeout = self._pool.timeout if timeout is None else timeout
+        res = self._worker.process_frame(rgb, timeout)
+        if res is None:
+            with self._pool._lock:
+                self.saturated += 1
+                self._pool.saturated += 1
+        return res
+
+    def release(self):
+        if self._worker is not None:
+            self._pool._release(self._worker)
+            self._worker = None
+
+
+class HolisticPool:
+    def __init__(self, workers=None, timeout=0.1, **options):
+        # "spawn" : ne pas dupliquer par fork un processus plein de threads
+        ctx = mp.get_context("spawn")
+        self.timeout = timeout
+        self.saturated = 0
+        self._lock = threading.Lock()
+        self._workers = [_Worker(ctx, options) for _ in range(workers or default_workers())]
+        atexit.register(self.close)
+
+    @property
+    def size(self):
+        return len(self._workers)
+
+    @property
+    def pids(self):
+        """PID des processus workers (mesure du CPU et de la mémoire)."""
+        return [w.process.pid for w in self._workers]
+
+    def lease(self):
+        """Attribue à une session le worker qui a le moins de sessions."""
+        with self._lock:
+            worker = min(self._workers, key=lambda w: w.leases)
+            worker.leases += 1
+        return HolisticLease(self, worker)
+
+    def _release(self, worker):
+        with self._lock:
+            worker.leases -= 1
+
+    def stats(self):
+        with self._lock:
+            leases = [w.leases for w in self._workers]
+        return {
+            "workers": self.size,
+            "sessions": sum(leases),
+            "busy": sum(w.lock.locked() for w in self._workers),
+            "saturated": self.saturated,
+            "restarts": sum(w.restarts for w in self._workers),
+        }
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+        self._workers = []
+
+
+def _throughput(workers, seconds, frames):
+    """Débit total (frames/s) avec une session par worker."""
+    import time
+
+    pool = HolisticPool(workers, timeout=None)
+    leases = [pool.lease() for _ in range(workers)]
+    # Préchauffage : chargement des graphes dans chaque processus
+    for lease in leases:
+        lease.process(frames[0])
+
+    counts = [0] * workers
+    stop = time.perf_counter() + seconds
+
+    def run(i):
+        while time.perf_counter() < stop:
+            leases[i].process(frames[counts[i] % len(frames)])
+            counts[i] += 1
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(workers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return sum(counts) / elapsed
+
+
+if __name__ == "__main__":
+    import sys
+
+    import numpy as np
+
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(8)]
+
+    base = None
+    print("workers | frames/s | accélération")
+    for n in range(1, max_workers + 1):
+        fps = _throughput(n, seconds, frames)
+        base = base or fps
+        print(f"{n:7d} | {fps:8.1f} | x{fps / base:.2f}")
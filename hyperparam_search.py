@@ -0,0 +1,350 @@
+"""
+Recherche d'hyperparamètres du classifieur d'émotions
+
+Entraîne une série de configurations (couches cachées, optimiseur, taux
+d'apprentissage, époques, taille de lot, réduction des features) et les
+classe par précision de validation, taille et latence d'inférence :
+
+- les essais tournent en parallèle, un processus par essai (contexte
+  "spawn", un processus neuf par essai) ; le nombre de threads de chaque
+  processus (BLAS, TensorFlow) est borné pour que les essais ne se
+  disputent pas les cœurs ;
+- le dataset est écrit une fois dans `<out>/X.npy` et mappé en lecture
+  seule par chaque essai au lieu d'être copié ;
+- chaque essai garde une part de validation fixe (même tirage pour tous),
+  s'arrête après `patience` époques sans progrès et sauvegarde ses
+  meilleurs poids dans `<out>/<essai>/checkpoint.weights.h5` ;
+- un essai terminé écrit `<out>/<essai>/result.json` : relancer la
+  recherche reprend là où elle s'était arrêtée ;
+- la latence (réduction + passe avant NumPy, par frame) est mesurée
+  ensuite, essai par essai, dans le processus principal, pour que les
+  chiffres ne soient pas faussés par les entraînements concurrents.
+
+Le classement est écrit dans `<out>/leaderboard.csv` et
+`<out>/leaderboard.json` ; les essais de la frontière précision/latence
+(aucun autre essai n'est à la fois plus rapide et plus précis) sont marqués.
+
+Usage :
+    python hyperparam_search.py run [--mode random|grid] [--trials N] [--workers N] [--threads N]
+    python hyperparam_search.py leaderboard [--out search]
+    python hyperparam_search.py promote search/<essai>
+"""
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+import timeit
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import multiprocessing as mp
+
+import numpy as np
+
+from numpy_model import NPZ_PATH, NumpyModel
+from reduction import EXPRESSION_REGIONS, REDUCTION_PATH, FeatureReducer
+
+SEARCH_DIR = "search"
+
+# Espace de recherche : chaque essai choisit une valeur par clé
+SEARCH_SPACE = {
+    "layers": [(512, 256), (256, 128), (128, 64), (256,), (1024, 512)],
+    "optimizer": ["rmsprop", "adam"],
+    "learning_rate": [1e-3, 3e-4],
+    "epochs": [50, 100],
+    "batch_size": [32, 64],
+    "reduction": [
+        {},
+        {"regions": EXPRESSION_REGIONS},
+        {"n_components": 64},
+        {"regions": EXPRESSION_REGIONS, "n_components": 32},
+    ],
+}
+
+# Variables lues au chargement des bibliothèques de calcul
+THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                    "TF_NUM_INTRAOP_THREADS")
+
+COLUMNS = ("trial", "val_acc", "latency_us", "size_kb", "params", "epochs_run", "best_epoch",
+           "train_seconds", "frontier", "layers", "optimizer", "learning_rate", "batch_size", "reduction")
+
+
+def grid_configs(space=SEARCH_SPACE):
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def random_configs(n, space=SEARCH_SPACE, seed=0):
+    """`n` configurations distinctes tirées au hasard (moins si l'espace est plus petit)."""
+    rng = np.random.default_rng(seed)
+    configs, seen = [], set()
+    for _ in range(n * 20):
+        if len(configs) == n:
+            break
+        config = {k: values[rng.integers(len(values))] for k, values in space.items()}
+        key = trial_id(config)
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+def trial_id(config):
+    """Identifiant stable d'une configuration (nom du dossier de l'essai)."""
+    text = json.dumps(config, sort_keys=True, default=list)
+    return hashlib.sha1(text.encode()).hexdigest()[:10]
+
+
+def describe(config):
+    layers = "-".join(str(u) for u in config["layers"])
+    return f"{layers} {config['optimizer']} lr={config['learning_rate']:g} bs={config['batch_size']}"
+
+
+def prepare_data(out, manifest_path=None):
+    """Écrit X (mappé sur disque), y et les labels dans `out` ; retourne le nombre de lignes."""
+    from data_loader import MANIFEST_PATH, load_dataset, load_manifest
+
+    os.makedirs(out, exist_ok=True)
+    # Fichier temporaire renommé à la fin : un X.npy présent est toujours complet
+    path = os.path.join(out, "X.npy")
+    X, y, labels = load_dataset(load_manifest(manifest_path or MANIFEST_PATH), mmap_path=path + ".tmp")
+    X.flush()
+    n = len(X)
+    del X
+    os.replace(path + ".tmp", path)
+    np.save(os.path.join(out, "y.npy"), y)
+    np.save(os.path.join(out, "labels.npy"), np.array(labels))
+    return n
+
+
+def _run_trial(config, out, validation, patience, seed):
+    """Un essai, dans son propre processus : entraînement, export NumPy, précision de validation."""
+    from data_loader import split
+    from numpy_model import export_model
+    from training import build_model, fit_model
+
+    directory = os.path.join(out, trial_id(config))
+    os.makedirs(directory, exist_ok=True)
+    X = np.load(os.path.join(out, "X.npy"), mmap_mode="r")
+    y = np.load(os.path.join(out, "y.npy"))
+    n_classes = len(np.load(os.path.join(out, "labels.npy")))
+    train, val = split(len(X), validation, seed)
+
+    # Réduction apprise sur les lignes d'entraînement seulement
+    reducer = FeatureReducer(**config["reduction"]).fit(X[np.sort(train)])
+    Xr = reducer.transform(X)
+
+    start = time.perf_counter()
+    model = build_model(reducer.output_dim, n_classes, config["layers"], config["optimizer"],
+                        config["learning_rate"])
+    history = fit_model(
+        model, Xr, y, n_classes, train, val, epochs=config["epochs"], batch_size=config["batch_size"],
+        patience=patience, checkpoint=os.path.join(directory, "checkpoint.weights.h5"), resume=True,
+        verbose=0,
+    )
+    train_seconds = time.perf_counter() - start
+
+    export_model(model, os.path.join(directory, NPZ_PATH), rows=len(X), validation=val)
+    reducer.save(os.path.join(directory, REDUCTION_PATH))
+    fast = NumpyModel.load(os.path.join(directory, NPZ_PATH))
+    val = np.sort(val)
+    accuracy = float((fast.predict(Xr[val]).argmax(axis=1) == y[val]).mean())
+
+    result = {
+        "trial": trial_id(config),
+        "config": config,
+        "val_acc": accuracy,
+        "epochs_run": len(history["loss"]),
+        "best_epoch": int(np.argmax(history["val_acc"])) + 1 if history.get("val_acc") else None,
+        "train_seconds": train_seconds,
+        "input_dim": reducer.output_dim,
+    }
+    with open(os.path.join(directory, "result.json"), "w") as f:
+        json.dump(result, f, indent=2, default=list)
+    return result
+
+
+def load_result(out, config):
+    path = os.path.join(out, trial_id(config), "result.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def measure_latency(directory, x, number=500, repeat=3):
+    """Latence par frame (µs) : réduction + passe avant NumPy, sur un vecteur brut."""
+    model = NumpyModel.load(os.path.join(directory, NPZ_PATH))
+    reducer = FeatureReducer.load(os.path.join(directory, REDUCTION_PATH))
+    model.predict(reducer.transform(x))
+    seconds = min(timeit.repeat(lambda: model.predict(reducer.transform(x)), number=number, repeat=repeat))
+    return seconds / number * 1e6, model
+
+
+def pareto_frontier(rows):
+    """Marque les essais qu'aucun autre ne bat à la fois en précision et en latence."""
+    best = -1.0
+    for row in sorted(rows, key=lambda r: (r["latency_us"], -r["val_acc"])):
+        row["frontier"] = row["val_acc"] > best
+        best = max(best, row["val_acc"])
+    return rows
+
+
+def leaderboard(out=SEARCH_DIR):
+    """Classement de tous les essais terminés de `out`, écrit en CSV et JSON."""
+    results = []
+    for name in sorted(os.listdir(out)) if os.path.isdir(out) else []:
+        path = os.path.join(out, name, "result.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                results.append(json.load(f))
+    if not results:
+        return []
+
+    # Latence mesurée en série, sur la première ligne brute du dataset
+    x = np.asarray(np.load(os.path.join(out, "X.npy"), mmap_mode="r")[:1], dtype=np.float32)
+    rows = []
+    for result in results:
+        directory = os.path.join(out, result["trial"])
+        latency, model = measure_latency(directory, x)
+        config = result["config"]
+        rows.append({
+            "trial": result["trial"],
+            "val_acc": result["val_acc"],
+            "latency_us": latency,
+            "size_kb": os.path.getsize(os.path.join(directory, NPZ_PATH)) / 1024,
+            "params": int(sum(W.size + b.size for W, b in zip(model.weights, model.biases))),
+            "epochs_run": result["epochs_run"],
+            "best_epoch": result["best_epoch"],
+            "train_seconds": result["train_seconds"],
+            "frontier": False,
+            "layers": "-".join(str(u) for u in config["layers"]),
+            "optimizer": config["optimizer"],
+            "learning_rate": config["learning_rate"],
+            "batch_size": config["batch_size"],
+            "reduction": FeatureReducer.load(os.path.join(directory, REDUCTION_PATH)).describe(),
+        })
+    pareto_frontier(rows)
+    rows.sort(key=lambda r: (-r["val_acc"], r["latency_us"]))
+
+    with open(os.path.join(out, "leaderboard.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.join(out, "leaderboard.json"), "w") as f:
+        json.dump(rows, f, indent=2)
+    return rows
+
+
+def print_leaderboard(rows, limit=20):
+    print(f"  {'essai':10s} | précision | µs/frame | Ko    | époques | configuration")
+    for row in rows[:limit]:
+        mark = "*" if row["frontier"] else " "
+        print(
+            f"{mark} {row['trial']:10s} | {row['val_acc']:9.3f} | {row['latency_us']:8.1f} | "
+            f"{row['size_kb']:5.0f} | {row['epochs_run']:3d}/{row['best_epoch'] or '-':<3} | "
+            f"{row['layers']} {row['optimizer']} lr={row['learning_rate']:g} bs={row['batch_size']}, "
+            f"{row['reduction']}"
+        )
+    if len(rows) > limit:
+        print(f"  ... {len(rows) - limit} autres essais dans leaderboard.csv")
+    print("* frontière précision/latence")
+
+
+def search(configs, out=SEARCH_DIR, workers=None, threads=1, validation=0.2, patience=8, seed=0,
+           manifest_path=None):
+    """Exécute les essais non encore terminés, puis écrit et retourne le classement."""
+    if not os.path.exists(os.path.join(out, "X.npy")):
+        n = prepare_data(out, manifest_path)
+        print(f"{n} lignes écrites dans {out}/X.npy")
+    pending = [c for c in configs if load_result(out, c) is None]
+    print(f"{len(configs)} essais, {len(configs) - len(pending)} déjà terminés")
+
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+    # Les processus "spawn" héritent de l'environnement au démarrage : les
+    # bornes sont lues par NumPy/TensorFlow avant tout calcul dans l'essai
+    env = {name: str(threads) for name in THREAD_VARIABLES}
+    env.update(TF_NUM_INTEROP_THREADS="1", TF_CPP_MIN_LOG_LEVEL="2")
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        with ProcessPoolExecutor(min(workers, len(pending)) or 1, mp_context=mp.get_context("spawn"),
+                                 max_tasks_per_child=1) as executor:
+            futures = {executor.submit(_run_trial, c, out, validation, patience, seed): c for c in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                config = futures[future]
+                try:
+                    result = future.result()
+                except Exception as error:
+                    print(f"[{done}/{len(pending)}] {trial_id(config)} échec : {error}", file=sys.stderr)
+                    continue
+                print(
+                    f"[{done}/{len(pending)}] {result['trial']} {describe(config)} : "
+                    f"précision {result['val_acc']:.3f}, {result['epochs_run']} époques, "
+                    f"{result['train_seconds']:.0f} s"
+                )
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return leaderboard(out)
+
+
+def promote(directory):
+    """Publie le modèle d'un essai comme nouvelle version active du registre des modèles."""
+    from registry import ModelRegistry
+
+    with open(os.path.join(directory, "result.json")) as f:
+        result = json.load(f)
+    labels = np.load(os.path.join(os.path.dirname(os.path.normpath(directory)), "labels.npy"))
+    reducer = FeatureReducer.load(os.path.join(directory, REDUCTION_PATH))
+    scores = {k: result[k] for k in ("val_acc", "epochs_run", "best_epoch", "train_seconds")}
+    return ModelRegistry().publish(os.path.join(directory, NPZ_PATH), labels, reducer, scores,
+                                   source=f"hyperparam_search {result['trial']} {describe(result['config'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recherche d'hyperparamètres du classifieur d'émotions")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="exécuter les essais puis écrire le classement")
+    run.add_argument("--mode", choices=("random", "grid"), default="random")
+    run.add_argument("--trials", type=int, default=20, help="nombre d'essais (mode random)")
+    run.add_argument("--workers", type=int, default=None, help="essais en parallèle (défaut : cœurs / threads)")
+    run.add_argument("--threads", type=int, default=1, help="threads de calcul par essai")
+    run.add_argument("--validation", type=float, default=0.2, help="part des lignes gardée pour la validation")
+    run.add_argument("--patience", type=int, default=8, help="époques sans progrès avant l'arrêt")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--manifest", default=None)
+    run.add_argument("--out", default=SEARCH_DIR)
+
+    board = commands.add_parser("leaderboard", help="recalculer et afficher le classement")
+    board.add_argument("--out", default=SEARCH_DIR)
+
+    prom = commands.add_parser("promote", help="publier le modèle d'un essai dans le registre des modèles")
+    prom.add_argument("trial_dir")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        configs = grid_configs() if args.mode == "grid" else random_configs(args.trials, seed=args.seed)
+        rows = search(configs, args.out, args.workers, args.threads, args.validation, args.patience,
+                      args.seed, args.manifest)
+    elif args.command == "leaderboard":
+        rows = leaderboard(args.out)
+    else:
+        print(f"Version {promote(args.trial_dir)} publiée et activée")
+        return
+    if not rows:
+        sys.exit(f"Aucun essai terminé dans {args.out}")
+    print_leaderboard(rows)
+    print(f"Classement écrit dans {os.path.join(args.out, 'leaderboard.csv')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Worker d'inférence asynchrone, découplé du callback vidéo WebRTC
+
+`EmotionProcessor.recv` doit rendre chaque frame le plus vite possible.
+Il dépose donc la frame courante dans la file de `InferenceWorker` et
+repart immédiatement avec le dernier résultat disponible ; un thread
+d'arrière-plan (un par session) exécute MediaPipe et le classifieur.
+
+La file est bornée et « drop-oldest » : quand elle est pleine, la frame la
+plus ancienne est jetée, et le worker traite toujours la frame la plus
+récente en ignorant les frames périmées. La latence vidéo reste ainsi
+bornée quel que soit le coût du modèle.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class InferenceWorker:
+    def __init__(self, process_fn, maxsize=1, name="inference-worker"):
+        # process_fn(item) -> résultat, exécuté dans le thread du worker
+        self.process_fn = process_fn
+        self.maxsize = maxsize
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._result = None
+        self._running = True
+
+        # Métriques
+        self.submitted = 0
+        self.dropped = 0  # frames jetées sans être traitées
+        self.processed = 0
+        self.errors = 0
+        self.last_error = None
+        self.latency = None  # dépôt -> résultat disponible (s), moyenne exponentielle
+        self.process_time = None  # durée de process_fn (s), moyenne exponentielle
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _average(current, value, smoothing=0.2):
+        return value if current is None else current + smoothing * (value - current)
+
+    def submit(self, item):
+        """Dépose un élément à traiter ; ne bloque jamais."""
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append((time.perf_counter(), item))
+            self.submitted += 1
+            self._cond.notify()
+
+    @property
+    def result(self):
+        """Dernier résultat produit par le worker (None au démarrage)."""
+        return self._result
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                # Ne garder que l'élément le plus récent
+                submitted_at, item = self._queue.pop()
+                self.dropped += len(self._queue)
+                self._queue.clear()
+
+            start = time.perf_counter()
+            try:
+                self._result = self.process_fn(item)
+            except Exception as e:
+                # Une frame en erreur ne doit pas arrêter le worker
+                self.errors += 1
+                self.last_error = e
+                continue
+            end = time.perf_counter()
+
+            self.processed += 1
+            self.process_time = self._average(self.process_time, end - start)
+            self.latency = self._average(self.latency, end - submitted_at)
+
+    def stop(self, timeout=1.0):
+        with self._cond:
+            self._running = False
+            self._queue.clear()
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "errors": self.errors,
+            "latency_ms": (self.latency or 0.0) * 1000.0,
+            "process_ms": (self.process_time or 0.0) * 1000.0,
+        }
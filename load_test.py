@@ -0,0 +1,375 @@
+"""
+Test de charge du pipeline vidéo : combien de sessions simultanées ?
+
+Simule N sessions qui envoient des `av.VideoFrame` (fixture enregistrée
+avec `python fixtures.py record`, ou frames synthétiques) à
+`EmotionProcessor.recv` au rythme d'une webcam (`--fps`), sans navigateur
+ni WebRTC, et mesure pour chaque nombre de sessions :
+
+- frames/s obtenues par session (moyenne et pire session) ;
+- latence de `recv` (p50/p95/p99) ;
+- frames perdues : comme la piste WebRTC, une session encore occupée par
+  la frame précédente saute les frames arrivées entre-temps ;
+- inférences/s par session (frames effectivement passées par MediaPipe
+  et le classifieur, après saut de frames et file du worker) ;
+- CPU (en cœurs, processus de test et workers Holistic compris) et RSS.
+
+Détecteur de chaque session :
+- "replay" (défaut) : résultats Holistic rejoués (`fixtures.ReplayHolistic`),
+  avec un coût simulé `--holistic-ms` de temps CPU par frame
+  (`fixtures.burn_cpu` : la charge sature les cœurs comme MediaPipe ;
+  `--holistic-sleep` pour une simple attente) ;
+- "pool"   : vrai MediaPipe, un worker loué par session dans un
+  `HolisticPool` derrière `RoiTracker`, comme dans `music.py` (à utiliser
+  avec une fixture enregistrée : les frames synthétiques n'ont pas de visage).
+
+Les sessions tournent dans des threads du processus de test, ou réparties
+sur `--processes` processus (chacun avec son propre pool), pour séparer le
+coût du GIL de celui de la machine.
+
+La capacité estimée est le plus grand nombre de sessions dont la pire
+session tient 90 % des frames/s demandées avec un p95 de `recv` inférieur
+à l'intervalle entre deux frames. `--save-baseline` / `--check` en font un
+garde-fou de non-régression (code de sortie 1) ; un p95 n'est une
+régression que s'il dépasse `threshold` fois la baseline et d'au moins
+`tolerance-ms` ou 10 % de l'intervalle entre deux frames (`recv` rend la
+main au bout de quelques millisecondes : un rapport seul serait du bruit).
+
+Usage :
+    python load_test.py [--sessions 1 2 4 8 16] [--fps 30] [--duration 10] [--warmup 2]
+                        [--fixture fixture.npz] [--detector replay|pool] [--holistic-ms 15] [--holistic-sleep]
+                        [--processes 1] [--json capacity.json]
+                        [--save-baseline] [--check] [--baseline load_baseline.json] [--threshold 1.25]
+                        [--tolerance-ms 1.0]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import multiprocessing as mp
+
+import numpy as np
+
+from benchmark import _optional, load_classifier, load_inputs
+
+BASELINE_PATH = "load_baseline.json"
+DEFAULT_SESSIONS = (1, 2, 4, 8, 16)
+
+
+def process_usage(pids):
+    """(secondes CPU cumulées, RSS en octets) d'un ensemble de processus."""
+    cpu, rss = 0.0, 0
+    psutil = _optional("psutil")
+    for pid in pids:
+        try:
+            if os.path.exists(f"/proc/{pid}/stat"):
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                # utime et stime (champs 14 et 15), RSS en pages (champ 24)
+                cpu += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+                rss += int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+            elif psutil is not None:
+                proc = psutil.Process(pid)
+                times = proc.cpu_times()
+                cpu += times.user + times.system
+                rss += proc.memory_info().rss
+            elif pid == os.getpid():
+                import resource
+
+                cpu += time.process_time()
+                rss += resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except (OSError, ProcessLookupError):
+            continue
+    return cpu, rss
+
+
+class Session:
+    """Une session simulée : frames envoyées à `recv` au rythme de la caméra."""
+
+    def __init__(self, processor, vframes, fps):
+        self.processor = processor
+        self.vframes = vframes
+        self.interval = 1.0 / fps
+        self.latencies = []
+        self.frames = 0
+        self.dropped = 0
+        self.errors = 0
+        self._window = None  # compteurs du worker au début de la mesure
+
+    def run(self, start_at, measure_at, end_at):
+        clock = time.time
+        while clock() < start_at:
+            time.sleep(min(0.01, max(0.0, start_at - clock())))
+        next_index = 0
+        n = len(self.vframes)
+        while True:
+            now = clock()
+            if now >= end_at:
+                break
+            measuring = now >= measure_at
+            if measuring and self._window is None:
+                worker = self.processor.worker
+                self._window = (worker.processed, worker.dropped, self.processor.holistic.saturated)
+            # Frame courante de la source ; celles arrivées pendant le recv précédent sont perdues
+            due = int((now - start_at) / self.interval)
+            if due > next_index and measuring:
+                self.dropped += due - next_index
+            index = max(due, next_index)
+
+            start = time.perf_counter()
+            try:
+                self.processor.recv(self.vframes[index % n])
+            except Exception:
+                self.errors += 1
+            elapsed = time.perf_counter() - start
+            if measuring:
+                self.latencies.append(elapsed)
+                self.frames += 1
+
+            next_index = index + 1
+            wait = start_at + next_index * self.interval - clock()
+            if wait > 0:
+                time.sleep(wait)
+
+    def stats(self, duration):
+        processed, worker_dropped, saturated = self._window or (0, 0, 0)
+        worker = self.processor.worker
+        return {
+            "fps": self.frames / duration,
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "inference_per_s": (worker.processed - processed) / duration,
+            "worker_dropped": worker.dropped - worker_dropped,
+            "saturated": self.processor.holistic.saturated - saturated,
+            "latencies_ms": [t * 1000.0 for t in self.latencies],
+        }
+
+
+def run_group(config, n_sessions, start_at):
+    """
+    Lance `n_sessions` sessions (threads) dans ce processus ; retourne leurs
+    statistiques et l'usage CPU/mémoire du processus et de ses workers.
+    """
+    import av
+
+    from emotion_state import EmotionState
+    from fixtures import ReplayHolistic
+    from processor import EmotionProcessor
+
+    frames, results = load_inputs(config["fixture"], config["frames"], config["size"])
+    vframes = [av.VideoFrame.from_ndarray(np.ascontiguousarray(f), format="bgr24") for f in frames]
+    model, label, reducer = load_classifier()
+
+    pool = None
+    if config["detector"] == "pool":
+        from holistic_pool import HolisticPool
+        from roi import RoiTracker
+
+        pool = HolisticPool(config["workers"])
+        make_detector = lambda: RoiTracker(pool.lease())
+    else:
+        delay = config["holistic_ms"] / 1000.0
+        make_detector = lambda: ReplayHolistic(results, delay, cpu=not config["holistic_sleep"])
+
+    sessions = []
+    for _ in range(n_sessions):
+        processor = EmotionProcessor(EmotionState(), make_detector(), model, label, reducer)
+        if config["every_n"]:
+            processor.scheduler.every_n = config["every_n"]
+        sessions.append(Session(processor, vframes, config["fps"]))
+
+    measure_at = start_at + config["warmup"]
+    end_at = measure_at + config["duration"]
+    threads = [threading.Thread(target=s.run, args=(start_at, measure_at, end_at), daemon=True)
+               for s in sessions]
+    for thread in threads:
+        thread.start()
+
+    pids = [os.getpid()] + (pool.pids if pool is not None else [])
+    time.sleep(max(0.0, measure_at - time.time()))
+    cpu_start, rss_peak = process_usage(pids)
+    while time.time() < end_at:
+        time.sleep(min(0.5, max(0.0, end_at - time.time())))
+        rss_peak = max(rss_peak, process_usage(pids)[1])
+    cpu_end, rss = process_usage(pids)
+    for thread in threads:
+        thread.join()
+
+    stats = [s.stats(config["duration"]) for s in sessions]
+    for s in sessions:
+        s.processor.on_ended()
+    if pool is not None:
+        pool.close()
+    return {"sessions": stats, "cpu_seconds": cpu_end - cpu_start, "rss_bytes": max(rss_peak, rss)}
+
+
+def run_level(config, n_sessions, processes=1):
+    """Une mesure à `n_sessions` sessions, réparties sur `processes` processus."""
+    groups = [n_sessions // processes + (1 if i < n_sessions % processes else 0) for i in range(processes)]
+    groups = [g for g in groups if g]
+    if len(groups) == 1:
+        parts = [run_group(config, groups[0], time.time() + 0.5)]
+    else:
+        # Départ commun, une fois les processus lancés et les entrées préparées
+        start_at = time.time() + config["startup"]
+        with ProcessPoolExecutor(len(groups), mp_context=mp.get_context("spawn")) as executor:
+            parts = list(executor.map(run_group, [config] * len(groups), groups, [start_at] * len(groups)))
+    return summarize_level(config, n_sessions, parts)
+
+
+def summarize_level(config, n_sessions, parts):
+    sessions = [s for part in parts for s in part["sessions"]]
+    latencies = np.concatenate([s["latencies_ms"] for s in sessions] or [np.zeros(1)])
+    if not len(latencies):
+        latencies = np.zeros(1)
+    fps = np.array([s["fps"] for s in sessions])
+    frames = sum(s["frames"] for s in sessions)
+    dropped = sum(s["dropped"] for s in sessions)
+    duration = config["duration"]
+    return {
+        "sessions": n_sessions,
+        "target_fps": config["fps"],
+        "fps_mean": float(fps.mean()),
+        "fps_min": float(fps.min()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "drop_rate": dropped / (frames + dropped) if frames + dropped else 0.0,
+        "inference_per_s": float(np.mean([s["inference_per_s"] for s in sessions])),
+        "worker_dropped": int(sum(s["worker_dropped"] for s in sessions)),
+        "saturated": int(sum(s["saturated"] for s in sessions)),
+        "errors": int(sum(s["errors"] for s in sessions)),
+        "cpu_cores": sum(p["cpu_seconds"] for p in parts) / duration,
+        "rss_mb": sum(p["rss_bytes"] for p in parts) / 2 ** 20,
+    }
+
+
+def sustains(row, fps):
+    """La pire session tient 90 % du débit et le p95 tient dans l'intervalle entre deux frames."""
+    return row["fps_min"] >= 0.9 * fps and row["p95_ms"] <= 1000.0 / fps and not row["errors"]
+
+
+def capacity(rows, fps):
+    """Plus grand nombre de sessions tenu (0 si aucun)."""
+    held = [row["sessions"] for row in rows if sustains(row, fps)]
+    return max(held) if held else 0
+
+
+def print_curve(rows, fps):
+    print(f"  {'sessions':>8s} | {'fps moy':>7s} | {'fps min':>7s} | {'p50 ms':>7s} | {'p95 ms':>7s} | "
+          f"{'p99 ms':>7s} | {'perdues':>7s} | {'inf/s':>6s} | {'CPU':>6s} | {'RSS Mo':>7s}")
+    for row in rows:
+        mark = " " if sustains(row, fps) else "!"
+        print(
+            f"{mark} {row['sessions']:8d} | {row['fps_mean']:7.1f} | {row['fps_min']:7.1f} | "
+            f"{row['p50_ms']:7.2f} | {row['p95_ms']:7.2f} | {row['p99_ms']:7.2f} | "
+            f"{row['drop_rate']:7.1%} | {row['inference_per_s']:6.1f} | {row['cpu_cores']:6.2f} | "
+            f"{row['rss_mb']:7.0f}"
+        )
+    print(f"! débit ou latence non tenus | capacité estimée : {capacity(rows, fps)} sessions à {fps:g} fps")
+
+
+def save_baseline(report, path=BASELINE_PATH):
+    with open(path, "w") as f:
+        json.dump(dict(report, machine=platform.platform(), cpus=os.cpu_count(), created=time.time()), f, indent=2)
+    return path
+
+
+def check_regressions(report, path=BASELINE_PATH, threshold=1.25, tolerance_ms=1.0):
+    """
+    Écarts à la baseline : capacité en baisse, débit ou p95 dégradés de plus
+    de `threshold` (p95 : et d'au moins `tolerance_ms` ou 10 % de l'intervalle
+    entre deux frames).
+    """
+    with open(path) as f:
+        baseline = json.load(f)
+    regressions = []
+    # Capacité comparée seulement si le palier de la baseline a été mesuré
+    measured = {row["sessions"] for row in report["levels"]}
+    if baseline["capacity"] in measured and report["capacity"] < baseline["capacity"]:
+        regressions.append(f"capacité {baseline['capacity']} -> {report['capacity']} sessions")
+    reference = {row["sessions"]: row for row in baseline["levels"]}
+    for row in report["levels"]:
+        ref = reference.get(row["sessions"])
+        if ref is None:
+            continue
+        if row["fps_mean"] * threshold < ref["fps_mean"]:
+            regressions.append(f"{row['sessions']} sessions : fps {ref['fps_mean']:.1f} -> {row['fps_mean']:.1f}")
+        floor = max(tolerance_ms, 0.1 * 1000.0 / row["target_fps"])
+        slower = ref["p95_ms"] > 0 and row["p95_ms"] > threshold * ref["p95_ms"]
+        if slower and row["p95_ms"] - ref["p95_ms"] >= floor:
+            regressions.append(f"{row['sessions']} sessions : p95 {ref['p95_ms']:.2f} -> {row['p95_ms']:.2f} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge multi-sessions du pipeline vidéo")
+    parser.add_argument("--sessions", type=int, nargs="+", default=list(DEFAULT_SESSIONS))
+    parser.add_argument("--fps", type=float, default=30.0, help="frames/s envoyées par chaque session")
+    parser.add_argument("--duration", type=float, default=10.0, help="durée mesurée par palier (s)")
+    parser.add_argument("--warmup", type=float, default=2.0, help="durée non mesurée au début de chaque palier (s)")
+    parser.add_argument("--fixture", help="fixture enregistrée (python fixtures.py record)")
+    parser.add_argument("--frames", type=int, default=60, help="frames synthétiques sans fixture")
+    parser.add_argument("--size", default="640x480", help="taille des frames synthétiques (LxH)")
+    parser.add_argument("--detector", choices=("replay", "pool"), default="replay")
+    parser.add_argument("--holistic-ms", type=float, default=15.0, help="coût simulé de MediaPipe (replay)")
+    parser.add_argument("--holistic-sleep", action="store_true",
+                        help="coût simulé par une attente au lieu de calcul (replay)")
+    parser.add_argument("--workers", type=int, default=None, help="workers Holistic par processus (pool)")
+    parser.add_argument("--every-n", type=int, default=None, help="une inférence toutes les N frames")
+    parser.add_argument("--processes", type=int, default=1, help="processus de test")
+    parser.add_argument("--startup", type=float, default=10.0, help="délai de lancement des processus (s)")
+    parser.add_argument("--json", help="écrire la courbe de capacité dans ce fichier")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--tolerance-ms", type=float, default=1.0, help="écart de p95 ignoré (ms)")
+    args = parser.parse_args(argv)
+
+    missing = [name for name in ("av", "cv2", "mediapipe") if _optional(name) is None]
+    if missing:
+        sys.exit(f"Modules manquants pour EmotionProcessor : {', '.join(missing)}")
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    config = {
+        "fixture": args.fixture, "frames": args.frames, "size": (height, width), "fps": args.fps,
+        "duration": args.duration, "warmup": args.warmup, "detector": args.detector,
+        "holistic_ms": args.holistic_ms, "holistic_sleep": args.holistic_sleep, "workers": args.workers, "every_n": args.every_n,
+        "startup": args.startup,
+    }
+    print(f"{args.detector}, {args.fps:g} fps par session, {args.processes} processus, "
+          f"{args.duration:g} s par palier, {os.cpu_count()} cœurs")
+    levels = []
+    for n in sorted(args.sessions):
+        levels.append(run_level(config, n, args.processes))
+        row = levels[-1]
+        print(f"  {n} sessions : {row['fps_mean']:.1f} fps, p95 {row['p95_ms']:.2f} ms, "
+              f"{row['drop_rate']:.1%} perdues", flush=True)
+    print_curve(levels, args.fps)
+
+    report = {"config": config, "processes": args.processes, "levels": levels,
+              "capacity": capacity(levels, args.fps)}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        print(f"Baseline enregistrée dans {save_baseline(report, args.baseline)}")
+    if args.check:
+        regressions = check_regressions(report, args.baseline, args.threshold, args.tolerance_ms)
+        for message in regressions:
+            print(f"RÉGRESSION {message}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+Instrumentation légère de l'application : compteurs, jauges, histogrammes
+
+Les métriques sont enregistrées dans un registre global (`REGISTRY`) et
+nommées à la façon de Prometheus, avec des étiquettes optionnelles :
+
+    frames = metrics.counter("frames_total", "Frames reçues")
+    stage = metrics.histogram("stage_seconds", "Durée par étape", stage="predict")
+    with stage.time():
+        ...
+
+Un histogramme ne garde que des compteurs par intervalle (pas les
+valeurs), ce qui rend `observe` constant en temps et en mémoire ; les
+percentiles affichés sont estimés par interpolation dans les intervalles,
+comme `histogram_quantile` de Prometheus.
+
+Avec `EMOTION_METRICS=0`, le registre est désactivé : toutes les métriques
+sont remplacées par un objet vide dont les méthodes ne font rien.
+
+Un instantané peut être écrit au format texte de Prometheus (`.prom`, lu
+par le « textfile collector » de node_exporter) ou en JSON (`.json`) ; si
+`EMOTION_METRICS_FILE` est défini, l'application le réécrit périodiquement.
+
+Usage (coût de l'instrumentation, activée ou non) :
+    python metrics.py overhead
+    EMOTION_METRICS=0 python benchmark.py --only pipeline   # à comparer avec EMOTION_METRICS=1
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+
+# Bornes supérieures des intervalles des histogrammes (secondes)
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # dernier : au-delà de la plus grande borne
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def time(self):
+        """Contexte qui observe la durée de son bloc."""
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Estimation du quantile `q` (0-1) par interpolation linéaire dans l'intervalle."""
+        with self._lock:
+            counts, total, largest = list(self.counts), self.count, self.max
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n:
+                low = self.buckets[i - 1] if i > 0 else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else largest
+                return min(low + (high - low) * (rank - seen) / n, largest)
+            seen += n
+        return largest
+
+    def snapshot(self):
+        with self._lock:
+            count, total, largest = self.count, self.sum, self.max
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": largest,
+        }
+
+
+class _NullMetric:
+    """Remplace toute métrique quand le registre est désactivé."""
+
+    kind = "null"
+    value = 0
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return _NULL_TIMER
+
+    def quantile(self, q):
+        return 0.0
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_METRIC = _NullMetric()
+_NULL_TIMER = _NullTimer()
+
+
+class Registry:
+    def __init__(self, enabled=True, prefix="emotion_"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._metrics = {}  # (nom, étiquettes triées) -> métrique
+        self._help = {}
+        self._exporter = None
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        if not self.enabled:
+            return NULL_METRIC
+        key = (self.prefix + name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = cls(**kwargs)
+                self._help.setdefault(key[0], help)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Métrique {key[0]} déjà enregistrée comme {metric.kind}")
+        return metric
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", **labels):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._metrics.items())
+
+    def snapshot(self):
+        """Valeurs de toutes les métriques, sérialisables en JSON."""
+        return {
+            "timestamp": time.time(),
+            "uptime": time.time() - self.started,
+            "metrics": [
+                {"name": name, "labels": dict(labels), "type": metric.kind, **metric.snapshot()}
+                for (name, labels), metric in self._items()
+            ],
+        }
+
+    def to_prometheus(self):
+        """Instantané au format texte d'exposition de Prometheus."""
+        lines = []
+        declared = set()
+        for (name, labels), metric in self._items():
+            if name not in declared:
+                declared.add(name)
+                if self._help.get(name):
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+            if metric.kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {metric.value}")
+                continue
+            with metric._lock:
+                counts, count, total = list(metric.counts), metric.count, metric.sum
+            cumulative = 0
+            for bound, n in zip(metric.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path):
+        """Écrit un instantané `.json` ou texte Prometheus (autres extensions), de façon atomique."""
+        if path.endswith(".json"):
+            text = json.dumps(self.snapshot(), indent=2)
+        else:
+            text = self.to_prometheus()
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+        return path
+
+    def start_exporter(self, path, interval=10.0):
+        """Réécrit l'instantané toutes les `interval` secondes dans un thread d'arrière-plan."""
+        if self._exporter is not None or not self.enabled:
+            return
+
+        def export():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_snapshot(path)
+                except OSError:
+                    pass
+
+        self._exporter = threading.Thread(target=export, name="metrics-exporter", daemon=True)
+        self._exporter.start()
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+REGISTRY = Registry(enabled=os.environ.get("EMOTION_METRICS", "1") != "0")
+
+
+def counter(name, help="", **labels):
+    return REGISTRY.counter(name, help, **labels)
+
+
+def gauge(name, help="", **labels):
+    return REGISTRY.gauge(name, help, **labels)
+
+
+def histogram(name, help="", buckets=DEFAULT_BUCKETS, **labels):
+    return REGISTRY.histogram(name, help, buckets, **labels)
+
+
+def _overhead(n=200000):
+    """Coût par appel de chaque primitive, registre activé et désactivé."""
+    import timeit
+
+    def per_call(stmt):
+        return min(timeit.repeat(stmt, number=n, repeat=5)) / n * 1e9
+
+    baseline = per_call(lambda: None)
+    print("primitive                 | activé ns | désactivé ns")
+    for name, make in [
+        ("counter.inc", lambda r: r.counter("c").inc),
+        ("histogram.observe", lambda r: (lambda h: lambda: h.observe(0.003))(r.histogram("h"))),
+        ("with histogram.time()", lambda r: (lambda h: lambda: _timed(h))(r.histogram("t"))),
+    ]:
+        on = per_call(make(Registry(enabled=True))) - baseline
+        off = per_call(make(Registry(enabled=False))) - baseline
+        print(f"{name:25s} | {on:9.0f} | {off:12.0f}")
+
+    # EmotionProcessor : 9 minutages et 3 compteurs au plus par frame
+    registry = Registry()
+    h, c = registry.histogram("t"), registry.counter("c")
+    on = 9 * (per_call(lambda: _timed(h)) - baseline) + 3 * (per_call(c.inc) - baseline)
+    print(f"surcoût estimé par frame : {on / 1000:.1f} µs (budget d'une frame à 30 fps : 33 333 µs)")
+
+
+def _timed(histogram):
+    with histogram.time():
+        pass
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != "overhead":
+        sys.exit("Usage: python metrics.py overhead")
+    _overhead()
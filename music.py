@@ -1,13 +1,13 @@
 import streamlit as st
-from streamlit_webrtc import webrtc_streamer
-import av
-import cv2 
-import numpy as np 
-import mediapipe as mp 
-from keras.models import load_model 
 import os
+import json
 import streamlit.components.v1 as components
-from pytube import Search
+
+# Seuls les modules légers sont importés avant la page d'accueil ; les
+# modules vidéo (webrtc, av, cv2, MediaPipe) le sont en arrière-plan par Warmup
+import metrics
+from emotion_state import EmotionState
+from startup import Warmup
 
 # Configuration de la page
 st.set_page_config(
@@ -147,6 +147,16 @@ if 'emotion_detected' not in st.session_state:
     st.session_state.emotion_detected = ""
 if 'recommendations_ready' not in st.session_state:
     st.session_state.recommendations_ready = False
+if 'emotion_state' not in st.session_state:
+    # Canal thread vidéo -> script, propre à la session. La sauvegarde sur
+    # disque n'est active que si EMOTION_STATE_FILE est défini.
+    st.session_state.emotion_state = EmotionState(persist_path=os.environ.get("EMOTION_STATE_FILE"))
+
+# Préchauffage partagé par toutes les sessions : lancé une seule fois,
+# à l'arrivée du premier utilisateur
+@st.cache_resource
+def start_warmup():
+    return Warmup().start()
 
 # PAGE D'ACCUEIL
 if not st.session_state.app_started:
@@ -194,6 +204,9 @@ if not st.session_state.app_started:
         </div>
         """, unsafe_allow_html=True)
     
+    # Chargement des modèles en arrière-plan pendant la lecture de la page
+    start_warmup()
+
     # Bouton Commencer
     st.markdown('<div class="start-button-container">', unsafe_allow_html=True)
     if st.button("🚀 Commencer l'expérience", key="start_btn", use_container_width=True):
@@ -207,6 +220,16 @@ if not st.session_state.app_started:
 # APPLICATION PRINCIPALE
 # ============================================================================
 
+# Modules du traitement vidéo (déjà importés par le préchauffage)
+from streamlit_webrtc import webrtc_streamer
+from processor import EmotionProcessor
+from recommend import PytubeBackend
+from roi import WORKING_SIZES, RoiTracker
+from scheduler import POLICIES
+from smoothing import METHODS
+
+warmup = start_warmup()
+
 # Header principal
 st.markdown('<div class="main-header">🎵 Music Emotion Recommender</div>', unsafe_allow_html=True)
 
@@ -218,107 +241,260 @@ with col1:
     lang = st.text_input("Langue (ex: French, English, Spanish)", placeholder="English")
     singer = st.text_input("Artiste préféré", placeholder="Ed Sheeran, Ariana Grande...")
 
-# Chargement du modèle
-@st.cache_resource
-def load_emotion_model():
+# Réglages de l'inférence (saut de frames)
+with st.sidebar:
+    st.markdown("### ⚙ Inférence")
+    skip_policy = st.selectbox(
+        "Politique de saut de frames",
+        POLICIES,
+        format_func=lambda p: {"every_n": "Une frame sur N", "budget": "Budget de calcul"}[p],
+    )
+    every_n = st.slider("N (une inférence toutes les N frames)", 1, 15, 3, disabled=skip_policy != "every_n")
+    budget_ms = st.slider("Budget de calcul par frame (ms)", 1.0, 50.0, 10.0, disabled=skip_policy != "budget")
+    smoothing_method = st.selectbox(
+        "Lissage de l'émotion",
+        METHODS,
+        format_func=lambda m: {"ema": "Moyenne exponentielle", "majority": "Vote majoritaire", "mean": "Moyenne des probabilités"}[m],
+    )
+    smoothing_window = st.slider("Fenêtre de lissage (inférences)", 3, 60, 15, disabled=smoothing_method == "ema")
+    roi_enabled = st.checkbox("Suivi du visage (recadrage)", value=True)
+    working_size = st.selectbox(
+        "Résolution de travail MediaPipe",
+        WORKING_SIZES,
+        index=WORKING_SIZES.index(640),
+        format_func=lambda s: f"{s} px" if s else "Pleine résolution",
+    )
+
+# Ressources partagées, chargées par le préchauffage ; n'attendre que ce
+# qui n'est pas encore prêt
+if not warmup.ready():
+    with st.spinner("⏳ Chargement des modèles..."):
+        warmup.wait()
+
+def shared_resource(name, message):
+    """
+    Résultat d'une tâche du préchauffage. En cas d'échec, la tâche est
+    relancée pour le prochain rechargement de la page (sinon l'erreur
+    resterait en cache pour toutes les sessions) et la page s'arrête.
+    """
     try:
-        model = load_model("model.h5", compile=False)
-        label = np.load("labels.npy")
-        return model, label
+        return warmup.result(name)
     except Exception as e:
-        st.error(f"Erreur de chargement du modèle: {e}")
-        return None, None
-
-model, label = load_emotion_model()
+        warmup.retry(name)
+        st.error(f"{message}: {e}")
+        st.stop()
+
+# Classifieur NumPy, labels et réduction des features : version active du
+# registre des modèles, rechargée à chaud quand une nouvelle version est publiée
+try:
+    reloader = warmup.result("model")
+    label = reloader.current.label
+except Exception as e:
+    warmup.retry("model")
+    st.error(f"Erreur de chargement du modèle: {e}")
+    reloader, label = None, None
+
+def make_processor(emotion_state):
+    # Détecteur de la session : worker loué, derrière le suivi de la ROI du visage
+    holistic = RoiTracker(pool.lease())
+    if reloader is None:
+        return EmotionProcessor(emotion_state, holistic, None, None)
+    # Le processeur reçoit ensuite chaque nouvelle version sans couper le flux
+    return reloader.subscribe(EmotionProcessor(emotion_state, holistic, *reloader.current[:3]))
+
+# Pool de processus Holistic partagé par toutes les sessions (une session =
+# un worker loué)
+pool = shared_resource("mediapipe", "Erreur de chargement de MediaPipe")
+
+# Backends de recommandation, partagés par toutes les sessions : YouTube
+# (derrière le cache de recherche) et, s'il existe, le catalogue local
+recommenders = shared_resource("recommenders", "Erreur de chargement des recommandations")
+# Morceaux de la playlist (fusion des variantes de la recherche)
+PLAYLIST_SIZE = 10
+
+if reloader is not None:
+    with st.sidebar:
+        st.markdown("### 🧠 Modèle")
+        model_stats = reloader.stats()
+        accuracy = model_stats["metrics"].get("val_acc")
+        st.caption(
+            f"Version: {model_stats['version'] or 'model.npz (hors registre)'} • "
+            f"{len(model_stats['labels'])} émotions"
+            + (f" • précision val {accuracy:.0%}" if accuracy is not None else "")
+        )
+        st.caption(f"Rechargements: {model_stats['reloads']} • sessions: {model_stats['sessions']}")
+        if model_stats["last_error"]:
+            st.caption(f"Version refusée: {model_stats['last_error']}")
+
+with st.sidebar:
+    st.markdown("### 🎧 Recommandations")
+    recommender = recommenders[st.selectbox("Source des recommandations", list(recommenders))]
+
+# Précharger les recommandations de toutes les émotions dès que la langue
+# et l'artiste sont connus, pour que le clic soit servi immédiatement ; une
+# seule fois par session et par préférences, pas à chaque rerun du script
+if lang and singer and label is not None:
+    prefetch_key = (recommender.name, lang.strip().lower(), singer.strip().lower())
+    if prefetch_key not in st.session_state.setdefault("prefetched", set()):
+        st.session_state.prefetched.add(prefetch_key)
+        recommender.prefetch(lang, singer, label)
+
+if isinstance(recommender, PytubeBackend):
+    with st.sidebar:
+        st.markdown("### 🔍 Cache de recherche")
+        tier_names = {"memory": "Mémoire", "disk": "Disque", "backend": "YouTube"}
+        for tier, tier_stats in recommender.cache.stats().items():
+            st.caption(
+                f"{tier_names[tier]}: {tier_stats['hits']} succès / {tier_stats['misses']} échecs "
+                f"({tier_stats['hit_rate']:.0%}) • {tier_stats['mean_ms']:.1f} ms"
+            )
+        fanout_stats = recommender.fanout.stats()
+        st.caption(
+            f"Requêtes en éventail: {fanout_stats['ok']} abouties • {fanout_stats['empty']} vides • "
+            f"{fanout_stats['timeout']} hors délai • {fanout_stats['error']} erreurs"
+        )
 
-# Initialisation MediaPipe
+# Métriques de l'application (toutes sessions confondues). Avec
+# EMOTION_METRICS_FILE, un instantané (.prom ou .json) est réécrit
+# périodiquement pour être collecté par Prometheus.
 @st.cache_resource
-def load_mediapipe():
-    holistic = mp.solutions.holistic
-    hands = mp.solutions.hands
-    drawing = mp.solutions.drawing_utils
-    holis = holistic.Holistic()
-    return holis, drawing, holistic, hands
-
-holis, drawing, holistic, hands = load_mediapipe()
-
-class EmotionProcessor:
-    def recv(self, frame):
-        frm = frame.to_ndarray(format="bgr24")
-        frm = cv2.flip(frm, 1)
-
-        res = holis.process(cv2.cvtColor(frm, cv2.COLOR_BGR2RGB))
-
-        lst = []
-        if res.face_landmarks:
-            # Traitement des landmarks du visage
-            for i in res.face_landmarks.landmark:
-                lst.append(i.x - res.face_landmarks.landmark[1].x)
-                lst.append(i.y - res.face_landmarks.landmark[1].y)
-
-            # Traitement main gauche
-            if res.left_hand_landmarks:
-                for i in res.left_hand_landmarks.landmark:
-                    lst.append(i.x - res.left_hand_landmarks.landmark[8].x)
-                    lst.append(i.y - res.left_hand_landmarks.landmark[8].y)
-            else:
-                for i in range(42):
-                    lst.append(0.0)
-
-            # Traitement main droite
-            if res.right_hand_landmarks:
-                for i in res.right_hand_landmarks.landmark:
-                    lst.append(i.x - res.right_hand_landmarks.landmark[8].x)
-                    lst.append(i.y - res.right_hand_landmarks.landmark[8].y)
-            else:
-                for i in range(42):
-                    lst.append(0.0)
-
-            if model is not None:
-                lst = np.array(lst).reshape(1, -1)
-                pred = label[np.argmax(model.predict(lst))]
-                
-                # Mise à jour de l'émotion détectée
-                st.session_state.emotion_detected = pred
-                np.save("emotion.npy", np.array([pred]))
-                
-                # Affichage de l'émotion sur le flux vidéo
-                cv2.putText(frm, f"Emotion: {pred}", (50, 50), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-
-        # Dessin des landmarks
-        if res.face_landmarks:
-            drawing.draw_landmarks(frm, res.face_landmarks, holistic.FACEMESH_CONTOURS)
-        if res.left_hand_landmarks:
-            drawing.draw_landmarks(frm, res.left_hand_landmarks, hands.HAND_CONNECTIONS)
-        if res.right_hand_landmarks:
-            drawing.draw_landmarks(frm, res.right_hand_landmarks, hands.HAND_CONNECTIONS)
-
-        return av.VideoFrame.from_ndarray(frm, format="bgr24")
+def start_metrics_exporter():
+    path = os.environ.get("EMOTION_METRICS_FILE")
+    if path:
+        metrics.REGISTRY.start_exporter(path, float(os.environ.get("EMOTION_METRICS_INTERVAL", "10")))
+    return path
+
+start_metrics_exporter()
+
+def metrics_panel():
+    snapshot = metrics.REGISTRY.snapshot()
+    rows = []
+    for m in snapshot["metrics"]:
+        name = m["name"].removeprefix(metrics.REGISTRY.prefix)
+        if m["labels"]:
+            name += " " + ",".join(m["labels"].values())
+        if m["type"] == "histogram":
+            rows.append({"métrique": name, "n": m["count"],
+                         "p50 ms": round(m["p50"] * 1000, 2), "p95 ms": round(m["p95"] * 1000, 2)})
+        else:
+            rows.append({"métrique": name, "n": m["value"], "p50 ms": None, "p95 ms": None})
+    if rows:
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+    else:
+        st.caption("Aucune mesure pour l'instant")
+    col_prom, col_json = st.columns(2)
+    col_prom.download_button("Prometheus", metrics.REGISTRY.to_prometheus(), "metrics.prom", "text/plain")
+    col_json.download_button("JSON", json.dumps(snapshot, indent=2), "metrics.json", "application/json")
+
+# Rafraîchir le panneau seul, sans relancer tout le script
+if hasattr(st, "fragment"):
+    metrics_panel = st.fragment(run_every=2)(metrics_panel)
+
+if metrics.REGISTRY.enabled:
+    with st.sidebar:
+        st.markdown("### 📈 Métriques")
+        metrics_panel()
 
 # Section caméra
 if lang and singer:
     st.markdown('<div class="sub-header">📷 Détection d\'émotion en temps réel</div>', unsafe_allow_html=True)
     
     col_cam1, col_cam2 = st.columns([2, 1])
+    emotion_state = st.session_state.emotion_state
     
     with col_cam1:
-        webrtc_streamer(
+        ctx = webrtc_streamer(
             key="emotion-key",
             desired_playing_state=True,
-            video_processor_factory=EmotionProcessor,
+            video_processor_factory=lambda: make_processor(emotion_state),
             media_stream_constraints={"video": True, "audio": False}
         )
+
+        # Transmettre la politique choisie dans la barre latérale au processeur
+        if ctx.video_processor:
+            scheduler = ctx.video_processor.scheduler
+            scheduler.policy = skip_policy
+            scheduler.every_n = every_n
+            scheduler.budget_ms = budget_ms
+            smoother = ctx.video_processor.smoother
+            if smoother is not None:
+                smoother.method = smoothing_method
+                if smoother.window != smoothing_window:
+                    smoother.resize(smoothing_window)
+            tracker = ctx.video_processor.holistic
+            tracker.enabled = roi_enabled
+            tracker.working_size = working_size
     
     with col_cam2:
+        reading = emotion_state.latest()
+        if reading:
+            st.session_state.emotion_detected = reading.emotion
         if st.session_state.emotion_detected:
             st.markdown('<div class="emotion-display">', unsafe_allow_html=True)
             st.markdown(f"### 🎭 Émotion détectée")
             st.markdown(f"# {st.session_state.emotion_detected}")
+            if reading:
+                st.caption(f"Confiance: {reading.confidence:.0%}")
             st.markdown('</div>', unsafe_allow_html=True)
         else:
             st.info("🎭 L'émotion apparaîtra ici une fois détectée")
 
+        # Politique de saut et débit d'inférence mesuré
+        if ctx.video_processor:
+            stats = ctx.video_processor.scheduler.stats()
+            worker_stats = ctx.video_processor.worker.stats()
+            st.caption(
+                f"Inférence 1 frame sur {stats['skip']} • "
+                f"{stats['inference_rate']:.1f} inférences/s pour {stats['frame_rate']:.1f} frames/s • "
+                f"pipeline {stats['process_ms']:.0f} ms"
+            )
+            st.caption(
+                f"File: {worker_stats['queue_depth']} • "
+                f"frames jetées: {worker_stats['dropped']} • "
+                f"latence worker: {worker_stats['latency_ms']:.0f} ms"
+            )
+            pool_stats = pool.stats()
+            st.caption(
+                f"Pool Holistic: {pool_stats['sessions']} sessions sur {pool_stats['workers']} workers • "
+                f"frames abandonnées (pool saturé): {ctx.video_processor.holistic.saturated}"
+            )
+            roi_stats = ctx.video_processor.holistic.stats()
+            st.caption(
+                f"Recadrage sur {roi_stats['roi_rate']:.0%} des frames • "
+                f"{roi_stats['pixel_ratio']:.0%} des pixels analysés • "
+                f"{roi_stats['reacquisitions']} réacquisitions"
+            )
+            smoother = ctx.video_processor.smoother
+            if smoother is not None:
+                smoothing_stats = smoother.stats()
+                st.caption(
+                    f"Lissage: {smoothing_stats['changes']} changements d'émotion "
+                    f"pour {smoothing_stats['frames']} inférences"
+                )
+
+def render_player(placeholder, video_ids):
+    """Lecteur YouTube de la playlist (premier morceau puis les suivants en boucle)."""
+    first_video = video_ids[0]
+    playlist_str = ",".join(video_ids[1:])
+    embed_url = f"https://www.youtube.com/embed/{first_video}?playlist={playlist_str}&autoplay=1&loop=1"
+
+    with placeholder.container():
+        st.markdown('<div class="recommendation-section">', unsafe_allow_html=True)
+        st.markdown("### 🎶 Votre playlist personnalisée")
+        components.html(
+            f"""
+            <iframe width="100%" height="450"
+                src="{embed_url}"
+                frameborder="0"
+                allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture"
+                allowfullscreen>
+            </iframe>
+            """,
+            height=500,
+        )
+        st.markdown('</div>', unsafe_allow_html=True)
+
+
 # Section recommandations
 st.markdown("---")
 st.markdown('<div class="sub-header">🎧 Recommandations musicales</div>', unsafe_allow_html=True)
@@ -329,69 +505,63 @@ if btn:
     if not lang or not singer:
         st.error("⚠ Veuillez d'abord remplir la langue et l'artiste")
     else:
-        # Relire l'émotion la plus récente depuis le fichier
-        try:
-            loaded = np.load("emotion.npy", allow_pickle=True)
-            st.session_state.emotion_detected = str(loaded[0])
-        except:
-            st.session_state.emotion_detected = ""
+        # Relire l'émotion la plus récente publiée par le thread vidéo
+        reading = st.session_state.emotion_state.latest()
+        st.session_state.emotion_detected = reading.emotion if reading else ""
 
         emotion_text = st.session_state.emotion_detected
 
         if not emotion_text:
             st.warning("⏳ Veuillez attendre que votre émotion soit détectée par la caméra")
         else:
-            with st.spinner("🔍 Recherche de musiques adaptées..."):
-                # Affichage des paramètres de recherche
-                st.markdown(f"""
-                <div style='background: rgba(255, 255, 255, 0.15); padding: 15px; border-radius: 10px; margin: 15px 0;'>
-                    <h4 style='color: white;'>🔍 Paramètres de recherche:</h4>
-                    <p style='color: white;'><strong>Langue:</strong> {lang} | <strong>Artiste:</strong> {singer} | <strong>Émotion:</strong> {emotion_text}</p>
-                </div>
-                """, unsafe_allow_html=True)
-
-                try:
-                    # Recherche YouTube
-                    search_query = f"{lang} {emotion_text} {singer} song"
-                    s = Search(search_query)
-                    results = s.results[:5]
-                    video_ids = [video.video_id for video in results]
-
-                    if video_ids:
-                        # Génération de la playlist
-                        first_video = video_ids[0]
-                        playlist_str = ",".join(video_ids[1:])
-
-                        embed_url = f"https://www.youtube.com/embed/{first_video}?playlist={playlist_str}&autoplay=1&loop=1"
-
-                        # Affichage de la playlist
-                        st.markdown('<div class="recommendation-section">', unsafe_allow_html=True)
-                        st.markdown("### 🎶 Votre playlist personnalisée")
-
-                        components.html(
-                            f"""
-                            <iframe width="100%" height="450"
-                                src="{embed_url}"
-                                frameborder="0"
-                                allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture"
-                                allowfullscreen>
-                            </iframe>
-                            """,
-                            height=500,
-                        )
-
-                        # Liste des vidéos recommandées
-                        st.markdown("### 📋 Titres recommandés")
-                        for i, video in enumerate(results, 1):
-                            st.write(f"{i}. {video.title}")
-
-                        st.markdown('</div>', unsafe_allow_html=True)
-
-                    else:
-                        st.error("❌ Aucune vidéo trouvée pour cette recherche. Essayez avec d'autres paramètres.")
-
-                except Exception as e:
-                    st.error(f"❌ Erreur lors de la recherche: {e}")
+            # Affichage des paramètres de recherche
+            st.markdown(f"""
+            <div style='background: rgba(255, 255, 255, 0.15); padding: 15px; border-radius: 10px; margin: 15px 0;'>
+                <h4 style='color: white;'>🔍 Paramètres de recherche:</h4>
+                <p style='color: white;'><strong>Langue:</strong> {lang} | <strong>Artiste:</strong> {singer} | <strong>Émotion:</strong> {emotion_text}</p>
+            </div>
+            """, unsafe_allow_html=True)
+
+            # Emplacements remplis au fil de la recherche : le lecteur dès les
+            # premiers morceaux, la liste des titres à chaque requête terminée
+            status = st.empty()
+            player = st.empty()
+            titles = st.empty()
+            status.info("🔍 Recherche de musiques adaptées...")
+
+            try:
+                # Recherche en éventail : classements successifs, le dernier est définitif.
+                # Le lecteur est créé une seule fois, avec le premier classement (le
+                # recréer relancerait la vidéo) ; les morceaux trouvés ensuite sont
+                # proposés dans une liste à part.
+                playlist = None
+                found = {}  # video_id -> titre
+                with metrics.histogram("recommend_seconds", "Durée d'une recommandation", backend=recommender.name).time():
+                    for results in recommender.stream(emotion_text, lang, singer, k=PLAYLIST_SIZE):
+                        if not results:
+                            continue
+                        for video in results:
+                            found.setdefault(video.video_id, video.title)
+                        if playlist is None:
+                            playlist = [video.video_id for video in results]
+                            render_player(player, playlist)
+                        others = [video.video_id for video in results if video.video_id not in playlist]
+                        with titles.container():
+                            st.markdown("### 📋 Titres recommandés")
+                            for i, video_id in enumerate(playlist, 1):
+                                st.write(f"{i}. {found[video_id]}")
+                            if others:
+                                st.markdown("### ➕ Autres morceaux trouvés")
+                                for video_id in others:
+                                    st.markdown(f"- [{found[video_id]}](https://www.youtube.com/watch?v={video_id})")
+
+                if playlist is None:
+                    status.error("❌ Aucune vidéo trouvée pour cette recherche. Essayez avec d'autres paramètres.")
+                else:
+                    status.empty()
+
+            except Exception as e:
+                status.error(f"❌ Erreur lors de la recherche: {e}")
 
 # Footer
 st.markdown("---")
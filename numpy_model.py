@@ -0,0 +1,269 @@
+"""
+Moteur d'inférence NumPy pour le classifieur d'émotions (sans Keras)
+
+Le modèle entraîné par `data_training.py` est un petit réseau dense
+(1020 -> 512 -> 256 -> N). Pour la prédiction image par image, passer par
+Keras/TensorFlow coûte bien plus cher que le calcul lui-même. Ce module :
+1. Exporte les poids de `model.h5` dans un fichier compact `model.npz`.
+2. Recharge ce fichier et calcule la passe avant en NumPy pur
+   (produit matriciel + ReLU + softmax), sans importer TensorFlow.
+3. Dérive de `model.npz` des variantes plus légères : float16
+   (`model.float16.npz`) et int8 quantifié par canal de sortie, avec une
+   échelle par neurone (`model.int8.npz`).
+
+Une variante compacte est par défaut reconvertie en float32 au chargement
+(fichier plus petit, inférence aussi rapide). Avec `compact=True`, les
+poids int8 restent en int8 en mémoire (4 fois moins de mémoire par worker,
+au prix d'un produit matriciel hors BLAS).
+
+Usage :
+    python numpy_model.py export   [model.h5] [model.npz]
+    python numpy_model.py check    [model.h5] [model.npz]   # parité avec Keras
+    python numpy_model.py evaluate [model.npz]              # taille / vitesse / précision
+"""
+
+import sys
+
+import numpy as np
+
+H5_PATH = "model.h5"
+NPZ_PATH = "model.npz"
+
+VARIANTS = ("float32", "float16", "int8")
+
+_ACTIVATIONS = ("linear", "relu", "softmax")
+
+
+def export_model(keras_model, path=NPZ_PATH, rows=None, validation=None):
+    """
+    Extrait les poids des couches Dense d'un modèle Keras vers `path`.
+
+    `rows` et `validation` (nombre de lignes du dataset d'entraînement et
+    indices des lignes mises de côté) sont gardés dans le fichier, pour que
+    `evaluate` mesure la précision sur des lignes que le modèle n'a pas vues.
+    """
+    arrays = {}
+    activations = []
+    for layer in keras_model.layers:
+        params = layer.get_weights()
+        if not params:
+            # Couche Input : aucun poids
+            continue
+        activation = layer.get_config().get("activation", "linear")
+        if len(params) != 2 or activation not in _ACTIVATIONS:
+            raise ValueError(f"Couche non supportée pour l'export NumPy: {layer.name}")
+        n = len(activations)
+        arrays[f"W{n}"] = params[0].astype(np.float32)
+        arrays[f"b{n}"] = params[1].astype(np.float32)
+        activations.append(activation)
+
+    if validation is not None:
+        arrays["rows"] = np.array(rows)
+        arrays["validation"] = np.sort(np.asarray(validation, dtype=np.int64))
+    np.savez(path, activations=np.array(activations), **arrays)
+    return path
+
+
+def export_h5(h5_path=H5_PATH, path=NPZ_PATH):
+    """Charge `model.h5` avec Keras et exporte ses poids vers `path`."""
+    from keras.models import load_model
+
+    return export_model(load_model(h5_path, compile=False), path)
+
+
+def variant_path(variant, path=NPZ_PATH):
+    """Chemin du fichier d'une variante (ex: model.npz -> model.int8.npz)."""
+    if variant == "float32":
+        return path
+    root, ext = path.rsplit(".", 1)
+    return f"{root}.{variant}.{ext}"
+
+
+def quantize_int8(W):
+    """Quantification symétrique par colonne : W ≈ Wq * scale."""
+    scale = np.abs(W).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    Wq = np.clip(np.rint(W / scale), -127, 127).astype(np.int8)
+    return Wq, scale.astype(np.float32)
+
+
+def export_variants(path=NPZ_PATH):
+    """Écrit les variantes float16 et int8 à partir de `model.npz`."""
+    with np.load(path) as data:
+        arrays = dict(data)
+    n = len(arrays["activations"])
+
+    half = dict(arrays)
+    for i in range(n):
+        half[f"W{i}"] = arrays[f"W{i}"].astype(np.float16)
+    np.savez(variant_path("float16", path), **half)
+
+    quantized = dict(arrays)
+    for i in range(n):
+        quantized[f"W{i}"], quantized[f"S{i}"] = quantize_int8(arrays[f"W{i}"])
+    np.savez(variant_path("int8", path), **quantized)
+
+    return [variant_path(v, path) for v in VARIANTS]
+
+
+def _relu(x):
+    return np.maximum(x, 0.0, out=x)
+
+
+def _softmax(x):
+    x -= x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+class NumpyModel:
+    """Passe avant d'un réseau dense, compatible avec `model.predict` de Keras."""
+
+    def __init__(self, weights, biases, activations, scales=None, compact=False):
+        # scales : échelles par colonne des poids int8 (None pour float32/float16)
+        scales = scales or [None] * len(weights)
+        self.weights = []
+        self.scales = []
+        for W, scale in zip(weights, scales):
+            if compact and W.dtype == np.int8:
+                # Garder les poids int8 ; l'échelle est appliquée après le produit
+                self.weights.append(np.ascontiguousarray(W))
+                self.scales.append(np.asarray(scale, dtype=np.float32))
+            else:
+                W = np.asarray(W, dtype=np.float32)
+                if scale is not None:
+                    W = W * scale
+                self.weights.append(np.ascontiguousarray(W))
+                self.scales.append(None)
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+
+    @classmethod
+    def load(cls, path=NPZ_PATH, compact=False):
+        with np.load(path) as data:
+            activations = [str(a) for a in data["activations"]]
+            weights = [data[f"W{i}"] for i in range(len(activations))]
+            biases = [data[f"b{i}"] for i in range(len(activations))]
+            scales = [data[f"S{i}"] if f"S{i}" in data else None for i in range(len(activations))]
+        return cls(weights, biases, activations, scales, compact)
+
+    @property
+    def nbytes(self):
+        """Mémoire occupée par les paramètres."""
+        arrays = self.weights + self.biases + [s for s in self.scales if s is not None]
+        return sum(a.nbytes for a in arrays)
+
+    @property
+    def input_dim(self):
+        return self.weights[0].shape[0]
+
+    @property
+    def n_classes(self):
+        return self.weights[-1].shape[1]
+
+    def predict(self, X):
+        """Retourne les probabilités (n, n_classes) pour un lot `X` (n, input_dim)."""
+        h = np.asarray(X, dtype=np.float32)
+        if h.ndim == 1:
+            h = h.reshape(1, -1)
+        for W, scale, b, activation in zip(self.weights, self.scales, self.biases, self.activations):
+            h = h @ W
+            if scale is not None:
+                h *= scale
+            h += b
+            if activation == "relu":
+                h = _relu(h)
+            elif activation == "softmax":
+                h = _softmax(h)
+        return h
+
+
+def check_parity(h5_path=H5_PATH, path=NPZ_PATH, n=256, atol=1e-5):
+    """Compare les sorties Keras et NumPy, puis le temps d'une prédiction unitaire."""
+    import timeit
+
+    from keras.models import load_model
+
+    keras_model = load_model(h5_path, compile=False)
+    model = NumpyModel.load(path)
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(scale=0.1, size=(n, model.input_dim)).astype(np.float32)
+
+    expected = keras_model.predict(X, verbose=0)
+    got = model.predict(X)
+    max_err = float(np.abs(expected - got).max())
+    same_argmax = bool((expected.argmax(axis=1) == got.argmax(axis=1)).all())
+    print(f"écart max: {max_err:.2e} | argmax identiques: {same_argmax}")
+
+    # Coût par frame (lot de taille 1, comme dans EmotionProcessor.recv)
+    x = X[:1]
+    t_keras = min(timeit.repeat(lambda: keras_model.predict(x, verbose=0), number=20, repeat=3)) / 20
+    t_numpy = min(timeit.repeat(lambda: model.predict(x), number=2000, repeat=3)) / 2000
+    print(f"Keras: {t_keras * 1e3:.2f} ms/frame | NumPy: {t_numpy * 1e6:.1f} µs/frame")
+
+    return max_err <= atol and same_argmax
+
+
+def evaluate(path=NPZ_PATH):
+    """Taille, temps de chargement, latence par frame et précision de chaque variante."""
+    import os
+    import time
+    import timeit
+
+    from data_loader import MANIFEST_PATH, load_dataset, load_manifest, split
+    from reduction import REDUCTION_PATH, FeatureReducer
+
+    if not all(os.path.exists(variant_path(v, path)) for v in VARIANTS):
+        export_variants(path)
+
+    X, y, _ = load_dataset(load_manifest(MANIFEST_PATH))
+    if os.path.exists(REDUCTION_PATH):
+        X = FeatureReducer.load(REDUCTION_PATH).transform(X)
+
+    # Lignes de validation enregistrées à l'export, si le dataset n'a pas changé
+    with np.load(path) as data:
+        val = data["validation"] if "validation" in data.files and int(data["rows"]) == len(X) else None
+    if val is not None:
+        column = "précision val"
+    else:
+        # Lignes de validation inconnues : le modèle a pu voir toutes les lignes
+        print("Lignes de validation inconnues (modèle exporté sans elles, ou dataset modifié) : "
+              "précision mesurée sur des lignes peut-être vues à l'entraînement")
+        _, val = split(len(X))
+        column = "précision entr."
+    X_val, y_val = X[val], y[val]
+    reference = NumpyModel.load(path).predict(X_val).argmax(axis=1)
+
+    print(f"variante        | fichier Ko | mémoire Ko | chargement ms | µs/frame | {column} | accord f32")
+    for variant in VARIANTS:
+        file = variant_path(variant, path)
+        for compact in ((False, True) if variant == "int8" else (False,)):
+            start = time.perf_counter()
+            model = NumpyModel.load(file, compact=compact)
+            load_ms = (time.perf_counter() - start) * 1000.0
+
+            x = X_val[:1]
+            latency = min(timeit.repeat(lambda: model.predict(x), number=500, repeat=3)) / 500
+            pred = model.predict(X_val).argmax(axis=1)
+            name = variant + (" compact" if compact else "")
+            print(
+                f"{name:15s} | {os.path.getsize(file) / 1024:10.0f} | {model.nbytes / 1024:10.0f} | "
+                f"{load_ms:13.2f} | {latency * 1e6:8.1f} | {(pred == y_val).mean():13.3f} | "
+                f"{(pred == reference).mean():10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "export"
+    args = sys.argv[2:]
+    if command == "export":
+        path = export_h5(*args)
+        print(f"Poids exportés vers {', '.join(export_variants(path))}")
+    elif command == "check":
+        sys.exit(0 if check_parity(*args) else 1)
+    elif command == "evaluate":
+        evaluate(*args)
+    else:
+        sys.exit(f"Commande inconnue: {command} (export | check | evaluate)")
@@ -0,0 +1,170 @@
+"""
+Traitement vidéo d'une session : détection et affichage de l'émotion
+
+`EmotionProcessor` est le processeur vidéo passé à `webrtc_streamer` par
+`music.py`. Il est défini ici, hors du script Streamlit, pour pouvoir être
+instancié sans interface (benchmarks, tests de charge) : toutes ses
+dépendances (détecteur Holistic, modèle, labels, réduction, état) lui sont
+fournies à la construction.
+
+Le détecteur `holistic` est tout objet exposant `process(rgb)` et renvoyant
+un résultat au format MediaPipe, ou None s'il est saturé (voir
+`holistic_pool.HolisticLease`).
+
+Le classifieur peut être remplacé en cours de session (`set_classifier`,
+nouvelle version publiée dans le registre des modèles) : le worker adopte
+le nouveau modèle entre deux inférences, sans interrompre le flux vidéo.
+"""
+
+import time
+
+import av
+import cv2
+import mediapipe as mp
+import numpy as np
+
+import metrics
+from features import N_FEATURES, extract_features
+from inference_worker import InferenceWorker
+from reduction import FeatureReducer
+from scheduler import InferenceScheduler
+from smoothing import EmotionSmoother
+
+drawing = mp.solutions.drawing_utils
+holistic_module = mp.solutions.holistic
+hands_module = mp.solutions.hands
+
+STAGES = ("recv", "decode", "holistic", "features", "predict", "smooth", "publish", "overlay", "encode")
+
+_stage_seconds = {
+    stage: metrics.histogram("stage_seconds", "Durée de chaque étape du traitement d'une frame", stage=stage)
+    for stage in STAGES
+}
+_frames = metrics.counter("frames_total", "Frames reçues par les processeurs vidéo")
+_inferences = metrics.counter("inferences_total", "Frames passées par le pipeline d'inférence")
+_saturated = metrics.counter("holistic_saturated_total", "Frames abandonnées faute de worker Holistic libre")
+_changes = metrics.counter("emotion_changes_total", "Changements de l'émotion stable (après lissage)")
+_sessions = metrics.gauge("sessions", "Sessions vidéo actives")
+
+
+def draw_landmarks(frm, res):
+    """Dessine le maillage du visage et les mains détectés sur la frame BGR."""
+    if res.face_landmarks:
+        drawing.draw_landmarks(frm, res.face_landmarks, holistic_module.FACEMESH_CONTOURS)
+    if res.left_hand_landmarks:
+        drawing.draw_landmarks(frm, res.left_hand_landmarks, hands_module.HAND_CONNECTIONS)
+    if res.right_hand_landmarks:
+        drawing.draw_landmarks(frm, res.right_hand_landmarks, hands_module.HAND_CONNECTIONS)
+
+
+class EmotionProcessor:
+    def __init__(self, state, holistic, model, label, reducer=None):
+        # État d'émotion de la session (le thread vidéo n'a pas accès à st.session_state)
+        self.state = state
+        # Détecteur Holistic réservé à cette session (worker loué dans le pool)
+        self.holistic = holistic
+        self.model = model
+        self.label = label
+        self.reducer = reducer or FeatureReducer()
+        # Classifieur demandé (rechargement à chaud) et classifieur en service ;
+        # le worker adopte le premier entre deux inférences
+        self._requested = self._active = (model, label, self.reducer)
+        # Tampon préalloué, réutilisé à chaque inférence
+        self.features = np.empty(N_FEATURES, dtype=np.float32)
+        # Décide quelles frames passent par le pipeline complet
+        self.scheduler = InferenceScheduler()
+        # Lissage des prédictions : l'état n'est mis à jour qu'aux changements d'émotion
+        self.smoother = EmotionSmoother(len(label)) if label is not None else None
+        # MediaPipe et le classifieur tournent dans un thread dédié à la session
+        self.worker = InferenceWorker(self.infer)
+        _sessions.inc()
+
+    def set_classifier(self, model, label, reducer=None):
+        """Remplace le classifieur sans interrompre le flux (appelé par `registry.ModelReloader`)."""
+        self._requested = (model, label, reducer or FeatureReducer())
+
+    def _adopt(self, requested):
+        model, label, reducer = requested
+        same_classes = label is not None and self.label is not None and list(label) == list(self.label)
+        if not same_classes:
+            # Autres classes : nouveau lissage, avec les réglages courants
+            previous = self.smoother
+            options = {"method": previous.method, "window": previous.window} if previous is not None else {}
+            self.smoother = EmotionSmoother(len(label), **options) if label is not None else None
+        self.model, self.label, self.reducer = model, label, reducer
+        self._active = requested
+
+    def infer(self, rgb):
+        """Pipeline complet, exécuté par le worker d'inférence."""
+        requested = self._requested
+        if requested is not self._active:
+            self._adopt(requested)
+        start = time.perf_counter()
+        with _stage_seconds["holistic"].time():
+            res = self.holistic.process(rgb)
+        if res is None:
+            # Pool saturé : garder le résultat précédent
+            _saturated.inc()
+            return self.worker.result
+        _inferences.inc()
+
+        # Vecteur de features partagé avec data_collection.py
+        with _stage_seconds["features"].time():
+            features = extract_features(res, out=self.features)
+        pred = None
+        if features is not None and self.model is not None:
+            with _stage_seconds["predict"].time():
+                probs = self.model.predict(self.reducer.transform(features))[0]
+
+            with _stage_seconds["smooth"].time():
+                change = self.smoother.update(probs)
+            if change is not None:
+                # Mise à jour de l'émotion détectée, seulement quand elle change
+                _changes.inc()
+                with _stage_seconds["publish"].time():
+                    self.state.publish(self.label[change.emotion], change.confidence)
+            if self.smoother.stable is not None:
+                pred = self.label[self.smoother.stable]
+                if change is None:
+                    # Même émotion : seul son score lissé (la confiance affichée) évolue
+                    self.state.refresh(self.smoother.scores()[self.smoother.stable])
+
+        self.scheduler.record(time.perf_counter() - start)
+        return res, pred
+
+    def recv(self, frame):
+        with _stage_seconds["recv"].time():
+            return self._recv(frame)
+
+    def _recv(self, frame):
+        _frames.inc()
+        with _stage_seconds["decode"].time():
+            frm = frame.to_ndarray(format="bgr24")
+            frm = cv2.flip(frm, 1)
+
+        # Confier la frame au worker sans attendre son traitement
+        if self.scheduler.should_run():
+            self.worker.submit(cv2.cvtColor(frm, cv2.COLOR_BGR2RGB))
+
+        # Superposer le résultat le plus récent disponible
+        res, pred = self.worker.result or (None, None)
+
+        with _stage_seconds["overlay"].time():
+            # Affichage de l'émotion sur le flux vidéo
+            if pred is not None:
+                cv2.putText(frm, f"Emotion: {pred}", (50, 50),
+                           cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+
+            # Dessin des landmarks
+            if res is not None:
+                draw_landmarks(frm, res)
+
+        with _stage_seconds["encode"].time():
+            return av.VideoFrame.from_ndarray(frm, format="bgr24")
+
+    def on_ended(self):
+        _sessions.dec()
+        self.worker.stop()
+        release = getattr(self.holistic, "release", None)
+        if release is not None:
+            release()
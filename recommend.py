@@ -0,0 +1,176 @@
+"""
+Backends de recommandation musicale
+
+Le bouton « Recommander » de `music.py` passe par une interface commune,
+`RecommendationBackend.recommend(emotion, lang, artist, k)`, qui renvoie
+une liste de `Track` (video_id, title), et `stream(...)`, qui renvoie des
+classements de plus en plus complets au fil de la recherche (un seul pour
+un backend sans recherche progressive). Deux implémentations :
+- `PytubeBackend` : recherche YouTube en ligne, en éventail (plusieurs
+  variantes de la requête à la fois, voir `search_fanout.py`) derrière
+  `SearchCache`.
+- `LocalCatalogBackend` : index local de morceaux chargé depuis un fichier
+  CSV, interrogé en mémoire (hors ligne, sous la milliseconde).
+
+Format du catalogue (CSV avec en-tête) :
+    video_id,title,artist,language,emotions,popularity
+    abc123,Titre,Artiste,English,happy;surprise,0.8
+`emotions` contient des étiquettes séparées par « ; » (les mêmes que
+`labels.npy`) ; `popularity` (optionnelle, entre 0 et 1) départage les
+morceaux à score égal.
+
+Usage (construire un catalogue à partir du cache de recherche) :
+    python recommend.py export-cache [search_cache.sqlite] [catalog.csv]
+"""
+
+import csv
+import difflib
+import heapq
+import json
+import sys
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+from search_cache import SearchCache, Track
+from search_fanout import FanOutSearch
+
+CATALOG_PATH = "catalog.csv"
+CATALOG_FIELDS = ["video_id", "title", "artist", "language", "emotions", "popularity"]
+
+CatalogEntry = namedtuple("CatalogEntry", ["video_id", "title", "artist", "language", "emotions", "popularity"])
+
+
+def _normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+class RecommendationBackend:
+    name = "backend"
+
+    def recommend(self, emotion, lang, artist, k=5):
+        raise NotImplementedError
+
+    def stream(self, emotion, lang, artist, k=5):
+        """Classements successifs des recommandations ; le dernier est définitif."""
+        yield self.recommend(emotion, lang, artist, k)
+
+    def prefetch(self, lang, artist, emotions):
+        """Préparation optionnelle des recommandations de chaque émotion."""
+
+
+class PytubeBackend(RecommendationBackend):
+    name = "YouTube (pytube)"
+
+    def __init__(self, cache=None, fanout=None):
+        self.cache = cache or SearchCache()
+        self.fanout = fanout or FanOutSearch(self.cache)
+
+    def recommend(self, emotion, lang, artist, k=5):
+        return self.fanout.search(emotion, lang, artist, k)
+
+    def stream(self, emotion, lang, artist, k=5):
+        return self.fanout.stream(emotion, lang, artist, k)
+
+    def prefetch(self, lang, artist, emotions):
+        # Toutes les variantes de la recherche en éventail, pas seulement la requête d'origine
+        self.fanout.prefetch(lang, artist, emotions)
+
+
+class LocalCatalogBackend(RecommendationBackend):
+    name = "Catalogue local"
+
+    def __init__(self, entries, artist_cutoff=0.6):
+        # Seuil de similarité à partir duquel un artiste est considéré comme correspondant
+        self.artist_cutoff = artist_cutoff
+        self.entries = list(entries)
+
+        # Index (émotion, langue) -> entrées, et émotion -> entrées ; chaque
+        # entrée est accompagnée de son artiste normalisé
+        self._by_emotion_lang = defaultdict(list)
+        self._by_emotion = defaultdict(list)
+        for entry in self.entries:
+            item = (entry, _normalize(entry.artist))
+            for emotion in entry.emotions:
+                self._by_emotion_lang[(emotion, _normalize(entry.language))].append(item)
+                self._by_emotion[emotion].append(item)
+
+        self._artists = sorted({_normalize(e.artist) for e in self.entries} - {""})
+        self._artist_similarity = lru_cache(maxsize=1024)(self._compute_artist_similarity)
+
+    @classmethod
+    def load(cls, path=CATALOG_PATH, **kwargs):
+        entries = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                entries.append(CatalogEntry(
+                    row["video_id"],
+                    row["title"],
+                    row.get("artist", ""),
+                    row.get("language", ""),
+                    tuple(_normalize(e) for e in row.get("emotions", "").split(";") if e.strip()),
+                    float(row.get("popularity") or 0.0),
+                ))
+        return cls(entries, **kwargs)
+
+    def _compute_artist_similarity(self, query):
+        """Similarité (0..1) entre l'artiste demandé et chaque artiste du catalogue."""
+        scores = {}
+        for artist in self._artists:
+            if query in artist or artist in query:
+                scores[artist] = 1.0
+            else:
+                ratio = difflib.SequenceMatcher(None, query, artist).ratio()
+                if ratio >= self.artist_cutoff:
+                    scores[artist] = ratio
+        return scores
+
+    def recommend(self, emotion, lang, artist, k=5):
+        emotion = _normalize(emotion)
+        candidates = self._by_emotion_lang.get((emotion, _normalize(lang)))
+        if not candidates:
+            # Aucun morceau dans cette langue : élargir à toutes les langues
+            candidates = self._by_emotion.get(emotion, [])
+
+        artist_scores = self._artist_similarity(_normalize(artist)) if artist else {}
+
+        def score(item):
+            # L'artiste compte plus que la popularité, qui départage
+            entry, artist_key = item
+            return 2.0 * artist_scores.get(artist_key, 0.0) + entry.popularity
+
+        best = heapq.nlargest(k, candidates, key=score)
+        return [Track(entry.video_id, entry.title) for entry, _ in best]
+
+
+def export_search_cache(db_path="search_cache.sqlite", path=CATALOG_PATH):
+    """Écrit un catalogue local à partir des recherches gardées en cache."""
+    import sqlite3
+
+    rows = {}
+    with sqlite3.connect(db_path) as db:
+        for key, tracks in db.execute("SELECT key, tracks FROM searches"):
+            lang, emotion, artist = key.split("|")
+            # Variante de la recherche (« happy:upbeat ») : rangée sous son émotion
+            emotion = emotion.split(":")[0]
+            for video_id, title in json.loads(tracks):
+                row = rows.setdefault(video_id, {
+                    "video_id": video_id, "title": title, "artist": artist,
+                    "language": lang, "emotions": set(), "popularity": 0.0,
+                })
+                row["emotions"].add(emotion)
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CATALOG_FIELDS)
+        writer.writeheader()
+        for row in rows.values():
+            writer.writerow(dict(row, emotions=";".join(sorted(row["emotions"]))))
+    return len(rows)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "export-cache":
+        n = export_search_cache(*sys.argv[2:])
+        print(f"{n} morceaux écrits dans le catalogue")
+    else:
+        sys.exit("Commande inconnue (export-cache)")
@@ -0,0 +1,205 @@
+"""
+Réduction des features de landmarks avant le classifieur
+
+Le vecteur de 1020 valeurs contient les 468 points du maillage du visage,
+dont la plupart sont redondants pour reconnaître une émotion. Un
+`FeatureReducer` appris à l'entraînement peut :
+1. Ne garder qu'un sous-ensemble de régions du visage (lèvres, yeux,
+   sourcils, contour), avec ou sans les mains.
+2. Projeter le résultat sur les `n_components` premiers axes d'une ACP.
+
+Le réducteur ajusté est sauvegardé dans `reduction.npz` à côté de
+`model.h5`/`labels.npy` et appliqué de la même façon par `data_training.py`
+et par `EmotionProcessor` (le fichier ne contient que des indices de
+colonnes et des matrices : MediaPipe n'est nécessaire que pour l'ajuster).
+
+Usage (précision vs dimension d'entrée vs temps d'inférence par frame) :
+    python reduction.py report [époques]
+"""
+
+import numpy as np
+
+from features import FACE_POINTS, LEFT_HAND_SLICE, N_FEATURES, RIGHT_HAND_SLICE
+
+REDUCTION_PATH = "reduction.npz"
+
+# Régions du maillage du visage, d'après les connexions de MediaPipe
+REGIONS = {
+    "lips": "FACEMESH_LIPS",
+    "left_eye": "FACEMESH_LEFT_EYE",
+    "right_eye": "FACEMESH_RIGHT_EYE",
+    "left_eyebrow": "FACEMESH_LEFT_EYEBROW",
+    "right_eyebrow": "FACEMESH_RIGHT_EYEBROW",
+    "face_oval": "FACEMESH_FACE_OVAL",
+}
+EXPRESSION_REGIONS = ["lips", "left_eye", "right_eye", "left_eyebrow", "right_eyebrow"]
+
+
+def region_points(regions):
+    """Indices (triés) des points du visage appartenant aux régions demandées."""
+    from mediapipe.python.solutions import face_mesh_connections
+
+    points = set()
+    for region in regions:
+        for a, b in getattr(face_mesh_connections, REGIONS[region]):
+            points.update((a, b))
+    return sorted(p for p in points if p < FACE_POINTS)
+
+
+def select_columns(regions=None, include_hands=True):
+    """Colonnes du vecteur de features conservées (toutes si `regions` est None)."""
+    if regions is None:
+        face = np.arange(2 * FACE_POINTS)
+    else:
+        points = np.array(region_points(regions), dtype=np.int64)
+        face = np.stack([2 * points, 2 * points + 1], axis=1).ravel()
+    parts = [face]
+    if include_hands:
+        parts.append(np.arange(LEFT_HAND_SLICE.start, RIGHT_HAND_SLICE.stop))
+    return np.concatenate(parts)
+
+
+class FeatureReducer:
+    def __init__(self, regions=None, include_hands=True, n_components=None):
+        self.regions = list(regions) if regions else None
+        self.include_hands = include_hands
+        self.n_components = n_components
+
+        self.columns = None  # None : toutes les colonnes
+        self.mean = None
+        self.components = None  # (nb colonnes, n_components), prête pour le produit matriciel
+        self.explained_variance_ratio = None
+
+    @property
+    def is_identity(self):
+        return self.columns is None and self.components is None
+
+    @property
+    def output_dim(self):
+        if self.components is not None:
+            return self.components.shape[1]
+        return N_FEATURES if self.columns is None else len(self.columns)
+
+    def fit(self, X, max_rows=20000, seed=0):
+        if self.regions is not None or not self.include_hands:
+            self.columns = select_columns(self.regions, self.include_hands)
+
+        if self.n_components:
+            rng = np.random.default_rng(seed)
+            rows = np.sort(rng.choice(len(X), min(len(X), max_rows), replace=False))
+            Xs = self._select(np.asarray(X[rows], dtype=np.float32)).astype(np.float64)
+            self.mean = Xs.mean(axis=0)
+            _, s, Vt = np.linalg.svd(Xs - self.mean, full_matrices=False)
+            self.components = np.ascontiguousarray(Vt[:self.n_components].T, dtype=np.float32)
+            self.mean = self.mean.astype(np.float32)
+            variance = s ** 2
+            self.explained_variance_ratio = (variance[:self.n_components] / variance.sum()).astype(np.float32)
+        return self
+
+    def _select(self, X):
+        return X if self.columns is None else X[:, self.columns]
+
+    def transform(self, X, chunk_rows=65536):
+        """Applique la réduction à un lot (n, 1020) ; traite les gros tableaux par blocs."""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.is_identity:
+            return np.asarray(X, dtype=np.float32)
+        if len(X) <= chunk_rows:
+            return self._transform(X)
+        out = np.empty((len(X), self.output_dim), dtype=np.float32)
+        for start in range(0, len(X), chunk_rows):
+            out[start:start + chunk_rows] = self._transform(X[start:start + chunk_rows])
+        return out
+
+    def _transform(self, X):
+        X = self._select(np.asarray(X, dtype=np.float32))
+        if self.components is not None:
+            X = (X - self.mean) @ self.components
+        return X
+
+    def save(self, path=REDUCTION_PATH):
+        arrays = {
+            "regions": np.array(self.regions or [], dtype=str),
+            "include_hands": np.array(self.include_hands),
+        }
+        if self.columns is not None:
+            arrays["columns"] = self.columns
+        if self.components is not None:
+            arrays["mean"] = self.mean
+            arrays["components"] = self.components
+            arrays["explained_variance_ratio"] = self.explained_variance_ratio
+        np.savez(path, **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path=REDUCTION_PATH):
+        with np.load(path) as data:
+            reducer = cls([str(r) for r in data["regions"]] or None, bool(data["include_hands"]))
+            if "columns" in data:
+                reducer.columns = data["columns"]
+            if "components" in data:
+                reducer.mean = data["mean"]
+                reducer.components = data["components"]
+                reducer.explained_variance_ratio = data["explained_variance_ratio"]
+                reducer.n_components = reducer.components.shape[1]
+        return reducer
+
+    def describe(self):
+        parts = ["visage complet" if self.regions is None else "+".join(self.regions)]
+        if self.include_hands:
+            parts.append("mains")
+        if self.n_components:
+            parts.append(f"ACP {self.n_components}")
+        return ", ".join(parts)
+
+
+# Configurations comparées par le rapport
+REPORT_CONFIGS = [
+    dict(),
+    dict(regions=EXPRESSION_REGIONS),
+    dict(regions=EXPRESSION_REGIONS, include_hands=False),
+    dict(n_components=128),
+    dict(n_components=64),
+    dict(regions=EXPRESSION_REGIONS, n_components=32),
+    dict(regions=EXPRESSION_REGIONS, n_components=16),
+]
+
+
+def report(epochs=30, configs=REPORT_CONFIGS):
+    """Entraîne le modèle de data_training.py pour chaque réduction et compare."""
+    import timeit
+
+    from data_loader import MANIFEST_PATH, load_dataset, load_manifest, split
+    from numpy_model import NumpyModel
+    from training import build_model
+
+    X, y, labels = load_dataset(load_manifest(MANIFEST_PATH))
+    train, val = split(len(X))
+    eye = np.eye(len(labels), dtype=np.float32)
+
+    print("réduction                                        | dim  | précision val | µs/frame")
+    for config in configs:
+        reducer = FeatureReducer(**config).fit(X[train])
+        Xr = reducer.transform(X)
+
+        model = build_model(reducer.output_dim, len(labels))
+        model.fit(Xr[train], eye[y[train]], epochs=epochs, batch_size=32, shuffle=True, verbose=0)
+
+        weights = [layer.get_weights() for layer in model.layers if layer.get_weights()]
+        fast = NumpyModel([w for w, _ in weights], [b for _, b in weights], ["relu", "relu", "softmax"])
+        accuracy = float((fast.predict(Xr[val]).argmax(axis=1) == y[val]).mean())
+
+        # Coût par frame : réduction + passe avant, sur un vecteur brut de 1020 valeurs
+        x = np.asarray(X[:1], dtype=np.float32)
+        t = min(timeit.repeat(lambda: fast.predict(reducer.transform(x)), number=1000, repeat=3)) / 1000
+        print(f"{reducer.describe():48s} | {reducer.output_dim:4d} | {accuracy:13.3f} | {t * 1e6:8.1f}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != "report":
+        sys.exit("Usage: python reduction.py report [époques]")
+    report(int(sys.argv[2]) if len(sys.argv) > 2 else 30)
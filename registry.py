@@ -0,0 +1,420 @@
+"""
+Registre versionné des modèles et rechargement à chaud dans l'application
+
+Chaque entraînement publie une version dans `models/` au lieu d'écraser
+`model.h5`/`labels.npy` :
+
+    models/
+        CURRENT             nom de la version active (ex: v0003)
+        v0003/
+            model.npz       poids float32 (+ variantes float16 et int8)
+            labels.npy      noms des classes, dans l'ordre des sorties
+            reduction.npz   réduction des features apprise avec le modèle
+            meta.json       schéma des features, métriques, origine, parent
+
+Une version est écrite dans un dossier temporaire puis renommée, et
+`CURRENT` est remplacé atomiquement : un lecteur ne voit jamais de version
+incomplète. Revenir en arrière revient à réactiver une ancienne version.
+
+`ModelReloader` surveille `CURRENT` depuis l'application : une nouvelle
+version est chargée, vérifiée (schéma des features, dimensions) et
+préchauffée en arrière-plan, puis transmise aux `EmotionProcessor`
+abonnés, qui l'adoptent entre deux inférences sans interrompre leur flux.
+Une version invalide est ignorée et l'ancienne reste en service.
+
+`extend` ajoute une nouvelle classe d'émotion à la version active : le
+réseau repart des poids existants (la couche de sortie gagne une colonne),
+la réduction des features est conservée, et quelques époques sur les
+données existantes plus le nouveau fichier suffisent au lieu d'un
+entraînement complet.
+
+Usage :
+    python registry.py list
+    python registry.py activate v0002
+    python registry.py extend fear.npy [--label fear] [--epochs 15]
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from collections import namedtuple
+
+import numpy as np
+
+import metrics
+from features import FACE_POINTS, FACE_REF, HAND_POINTS, HAND_REF, N_FEATURES
+from numpy_model import NPZ_PATH, NumpyModel, export_variants, variant_path
+from reduction import REDUCTION_PATH, FeatureReducer
+
+REGISTRY_DIR = "models"
+CURRENT_FILE = "CURRENT"
+LABELS_FILE = "labels.npy"
+META_FILE = "meta.json"
+
+_VERSION = re.compile(r"^v(\d+)$")
+
+# Champs (model, label, reducer) en tête : `EmotionProcessor(state, holistic, *loaded[:3])`
+LoadedModel = namedtuple("LoadedModel", ["model", "label", "reducer", "version", "meta"])
+
+_reloads = metrics.counter("model_reloads_total", "Versions du modèle chargées à chaud")
+_reload_failures = metrics.counter("model_reload_failures_total", "Versions du modèle refusées au chargement")
+
+
+def feature_schema(reducer):
+    """Disposition du vecteur de features attendue par un modèle."""
+    return {
+        "n_features": N_FEATURES,
+        "face_points": FACE_POINTS,
+        "hand_points": HAND_POINTS,
+        "face_ref": FACE_REF,
+        "hand_ref": HAND_REF,
+        "reduction": reducer.describe(),
+        "input_dim": reducer.output_dim,
+    }
+
+
+def check_schema(schema):
+    """Lève ValueError si le modèle a été appris sur un autre vecteur de features."""
+    current = feature_schema(FeatureReducer())
+    for key in ("n_features", "face_points", "hand_points", "face_ref", "hand_ref"):
+        if schema.get(key) != current[key]:
+            raise ValueError(f"Schéma des features incompatible: {key}={schema.get(key)} (attendu {current[key]})")
+
+
+class ModelRegistry:
+    def __init__(self, directory=REGISTRY_DIR):
+        self.directory = directory
+
+    def path(self, version):
+        return os.path.join(self.directory, version)
+
+    def versions(self):
+        """Versions publiées, de la plus ancienne à la plus récente."""
+        if not os.path.isdir(self.directory):
+            return []
+        found = [name for name in os.listdir(self.directory)
+                 if _VERSION.match(name) and os.path.exists(os.path.join(self.directory, name, META_FILE))]
+        return sorted(found, key=lambda name: int(_VERSION.match(name).group(1)))
+
+    def current(self):
+        """Version active, ou None si le registre est vide."""
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def meta(self, version):
+        with open(os.path.join(self.path(version), META_FILE)) as f:
+            return json.load(f)
+
+    def activate(self, version):
+        """Rend `version` active (remplacement atomique de CURRENT)."""
+        if version not in self.versions():
+            raise ValueError(f"Version inconnue: {version}")
+        tmp = os.path.join(self.directory, CURRENT_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(version + "\n")
+        os.replace(tmp, os.path.join(self.directory, CURRENT_FILE))
+        return version
+
+    def publish(self, npz_path, labels, reducer, scores=None, parent=None, source=None, activate=True):
+        """
+        Publie les poids `npz_path` (format `numpy_model`), les labels et la
+        réduction comme nouvelle version ; retourne son nom. `scores` (précision
+        de validation, époques, ...) est enregistré dans meta.json.
+        """
+        reducer = reducer or FeatureReducer()
+        model = NumpyModel.load(npz_path)
+        if model.input_dim != reducer.output_dim or model.n_classes != len(labels):
+            raise ValueError(
+                f"Modèle {model.input_dim}->{model.n_classes} incompatible avec "
+                f"{reducer.output_dim} features et {len(labels)} labels"
+            )
+
+        os.makedirs(self.directory, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".publish-", dir=self.directory)
+        try:
+            shutil.copyfile(npz_path, os.path.join(staging, NPZ_PATH))
+            export_variants(os.path.join(staging, NPZ_PATH))
+            np.save(os.path.join(staging, LABELS_FILE), np.array([str(label) for label in labels]))
+            reducer.save(os.path.join(staging, REDUCTION_PATH))
+            meta = {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "labels": [str(label) for label in labels],
+                "schema": feature_schema(reducer),
+                "layers": [int(W.shape[1]) for W in model.weights[:-1]],
+                "metrics": scores or {},
+                "parent": parent,
+                "source": source,
+            }
+            # Numéro suivant ; un autre publieur peut prendre le même, d'où la boucle
+            while True:
+                existing = self.versions()
+                number = int(_VERSION.match(existing[-1]).group(1)) + 1 if existing else 1
+                version = f"v{number:04d}"
+                meta["version"] = version
+                with open(os.path.join(staging, META_FILE), "w") as f:
+                    json.dump(meta, f, indent=2)
+                try:
+                    os.rename(staging, self.path(version))
+                    break
+                except OSError:
+                    if not os.path.exists(self.path(version)):
+                        raise
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def load(self, version=None, variant="float32", compact=False):
+        """Charge, vérifie et préchauffe une version (la version active par défaut)."""
+        version = version or self.current()
+        if version is None:
+            raise FileNotFoundError(f"Aucune version active dans {self.directory}")
+        directory = self.path(version)
+        meta = self.meta(version)
+        check_schema(meta["schema"])
+
+        path = variant_path(variant, os.path.join(directory, NPZ_PATH))
+        if not os.path.exists(path):
+            export_variants(os.path.join(directory, NPZ_PATH))
+        model = NumpyModel.load(path, compact=compact)
+        label = np.load(os.path.join(directory, LABELS_FILE))
+        reducer = FeatureReducer.load(os.path.join(directory, REDUCTION_PATH))
+        if model.input_dim != reducer.output_dim or model.n_classes != len(label):
+            raise ValueError(f"Version {version} incohérente: modèle {model.input_dim}->{model.n_classes}, "
+                             f"{reducer.output_dim} features, {len(label)} labels")
+
+        # Prédiction factice : la première vraie frame ne paie pas les allocations
+        model.predict(reducer.transform(np.zeros(N_FEATURES, dtype=np.float32)))
+        return LoadedModel(model, label, reducer, version, meta)
+
+
+class ModelReloader:
+    """
+    Version active du modèle, rechargée à chaud quand CURRENT change.
+
+    `fallback()` -> (model, label, reducer) sert tant que le registre est vide
+    (fichiers model.npz/labels.npy de l'ancienne installation).
+    """
+
+    def __init__(self, registry, fallback=None, interval=5.0, variant="float32", compact=False):
+        self.registry = registry
+        self.fallback = fallback
+        self.interval = interval
+        self.variant = variant
+        self.compact = compact
+
+        self.current = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self._failed = set()  # versions refusées, pas retentées
+        self._subscribers = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Charge la version active (ou le modèle de repli), puis surveille le registre."""
+        version = self.registry.current()
+        if version is not None:
+            self.current = self.registry.load(version, self.variant, self.compact)
+        elif self.fallback is not None:
+            self.current = LoadedModel(*self.fallback(), None, {})
+        self._thread = threading.Thread(target=self._watch, name="model-reloader", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def subscribe(self, processor):
+        """Abonne un `EmotionProcessor` aux nouvelles versions ; le retourne."""
+        with self._lock:
+            self._subscribers.add(processor)
+        return processor
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """Charge la version active si elle a changé ; retourne True si elle a été adoptée."""
+        version = self.registry.current()
+        current = self.current.version if self.current else None
+        if version is None or version == current or version in self._failed:
+            return False
+        try:
+            loaded = self.registry.load(version, self.variant, self.compact)
+        except Exception as error:
+            # Version invalide : l'ancienne reste en service
+            self._failed.add(version)
+            self.failures += 1
+            self.last_error = f"{version}: {error}"
+            _reload_failures.inc()
+            return False
+
+        with self._lock:
+            self.current = loaded
+            processors = list(self._subscribers)
+        for processor in processors:
+            processor.set_classifier(loaded.model, loaded.label, loaded.reducer)
+        self.reloads += 1
+        _reloads.inc()
+        return True
+
+    def stats(self):
+        current = self.current
+        with self._lock:
+            sessions = len(self._subscribers)
+        return {
+            "version": current.version if current else None,
+            "labels": [str(label) for label in current.label] if current and current.label is not None else [],
+            "metrics": current.meta.get("metrics", {}) if current else {},
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "sessions": sessions,
+        }
+
+
+def extend(data_files, label, registry=None, manifest_path=None, epochs=15, head_epochs=3,
+           learning_rate=1e-4, batch_size=32, validation=0.2, patience=5, update_manifest=True):
+    """
+    Ajoute la classe `label` (fichiers `data_files`) à la version active et
+    publie le résultat comme nouvelle version.
+
+    1. Les poids de la version active initialisent un réseau de même
+       architecture dont la sortie compte une classe de plus.
+    2. `head_epochs` époques n'entraînent que la couche de sortie (la
+       nouvelle colonne rattrape les autres sans perturber les couches
+       cachées), puis tout le réseau est affiné à faible taux
+       d'apprentissage, avec arrêt anticipé.
+    3. Les données des classes existantes (manifeste) sont reprises pour que
+       le modèle ne les oublie pas ; la réduction des features est gardée
+       telle quelle.
+    """
+    import keras
+
+    from data_loader import MANIFEST_PATH, load_dataset, load_manifest, register_class, split
+    from numpy_model import export_model
+    from training import build_model, fit_model, warm_start
+
+    registry = registry or ModelRegistry()
+    manifest_path = manifest_path or MANIFEST_PATH
+    parent = registry.load()
+    labels = [str(name) for name in parent.label]
+    if label in labels:
+        raise ValueError(f"La classe {label} existe déjà dans {parent.version}")
+
+    # Classes existantes dans l'ordre des sorties du modèle, puis la nouvelle
+    manifest = load_manifest(manifest_path)
+    by_label = {c["label"]: c for c in manifest["classes"]}
+    missing = [name for name in labels if name not in by_label]
+    if missing:
+        raise ValueError(f"Données absentes du manifeste pour: {', '.join(missing)}")
+    new_class = {"label": label, "files": list(data_files)}
+    X, y, _ = load_dataset({"classes": [by_label[name] for name in labels] + [new_class]},
+                           directory=os.path.dirname(manifest_path) or ".")
+    Xr = parent.reducer.transform(X)
+    n_classes = len(labels) + 1
+    train, val = split(len(X), validation)
+
+    start = time.perf_counter()
+    layers = parent.meta.get("layers") or [W.shape[1] for W in parent.model.weights[:-1]]
+    model = build_model(parent.reducer.output_dim, n_classes, layers)
+    warm_start(model, parent.model.weights, parent.model.biases)
+    if head_epochs:
+        # Couches cachées gelées : seule la sortie apprend la nouvelle classe
+        for layer in model.layers[1:-1]:
+            layer.trainable = False
+        model.compile(optimizer=keras.optimizers.Adam(learning_rate * 10),
+                      loss="categorical_crossentropy", metrics=["acc"])
+        fit_model(model, Xr, y, n_classes, train, val, epochs=head_epochs, batch_size=batch_size, verbose=0)
+        for layer in model.layers:
+            layer.trainable = True
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate), loss="categorical_crossentropy", metrics=["acc"])
+    history = fit_model(model, Xr, y, n_classes, train, val, epochs=epochs, batch_size=batch_size,
+                        patience=patience, verbose=0)
+    train_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        npz_path = export_model(model, os.path.join(tmp, NPZ_PATH))
+        fast = NumpyModel.load(npz_path)
+        val = np.sort(val)
+        pred = fast.predict(Xr[val]).argmax(axis=1)
+        new_rows = y[val] == n_classes - 1
+        results = {
+            "val_acc": float((pred == y[val]).mean()),
+            "val_acc_new_class": float((pred[new_rows] == y[val][new_rows]).mean()) if new_rows.any() else None,
+            "epochs": head_epochs + len(history["loss"]),
+            "rows": len(X),
+            "train_seconds": train_seconds,
+            "incremental": True,
+        }
+        version = registry.publish(npz_path, labels + [label], parent.reducer, results,
+                                   parent=parent.version, source=f"extend {' '.join(data_files)}")
+
+    if update_manifest:
+        # Les prochains entraînements complets incluront la nouvelle classe
+        for filename in data_files:
+            register_class(label, filename, manifest_path)
+    return version, results
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Registre versionné des modèles d'émotion")
+    parser.add_argument("--registry", default=os.environ.get("EMOTION_MODEL_REGISTRY", REGISTRY_DIR))
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="lister les versions publiées")
+    activate = commands.add_parser("activate", help="activer une version (retour arrière compris)")
+    activate.add_argument("version")
+    ext = commands.add_parser("extend", help="ajouter une classe à la version active")
+    ext.add_argument("files", nargs="+", help="fichiers .npy de features de la nouvelle classe")
+    ext.add_argument("--label", default=None, help="nom de la classe (défaut : nom du premier fichier)")
+    ext.add_argument("--epochs", type=int, default=15)
+    ext.add_argument("--head-epochs", type=int, default=3)
+    ext.add_argument("--manifest", default=None)
+    ext.add_argument("--no-manifest-update", action="store_true")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.registry)
+    if args.command == "list":
+        current = registry.current()
+        for version in registry.versions():
+            meta = registry.meta(version)
+            accuracy = meta["metrics"].get("val_acc")
+            accuracy = f"{accuracy:.3f}" if accuracy is not None else "n/d"
+            print(
+                f"{'*' if version == current else ' '} {version} {meta['created']} | "
+                f"{len(meta['labels'])} classes ({', '.join(meta['labels'])}) | précision val {accuracy} | "
+                f"{meta['schema']['reduction']} | parent {meta['parent'] or '-'} | {meta['source'] or ''}"
+            )
+    elif args.command == "activate":
+        print(f"Version active : {registry.activate(args.version)}")
+    else:
+        label = args.label or os.path.splitext(os.path.basename(args.files[0]))[0]
+        version, results = extend(args.files, label, registry, args.manifest, args.epochs, args.head_epochs,
+                                  update_manifest=not args.no_manifest_update)
+        new_acc = results["val_acc_new_class"]
+        print(
+            f"{version} publiée : classe {label} ajoutée en {results['train_seconds']:.0f} s "
+            f"({results['epochs']} époques), précision val {results['val_acc']:.3f}"
+            + (f", nouvelle classe {new_acc:.3f}" if new_acc is not None else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Suivi de la région du visage et détection Holistic en résolution réduite
+
+Le visage (et les mains) n'occupent qu'une petite partie d'une frame HD et
+se déplacent lentement. `RoiTracker` enveloppe un détecteur Holistic
+(`holistic.Holistic`, `HolisticLease`, ...) et, pour chaque frame :
+1. Recadre l'image sur la région d'intérêt (ROI) issue des landmarks des
+   frames précédentes, élargie d'une marge. La ROI n'est déplacée que
+   lorsque les landmarks sortent de sa zone centrale, pour que le suivi
+   temporel de MediaPipe voie une image stable.
+2. Réduit l'image à une résolution de travail (`working_size` pixels pour
+   le plus grand côté).
+3. Ramène les landmarks dans les coordonnées normalisées de la frame
+   entière : les features restent identiques à celles d'une détection
+   plein cadre.
+
+La frame entière (réduite) est de nouveau analysée toutes les
+`reacquire_every` frames, pour voir une main qui entre dans le champ, et
+aussitôt que le visage est perdu dans la ROI.
+
+`RoiTracker` expose la même interface que le détecteur enveloppé
+(`process`, `release`, `saturated`) et se substitue à lui dans
+`EmotionProcessor` et `data_collection.py`.
+
+Usage (parité et gain de temps sur une fixture enregistrée) :
+    python roi.py check fixture.npz [working_size]
+"""
+
+import cv2
+import numpy as np
+
+FIELDS = ("face_landmarks", "left_hand_landmarks", "right_hand_landmarks")
+WORKING_SIZES = (320, 480, 640, 960, None)
+
+
+def downscale(img, working_size):
+    """Réduit `img` pour que son plus grand côté ne dépasse pas `working_size`."""
+    h, w = img.shape[:2]
+    if not working_size or max(h, w) <= working_size:
+        return img
+    scale = working_size / max(h, w)
+    return cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def remap(res, box, width, height):
+    """Ramène en place les landmarks d'un recadrage `box` vers la frame entière."""
+    x0, y0, x1, y1 = box
+    sx, sy = (x1 - x0) / width, (y1 - y0) / height
+    ox, oy = x0 / width, y0 / height
+    for field in FIELDS:
+        lms = getattr(res, field, None)
+        if not lms:
+            continue
+        for lm in lms.landmark:
+            lm.x = ox + lm.x * sx
+            lm.y = oy + lm.y * sy
+            lm.z = lm.z * sx  # z est à l'échelle de la largeur de l'image
+    return res
+
+
+def bounding_box(res, width, height):
+    """Boîte (x0, y0, x1, y1) en pixels englobant tous les landmarks, ou None."""
+    xs, ys = [], []
+    for field in FIELDS:
+        lms = getattr(res, field, None)
+        if lms:
+            xs.extend(lm.x for lm in lms.landmark)
+            ys.extend(lm.y for lm in lms.landmark)
+    if not xs:
+        return None
+    return min(xs) * width, min(ys) * height, max(xs) * width, max(ys) * height
+
+
+class RoiTracker:
+    def __init__(self, detector, working_size=640, margin=0.4, reacquire_every=30,
+                 min_roi=0.2, enabled=True):
+        self.detector = detector
+        self.working_size = working_size
+        self.margin = margin  # marge ajoutée de chaque côté, en fraction de la taille de la boîte
+        self.reacquire_every = reacquire_every
+        self.min_roi = min_roi  # côté minimal de la ROI, en fraction de la frame
+        self.enabled = enabled
+
+        self.roi = None  # (x0, y0, x1, y1) en pixels de la frame entière
+        self._since_full = 0
+        self.frames = 0
+        self.roi_frames = 0
+        self.reacquisitions = 0
+        self.pixels = 0  # pixels envoyés au détecteur
+        self.full_pixels = 0  # pixels des frames entières reçues
+
+    @property
+    def saturated(self):
+        return getattr(self.detector, "saturated", 0)
+
+    def release(self):
+        release = getattr(self.detector, "release", None)
+        if release is not None:
+            release()
+
+    def _detect(self, rgb, box):
+        x0, y0, x1, y1 = box
+        crop = downscale(rgb[y0:y1, x0:x1], self.working_size)
+        self.pixels += crop.shape[0] * crop.shape[1]
+        res = self.detector.process(np.ascontiguousarray(crop))
+        if res is not None and (x0, y0, x1, y1) != (0, 0, rgb.shape[1], rgb.shape[0]):
+            remap(res, box, rgb.shape[1], rgb.shape[0])
+        return res
+
+    def process(self, rgb):
+        height, width = rgb.shape[:2]
+        full = (0, 0, width, height)
+        self.frames += 1
+        self.full_pixels += width * height
+
+        if not self.enabled:
+            self.roi = None
+            return self._detect(rgb, full)
+
+        use_roi = self.roi is not None and self._since_full < self.reacquire_every
+        res = self._detect(rgb, self.roi if use_roi else full)
+        if res is None:
+            return None  # détecteur saturé
+
+        if use_roi and not getattr(res, "face_landmarks", None):
+            # Visage perdu dans la ROI : réacquisition immédiate sur la frame entière
+            self.reacquisitions += 1
+            use_roi = False
+            res = self._detect(rgb, full)
+            if res is None:
+                return None
+
+        if use_roi:
+            self.roi_frames += 1
+            self._since_full += 1
+        else:
+            self._since_full = 0
+        self._update_roi(res, width, height)
+        return res
+
+    def _update_roi(self, res, width, height):
+        box = bounding_box(res, width, height) if getattr(res, "face_landmarks", None) else None
+        if box is None:
+            self.roi = None
+            return
+        bx0, by0, bx1, by1 = box
+        if self.roi is not None:
+            # Garder la ROI tant que les landmarks restent dans sa zone centrale
+            rx0, ry0, rx1, ry1 = self.roi
+            inset_x = (rx1 - rx0) * self.margin / (1 + 2 * self.margin) / 2
+            inset_y = (ry1 - ry0) * self.margin / (1 + 2 * self.margin) / 2
+            inside = (bx0 >= rx0 + inset_x and by0 >= ry0 + inset_y
+                      and bx1 <= rx1 - inset_x and by1 <= ry1 - inset_y)
+            # ... et qu'ils n'ont pas fortement rétréci (visage qui s'éloigne)
+            large_enough = (bx1 - bx0) * (by1 - by0) >= 0.25 * (rx1 - rx0) * (ry1 - ry0) / (1 + 2 * self.margin) ** 2
+            if inside and large_enough:
+                return
+
+        cx, cy = (bx0 + bx1) / 2, (by0 + by1) / 2
+        side = max(bx1 - bx0, by1 - by0) * (1 + 2 * self.margin)
+        side = max(side, self.min_roi * min(width, height))
+        x0, x1 = int(max(0, cx - side / 2)), int(min(width, cx + side / 2))
+        y0, y1 = int(max(0, cy - side / 2)), int(min(height, cy + side / 2))
+        self.roi = (x0, y0, x1, y1) if x1 > x0 and y1 > y0 else None
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "working_size": self.working_size,
+            "frames": self.frames,
+            "roi_rate": self.roi_frames / self.frames if self.frames else 0.0,
+            "reacquisitions": self.reacquisitions,
+            "pixel_ratio": self.pixels / self.full_pixels if self.full_pixels else 1.0,
+        }
+
+
+def check(fixture, working_size=640, **options):
+    """
+    Compare, frame par frame, la détection plein cadre pleine résolution et
+    la détection avec ROI : écart des features, accord de détection du
+    visage et de la prédiction, temps MediaPipe par frame.
+    """
+    import os
+    import time
+
+    import mediapipe as mp
+
+    from features import extract_features
+    from fixtures import load_fixture
+    from numpy_model import NPZ_PATH, NumpyModel
+    from reduction import REDUCTION_PATH, FeatureReducer
+
+    frames, _ = load_fixture(fixture)
+    rgb = [cv2.cvtColor(cv2.flip(f, 1), cv2.COLOR_BGR2RGB) for f in frames]
+
+    def run(make):
+        detector = make()
+        out, elapsed = [], 0.0
+        for img in rgb:
+            start = time.perf_counter()
+            res = detector.process(img)
+            elapsed += time.perf_counter() - start
+            out.append(extract_features(res))
+        return detector, out, elapsed / len(rgb)
+
+    holistic = mp.solutions.holistic.Holistic
+    _, reference, t_full = run(lambda: holistic(**options))
+    tracker, tracked, t_roi = run(lambda: RoiTracker(holistic(**options), working_size))
+
+    both = [(a, b) for a, b in zip(reference, tracked) if a is not None and b is not None]
+    same_face = np.mean([(a is None) == (b is None) for a, b in zip(reference, tracked)])
+    errors = np.array([np.abs(a - b).max() for a, b in both]) if both else np.zeros(1)
+
+    print(f"{len(rgb)} frames {frames.shape[2]}x{frames.shape[1]} | résolution de travail {working_size}")
+    print(f"détection du visage identique : {same_face:.1%}")
+    print(f"écart des features (max par frame) : médiane {np.median(errors):.4f}, p95 {np.percentile(errors, 95):.4f}")
+    if os.path.exists(NPZ_PATH) and both:
+        model = NumpyModel.load(NPZ_PATH)
+        reducer = FeatureReducer.load(REDUCTION_PATH) if os.path.exists(REDUCTION_PATH) else FeatureReducer()
+        a = model.predict(reducer.transform(np.array([a for a, _ in both]))).argmax(axis=1)
+        b = model.predict(reducer.transform(np.array([b for _, b in both]))).argmax(axis=1)
+        print(f"prédictions identiques : {(a == b).mean():.1%}")
+    stats = tracker.stats()
+    print(
+        f"MediaPipe : {t_full * 1e3:.1f} ms/frame plein cadre -> {t_roi * 1e3:.1f} ms/frame avec ROI "
+        f"(x{t_full / t_roi:.1f}) | ROI sur {stats['roi_rate']:.0%} des frames, "
+        f"{stats['reacquisitions']} réacquisitions, {stats['pixel_ratio']:.0%} des pixels"
+    )
+    return same_face, errors
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3 or sys.argv[1] != "check":
+        sys.exit("Usage: python roi.py check fixture.npz [working_size]")
+    check(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 640)
@@ -0,0 +1,110 @@
+"""
+Ordonnanceur d'inférence avec saut de frames adaptatif
+
+L'émotion d'un utilisateur évolue à l'échelle de la seconde, alors que la
+caméra envoie 15 à 30 frames par seconde. Plutôt que d'exécuter MediaPipe
+et le classifieur sur chaque frame, `InferenceScheduler` décide pour chaque
+frame si le pipeline complet doit tourner ; les frames intermédiaires
+réutilisent les derniers landmarks et la dernière prédiction.
+
+Deux politiques :
+- "every_n"  : le pipeline tourne une frame sur N.
+- "budget"   : le pipeline tourne aussi souvent que le permet un budget de
+               calcul moyen par frame (en millisecondes).
+
+Dans les deux cas, si le temps de traitement mesuré dépasse l'intervalle
+entre deux frames, l'ordonnanceur espace automatiquement les inférences.
+"""
+
+import math
+import time
+from collections import deque
+
+POLICIES = ("every_n", "budget")
+
+
+class InferenceScheduler:
+    def __init__(self, policy="every_n", every_n=3, budget_ms=10.0, max_skip=30, smoothing=0.2):
+        self.policy = policy
+        self.every_n = every_n
+        self.budget_ms = budget_ms
+        self.max_skip = max_skip
+        self.smoothing = smoothing  # poids des nouvelles mesures (moyennes exponentielles)
+
+        self.frame_interval = None  # intervalle moyen entre deux frames (s)
+        self.process_time = None  # durée moyenne du pipeline complet (s)
+        self.skip = 1  # une inférence toutes les `skip` frames
+        self.frames = 0
+        self.inferences = 0
+
+        self._last_frame = None
+        self._since_inference = 0
+        self._inference_times = deque()  # horodatages récents, pour le débit effectif
+
+    def _average(self, current, value):
+        if current is None:
+            return value
+        return current + self.smoothing * (value - current)
+
+    def _update_skip(self):
+        skip = self.every_n if self.policy == "every_n" else 1
+
+        if self.process_time is not None:
+            if self.policy == "budget" and self.budget_ms > 0:
+                # Coût amorti par frame = process_time / skip <= budget
+                skip = max(skip, math.ceil(self.process_time * 1000.0 / self.budget_ms))
+            if self.frame_interval:
+                # Recul automatique : le pipeline ne doit pas prendre plus
+                # de temps que les frames qu'il couvre
+                skip = max(skip, math.ceil(self.process_time / self.frame_interval))
+
+        self.skip = max(1, min(int(skip), self.max_skip))
+
+    def should_run(self, now=None):
+        """Appelé à chaque frame : True si le pipeline complet doit tourner."""
+        now = time.perf_counter() if now is None else now
+        if self._last_frame is not None:
+            self.frame_interval = self._average(self.frame_interval, now - self._last_frame)
+        self._last_frame = now
+        self.frames += 1
+
+        self._update_skip()
+        if self.inferences == 0 or self._since_inference + 1 >= self.skip:
+            self._since_inference = 0
+            return True
+        self._since_inference += 1
+        return False
+
+    def record(self, elapsed, now=None):
+        """Enregistre la durée (s) d'une exécution du pipeline complet."""
+        now = time.perf_counter() if now is None else now
+        self.process_time = self._average(self.process_time, elapsed)
+        self.inferences += 1
+
+        self._inference_times.append(now)
+        # Fenêtre glissante de 5 secondes
+        while self._inference_times and now - self._inference_times[0] > 5.0:
+            self._inference_times.popleft()
+
+    @property
+    def inference_rate(self):
+        """Nombre d'inférences par seconde sur les dernières secondes."""
+        times = self._inference_times
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    @property
+    def frame_rate(self):
+        return 1.0 / self.frame_interval if self.frame_interval else 0.0
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "skip": self.skip,
+            "frame_rate": self.frame_rate,
+            "inference_rate": self.inference_rate,
+            "process_ms": (self.process_time or 0.0) * 1000.0,
+            "frames": self.frames,
+            "inferences": self.inferences,
+        }
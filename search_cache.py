@@ -0,0 +1,267 @@
+"""
+Cache et préchargement des recherches de musique (pytube Search)
+
+Une recherche YouTube prend plusieurs secondes et les mêmes requêtes
+(langue, émotion, artiste) reviennent sans cesse d'un clic et d'un
+utilisateur à l'autre. `SearchCache` sert les résultats depuis deux niveaux :
+1. Mémoire : LRU bornée avec durée de vie (TTL).
+2. Disque : base SQLite qui survit aux redémarrages de l'application.
+Ce n'est qu'en cas d'absence dans les deux niveaux que le backend de
+recherche est interrogé.
+
+`prefetch` lance en arrière-plan les recherches pour toutes les émotions
+connues dès que la langue et l'artiste sont saisis, pour que le clic sur
+« Recommander » soit servi instantanément (`prefetch_query` pour une
+recherche quelconque, comme les variantes de `search_fanout.py`).
+
+Le backend est une simple fonction `backend(query) -> list[Track]`, ce qui
+permet de remplacer pytube par un backend local.
+
+Les variantes d'une recherche (synonyme de l'émotion, requête dans la
+langue choisie, voir `search_fanout.py`) sont gardées sous leur propre clé
+`langue|émotion:terme|artiste`.
+
+Usage (démonstration avec un backend local simulé) :
+    python search_cache.py
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import metrics
+
+Track = namedtuple("Track", ["video_id", "title"])
+
+TIERS = ("memory", "disk", "backend")
+
+
+def build_query(lang, emotion, artist):
+    return " ".join(f"{lang} {emotion} {artist} song".split())
+
+
+def pytube_search(query, limit=5):
+    """Backend par défaut : recherche YouTube via pytube."""
+    from pytube import Search
+
+    return [Track(video.video_id, video.title) for video in Search(query).results[:limit]]
+
+
+class _TierStats:
+    def __init__(self, tier):
+        self.hits = 0
+        self.misses = 0
+        self.seconds = 0.0
+        # Mêmes mesures, exportées avec les autres métriques de l'application
+        self._seconds = metrics.histogram("search_seconds", "Durée des recherches par niveau de cache", tier=tier)
+        self._hits = metrics.counter("search_hits_total", "Recherches servies par niveau de cache", tier=tier)
+        self._misses = metrics.counter("search_misses_total", "Recherches absentes par niveau de cache", tier=tier)
+
+    def record(self, hit, elapsed):
+        if hit:
+            self.hits += 1
+            self._hits.inc()
+        else:
+            self.misses += 1
+            self._misses.inc()
+        self.seconds += elapsed
+        self._seconds.observe(elapsed)
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "mean_ms": self.seconds * 1000.0 / lookups if lookups else 0.0,
+        }
+
+
+class SearchCache:
+    def __init__(self, backend=pytube_search, max_entries=256, ttl=6 * 3600,
+                 disk_path="search_cache.sqlite", prefetch_workers=2):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # clé -> (horodatage, [Track])
+        self._inflight = {}  # clé -> Future, pour ne pas lancer deux fois la même recherche
+        self._stats = {tier: _TierStats(tier) for tier in TIERS}
+
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS searches "
+                "(key TEXT PRIMARY KEY, created REAL, tracks TEXT)"
+            )
+            self._db.commit()
+
+        self._executor = ThreadPoolExecutor(prefetch_workers, thread_name_prefix="search-prefetch")
+
+    @staticmethod
+    def key(lang, emotion, artist, term=None):
+        if term and term.strip().lower() != emotion.strip().lower():
+            emotion = f"{emotion}:{term}"
+        return "|".join(part.strip().lower() for part in (lang, emotion, artist))
+
+    def _fresh(self, created):
+        return time.time() - created < self.ttl
+
+    # Niveau mémoire
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if not self._fresh(entry[0]):
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry[1]
+
+    def _memory_put(self, key, created, tracks):
+        with self._lock:
+            self._memory[key] = (created, tracks)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    # Niveau disque
+    def _disk_get(self, key):
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT created, tracks FROM searches WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or not self._fresh(row[0]):
+            return None
+        return row[0], [Track(*t) for t in json.loads(row[1])]
+
+    def _disk_put(self, key, created, tracks):
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?)",
+                (key, created, json.dumps([list(t) for t in tracks])),
+            )
+            self._db.commit()
+
+    def _lookup(self, key, query):
+        start = time.perf_counter()
+        tracks = self._memory_get(key)
+        self._stats["memory"].record(tracks is not None, time.perf_counter() - start)
+        if tracks is not None:
+            return tracks
+
+        start = time.perf_counter()
+        entry = self._disk_get(key)
+        self._stats["disk"].record(entry is not None, time.perf_counter() - start)
+        if entry is not None:
+            self._memory_put(key, *entry)
+            return entry[1]
+
+        start = time.perf_counter()
+        tracks = list(self.backend(query))
+        self._stats["backend"].record(bool(tracks), time.perf_counter() - start)
+        created = time.time()
+        # Ne pas garder en cache une recherche vide (souvent une erreur réseau)
+        if tracks:
+            self._memory_put(key, created, tracks)
+            self._disk_put(key, created, tracks)
+        return tracks
+
+    def get(self, lang, emotion, artist, term=None, query=None):
+        """
+        Résultats pour (langue, émotion, artiste), depuis le niveau le plus
+        rapide ; `term` et `query` désignent une variante de la recherche.
+        """
+        key = self.key(lang, emotion, artist, term)
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+
+        if not owner:
+            # Une recherche identique (souvent le préchargement) est en cours
+            return future.result()
+
+        try:
+            tracks = self._lookup(key, query or build_query(lang, term or emotion, artist))
+            future.set_result(tracks)
+            return tracks
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def contains(self, lang, emotion, artist, term=None):
+        key = self.key(lang, emotion, artist, term)
+        return self._memory_get(key) is not None or self._disk_get(key) is not None
+
+    def prefetch_query(self, lang, emotion, artist, term=None, query=None):
+        """Précharge en arrière-plan une recherche absente du cache ; None si elle y est déjà."""
+        emotion = str(emotion)
+        if self.contains(lang, emotion, artist, term):
+            return None
+        return self._executor.submit(self.get, lang, emotion, artist, term, query)
+
+    def prefetch(self, lang, artist, emotions):
+        """Précharge en arrière-plan les résultats de chaque émotion."""
+        futures = (self.prefetch_query(lang, emotion, artist) for emotion in emotions)
+        return [future for future in futures if future is not None]
+
+    def stats(self):
+        """Taux de succès et latence moyenne par niveau."""
+        with self._lock:
+            entries = len(self._memory)
+        stats = {tier: s.as_dict() for tier, s in self._stats.items()}
+        stats["memory"]["entries"] = entries
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        if self._db is not None:
+            self._db.close()
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    def local_backend(query, latency=0.5):
+        # Backend simulé : latence fixe, résultats déterministes
+        time.sleep(latency)
+        return [Track(f"{abs(hash(query)) % 10**8:08d}{i}", f"{query} #{i}") for i in range(5)]
+
+    emotions = ["angry", "happy", "neutral", "sad", "surprise"]
+    path = os.path.join(tempfile.mkdtemp(), "search_cache.sqlite")
+
+    cache = SearchCache(local_backend, disk_path=path)
+    start = time.perf_counter()
+    for future in cache.prefetch("English", "Adele", emotions):
+        future.result()
+    print(f"préchargement de {len(emotions)} émotions: {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    cache.get("English", "happy", "Adele")
+    print(f"clic après préchargement: {(time.perf_counter() - start) * 1e3:.3f} ms")
+    cache.close()
+
+    # Redémarrage : le niveau mémoire est vide, le niveau disque répond
+    cache = SearchCache(local_backend, disk_path=path)
+    start = time.perf_counter()
+    cache.get("english", "Sad", "adele")
+    print(f"clic après redémarrage: {(time.perf_counter() - start) * 1e3:.3f} ms")
+    for tier, s in cache.stats().items():
+        print(f"{tier:8s} {s}")
+    cache.close()
@@ -0,0 +1,284 @@
+"""
+Recherche de musique en éventail (plusieurs requêtes simultanées)
+
+Une seule requête YouTube (« English happy Adele song ») bloque le bouton
+« Recommander » plusieurs secondes et donne parfois une playlist maigre,
+voire vide. `FanOutSearch` lance à la place plusieurs variantes de la
+requête (`query_variants`) :
+- l'émotion et ses synonymes (« happy », « upbeat », « feel good »...) ;
+- avec et sans l'artiste ;
+- formulées dans la langue choisie (« chanson joyeuse »...) quand elle
+  est connue (`LOCAL_TERMS`).
+
+Les variantes passent par `SearchCache` (chacune sous sa propre clé) sur un
+pool de threads borné, partagé par toutes les sessions ; `prefetch` les
+précharge toutes dès que la langue et l'artiste sont connus. Chaque requête
+a un délai (`timeout`) au-delà duquel elle est abandonnée pour ce clic ;
+elle continue en arrière-plan et son résultat reste en cache pour le suivant.
+
+Les résultats sont fusionnés par video_id et classés par fusion des rangs
+(`rank`) : un morceau trouvé par plusieurs variantes, ou bien placé dans
+une requête de poids élevé (la requête d'origine), passe devant. `stream`
+renvoie le classement courant à chaque requête terminée, pour que
+l'interface affiche les premiers morceaux dès qu'ils arrivent.
+
+Usage (comparaison avec la recherche unique, backend local simulé) :
+    python search_fanout.py [--latency 0.8] [--jitter 0.6] [--timeout 2.5] [--workers 4] [--repeat 5]
+"""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+from search_cache import SearchCache, Track, build_query
+
+SearchQuery = namedtuple("SearchQuery", ["term", "artist", "text", "weight"])
+
+# Synonymes des émotions de `labels.npy`, en anglais
+EMOTION_SYNONYMS = {
+    "happy": ("upbeat", "feel good"),
+    "sad": ("melancholic", "emotional"),
+    "angry": ("aggressive", "intense"),
+    "neutral": ("chill", "relaxing"),
+    "surprise": ("energetic", "epic"),
+}
+
+# Mot « chanson » et émotions dans quelques langues (clé : langue en minuscules)
+LOCAL_TERMS = {
+    "french": ("chanson", {"happy": "joyeuse", "sad": "triste", "angry": "en colère",
+                           "neutral": "calme", "surprise": "entraînante"}),
+    "spanish": ("canción", {"happy": "alegre", "sad": "triste", "angry": "enojada",
+                            "neutral": "tranquila", "surprise": "sorprendente"}),
+    "german": ("lied", {"happy": "fröhlich", "sad": "traurig", "angry": "wütend",
+                        "neutral": "ruhig", "surprise": "überraschend"}),
+    "italian": ("canzone", {"happy": "allegra", "sad": "triste", "angry": "arrabbiata",
+                            "neutral": "tranquilla", "surprise": "sorprendente"}),
+    "portuguese": ("música", {"happy": "alegre", "sad": "triste", "angry": "raivosa",
+                              "neutral": "calma", "surprise": "surpreendente"}),
+}
+
+DEFAULT_MAX_QUERIES = 6
+DEFAULT_TIMEOUT = 4.0  # s, par requête
+DEFAULT_WORKERS = 8
+
+_queries = {
+    outcome: metrics.counter("search_fanout_queries_total", "Requêtes des recherches en éventail", outcome=outcome)
+    for outcome in ("ok", "empty", "timeout", "error")
+}
+_first_seconds = metrics.histogram("search_first_result_seconds", "Délai avant les premiers morceaux d'une recherche")
+
+
+def query_variants(lang, emotion, artist, max_queries=DEFAULT_MAX_QUERIES):
+    """
+    Variantes de la recherche, la requête d'origine en premier et par poids
+    décroissant : avec l'artiste d'abord, puis sans.
+    """
+    emotion = str(emotion).strip().lower()
+    artist = artist.strip()
+    variants = [SearchQuery(emotion, artist, build_query(lang, emotion, artist), 1.0)]
+
+    local = LOCAL_TERMS.get(lang.strip().lower())
+    if local is not None and emotion in local[1]:
+        song, term = local
+        term = term[emotion]
+        variants.append(SearchQuery(term, artist, " ".join(f"{artist} {song} {term}".split()), 0.8))
+
+    synonyms = EMOTION_SYNONYMS.get(emotion, ())
+    for synonym in synonyms:
+        variants.append(SearchQuery(synonym, artist, build_query(lang, synonym, artist), 0.6))
+    if artist:
+        # Sans l'artiste : la playlist ne reste pas vide pour un artiste peu connu
+        variants.append(SearchQuery(emotion, "", build_query(lang, emotion, ""), 0.5))
+        for synonym in synonyms:
+            variants.append(SearchQuery(synonym, "", build_query(lang, synonym, ""), 0.3))
+    return variants[:max_queries]
+
+
+def rank(results, artist="", k=None):
+    """
+    Fusionne les résultats [(SearchQuery, [Track])] par video_id et les classe.
+
+    Score d'un morceau : somme sur les requêtes qui le contiennent de
+    poids / (rang + 1), plus un bonus si l'artiste apparaît dans le titre ;
+    les égalités gardent l'ordre d'arrivée.
+    """
+    scores = {}
+    tracks = {}
+    artist = artist.strip().lower()
+    for query, found in results:
+        for position, track in enumerate(found):
+            if track.video_id not in tracks:
+                tracks[track.video_id] = track
+                scores[track.video_id] = 0.5 if artist and artist in track.title.lower() else 0.0
+            scores[track.video_id] += query.weight / (position + 1)
+    ordered = sorted(tracks, key=lambda video_id: -scores[video_id])
+    return [tracks[video_id] for video_id in ordered[:k]]
+
+
+class FanOutSearch:
+    def __init__(self, cache=None, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT,
+                 max_queries=DEFAULT_MAX_QUERIES):
+        self.cache = cache or SearchCache()
+        self.timeout = timeout
+        self.max_queries = max_queries
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="search-fanout")
+        self._lock = threading.Lock()
+        self._outcomes = dict.fromkeys(_queries, 0)
+
+    def _count(self, outcome):
+        _queries[outcome].inc()
+        with self._lock:
+            self._outcomes[outcome] += 1
+
+    def _search(self, lang, emotion, query, started):
+        started[query] = time.monotonic()
+        return self.cache.get(lang, emotion, query.artist, term=query.term, query=query.text)
+
+    def stream(self, emotion, lang, artist, k=10):
+        """
+        Classement fusionné des `k` meilleurs morceaux, renvoyé à chaque
+        requête terminée qui apporte des résultats ; le dernier est définitif.
+        """
+        queries = query_variants(lang, emotion, artist, self.max_queries)
+        started = {}  # requête -> début effectif (le pool peut la mettre en attente)
+        start = time.monotonic()
+        futures = {
+            self._executor.submit(self._search, lang, str(emotion), query, started): query
+            for query in queries
+        }
+        pending = set(futures)
+        results = []
+        first = True
+        # Délai global : chaque requête a au plus `timeout` une fois lancée
+        deadline = start + self.timeout * 2
+        try:
+            while pending:
+                now = time.monotonic()
+                expiries = [started[futures[f]] + self.timeout for f in pending if futures[f] in started]
+                wait_until = min(expiries + [deadline])
+                done, pending = wait(pending, timeout=max(0.0, wait_until - now), return_when=FIRST_COMPLETED)
+
+                changed = False
+                for future in done:
+                    try:
+                        tracks = future.result()
+                    except Exception:
+                        self._count("error")
+                        continue
+                    self._count("ok" if tracks else "empty")
+                    if tracks:
+                        results.append((futures[future], tracks))
+                        changed = True
+                if changed:
+                    if first:
+                        _first_seconds.observe(time.monotonic() - start)
+                        first = False
+                    yield rank(results, artist, k)
+
+                # Requêtes trop lentes : abandonnées pour ce clic (le cache garde leur résultat)
+                now = time.monotonic()
+                expired = {
+                    f for f in pending
+                    if now >= deadline or (futures[f] in started and now >= started[futures[f]] + self.timeout)
+                }
+                for future in expired:
+                    future.cancel()
+                    self._count("timeout")
+                pending -= expired
+        finally:
+            for future in pending:
+                future.cancel()
+        if not results:
+            yield []
+
+    def search(self, emotion, lang, artist, k=10):
+        """Classement définitif (attend toutes les requêtes ou leur délai)."""
+        ranked = []
+        for ranked in self.stream(emotion, lang, artist, k):
+            pass
+        return ranked
+
+    def prefetch(self, lang, artist, emotions):
+        """
+        Précharge les variantes de chaque émotion, celles de poids élevé
+        d'abord : la requête d'origine de toutes les émotions, puis la suivante...
+        """
+        emotions = [str(emotion) for emotion in emotions]
+        variants = [query_variants(lang, emotion, artist, self.max_queries) for emotion in emotions]
+        futures = []
+        for rank_index in range(max(map(len, variants), default=0)):
+            for emotion, queries in zip(emotions, variants):
+                if rank_index < len(queries):
+                    query = queries[rank_index]
+                    future = self.cache.prefetch_query(lang, emotion, query.artist, query.term, query.text)
+                    if future is not None:
+                        futures.append(future)
+        return futures
+
+    def stats(self):
+        with self._lock:
+            return dict(self._outcomes)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _demo(latency, jitter, timeout, workers, repeat, k=10):
+    import random
+    import zlib
+
+    rng = random.Random(0)
+    rng_lock = threading.Lock()
+
+    def local_backend(query):
+        # Backend simulé : latence aléatoire, résultats déterministes par requête ;
+        # les variantes sans l'artiste partagent une partie de leurs morceaux
+        with rng_lock:
+            delay = latency + rng.uniform(0.0, jitter)
+        time.sleep(delay)
+        seed = zlib.crc32(query.encode())
+        pool = zlib.crc32(query.split()[-2].encode()) % 4
+        return [Track(f"v{(seed + i) % 50 if i % 2 else pool * 10 + i:03d}", f"{query} #{i}") for i in range(5)]
+
+    lang, artist = "French", "Adele"
+    emotions = ["happy", "sad", "angry", "neutral", "surprise"]
+
+    print(f"backend simulé : {latency:.2f} s + jusqu'à {jitter:.2f} s ; délai par requête {timeout:.1f} s")
+    print(f"{'recherche':>12s} | {'1er morceau s':>13s} | {'total s':>7s} | {'morceaux':>8s}")
+    for name in ("unique", "éventail"):
+        firsts, totals, sizes = [], [], []
+        for i in range(repeat):
+            emotion = emotions[i % len(emotions)]
+            # Sans cache disque ni mémoire partagée : chaque clic interroge le backend
+            cache = SearchCache(local_backend, disk_path=None)
+            start = time.perf_counter()
+            if name == "unique":
+                ranked = cache.get(lang, emotion, artist)[:k]
+                firsts.append(time.perf_counter() - start)
+            else:
+                fanout = FanOutSearch(cache, workers=workers, timeout=timeout)
+                ranked = []
+                for ranked in fanout.stream(emotion, lang, artist, k):
+                    if len(firsts) < i + 1:
+                        firsts.append(time.perf_counter() - start)
+                fanout.close()
+            totals.append(time.perf_counter() - start)
+            sizes.append(len(ranked))
+            cache.close()
+        print(f"{name:>12s} | {sum(firsts) / repeat:13.2f} | {sum(totals) / repeat:7.2f} | "
+              f"{sum(sizes) / repeat:8.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recherche en éventail avec un backend local simulé")
+    parser.add_argument("--latency", type=float, default=0.8, help="latence minimale du backend (s)")
+    parser.add_argument("--jitter", type=float, default=1.5, help="latence supplémentaire aléatoire (s)")
+    parser.add_argument("--timeout", type=float, default=2.0, help="délai par requête (s)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    _demo(args.latency, args.jitter, args.timeout, args.workers, args.repeat)
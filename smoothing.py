@@ -0,0 +1,188 @@
+"""
+Lissage temporel des prédictions et événements de changement d'émotion
+
+L'argmax d'une seule frame change d'une frame à l'autre (bruit des
+landmarks, clignements, mouvements de tête). `EmotionSmoother` garde les
+derniers vecteurs de probabilités d'une session dans un tampon circulaire
+préalloué et en déduit une émotion « stable » :
+
+- "ema"      : moyenne exponentielle des probabilités ;
+- "majority" : part des votes (argmax) sur la fenêtre ;
+- "mean"     : moyenne des probabilités sur la fenêtre.
+
+Les trois scores sont tenus à jour à chaque frame en temps constant, ce
+qui permet de changer de méthode en cours de session.
+
+Une hystérésis évite les allers-retours : une nouvelle émotion ne remplace
+l'émotion stable que si son score atteint `enter`, dépasse celui de
+l'émotion stable d'au moins `margin`, et ce pendant `min_frames` mises à
+jour consécutives. `update` ne renvoie un `EmotionChange` que dans ce cas ;
+le reste de l'application (état de la session, recherche, affichage) ne
+travaille que sur ces événements au lieu de chaque frame.
+
+Usage (simulation : nombre d'événements et délai de détection par méthode) :
+    python smoothing.py
+"""
+
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+METHODS = ("ema", "majority", "mean")
+
+EmotionChange = namedtuple("EmotionChange", ["previous", "emotion", "confidence", "frame"])
+
+
+class EmotionSmoother:
+    def __init__(self, n_classes, method="ema", window=15, alpha=0.2,
+                 enter=0.4, margin=0.1, min_frames=3):
+        if method not in METHODS:
+            raise ValueError(f"Méthode de lissage inconnue: {method} ({', '.join(METHODS)})")
+        self.n_classes = n_classes
+        self.method = method
+        self.alpha = alpha  # poids de la nouvelle frame dans la moyenne exponentielle
+        self.enter = enter
+        self.margin = margin
+        self.min_frames = min_frames
+        self.stable = None  # indice de l'émotion stable
+        self.frames = 0
+        self.changes = 0
+        # update (thread d'inférence) et resize (script Streamlit) peuvent se croiser
+        self._lock = threading.Lock()
+        self.resize(window)
+
+    def resize(self, window):
+        """Change la taille de la fenêtre (réinitialise le lissage, pas l'émotion stable)."""
+        with self._lock:
+            self._resize(window)
+
+    def _resize(self, window):
+        self.window = window
+        self._probs = np.zeros((window, self.n_classes), dtype=np.float32)
+        self._votes = np.zeros(window, dtype=np.int64)
+        self._sum = np.zeros(self.n_classes, dtype=np.float64)
+        self._vote_counts = np.zeros(self.n_classes, dtype=np.int64)
+        self._ema = None
+        self._pos = 0
+        self._count = 0
+        self._candidate = None
+        self._candidate_frames = 0
+
+    def reset(self):
+        with self._lock:
+            self.stable = None
+            self._resize(self.window)
+
+    def scores(self):
+        """Scores lissés (n_classes,) selon la méthode courante."""
+        if not self._count:
+            return np.zeros(self.n_classes)
+        if self.method == "ema":
+            return self._ema
+        if self.method == "majority":
+            return self._vote_counts / self._count
+        return self._sum / self._count
+
+    def update(self, probs):
+        """Ajoute les probabilités d'une frame ; renvoie un `EmotionChange` ou None."""
+        probs = np.asarray(probs, dtype=np.float32).reshape(-1)
+        vote = int(probs.argmax())
+        with self._lock:
+            return self._update(probs, vote)
+
+    def _update(self, probs, vote):
+        # Retirer la plus ancienne frame des sommes glissantes si la fenêtre est pleine
+        if self._count == self.window:
+            self._sum -= self._probs[self._pos]
+            self._vote_counts[self._votes[self._pos]] -= 1
+        else:
+            self._count += 1
+        self._probs[self._pos] = probs
+        self._votes[self._pos] = vote
+        self._sum += probs
+        self._vote_counts[vote] += 1
+        self._pos = (self._pos + 1) % self.window
+
+        if self._ema is None:
+            self._ema = probs.astype(np.float64)
+        else:
+            self._ema += self.alpha * (probs - self._ema)
+
+        self.frames += 1
+        return self._hysteresis(self.scores())
+
+    def _hysteresis(self, scores):
+        best = int(scores.argmax())
+        if best == self.stable:
+            self._candidate, self._candidate_frames = None, 0
+            return None
+
+        current = scores[self.stable] if self.stable is not None else 0.0
+        if scores[best] < self.enter or scores[best] - current < self.margin:
+            self._candidate, self._candidate_frames = None, 0
+            return None
+
+        if best != self._candidate:
+            self._candidate, self._candidate_frames = best, 0
+        self._candidate_frames += 1
+        if self._candidate_frames < self.min_frames:
+            return None
+
+        change = EmotionChange(self.stable, best, float(scores[best]), self.frames)
+        self.stable = best
+        self.changes += 1
+        self._candidate, self._candidate_frames = None, 0
+        return change
+
+    def stats(self):
+        return {
+            "method": self.method,
+            "window": self.window,
+            "frames": self.frames,
+            "changes": self.changes,
+        }
+
+
+def simulate(n_frames=3000, n_classes=5, segment=300, noise=0.35, seed=0):
+    """
+    Prédictions bruitées d'une émotion qui change toutes les `segment`
+    frames ; compare les écritures par frame aux événements de chaque méthode.
+    """
+    rng = np.random.default_rng(seed)
+    truth = np.repeat(rng.integers(0, n_classes, n_frames // segment + 1), segment)[:n_frames]
+    logits = rng.normal(scale=noise * 4, size=(n_frames, n_classes))
+    logits[np.arange(n_frames), truth] += 1.5
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=1, keepdims=True)
+
+    raw = probs.argmax(axis=1)
+    real_changes = int((np.diff(truth) != 0).sum())
+    print(f"{n_frames} frames, {real_changes} vrais changements, argmax juste sur {(raw == truth).mean():.0%} des frames")
+    print(f"{'méthode':10s} | mises à jour de l'état | changements affichés | délai moyen (frames) | accord")
+    print(
+        f"{'aucune':10s} | {n_frames:22d} | {int((np.diff(raw) != 0).sum()):20d} | "
+        f"{0:20.1f} | {(raw == truth).mean():6.0%}"
+    )
+    for method in METHODS:
+        smoother = EmotionSmoother(n_classes, method=method)
+        stable = np.empty(n_frames, dtype=np.int64)
+        events = []
+        for i, p in enumerate(probs):
+            change = smoother.update(p)
+            if change is not None:
+                events.append(i)
+            stable[i] = -1 if smoother.stable is None else smoother.stable
+
+        # Délai entre chaque vrai changement et l'événement correspondant
+        delays = []
+        for start in np.flatnonzero(np.diff(truth)) + 1:
+            hit = np.flatnonzero(stable[start:start + segment] == truth[start])
+            if len(hit):
+                delays.append(hit[0])
+        delay = f"{np.mean(delays):20.1f}" if delays else f"{'-':>20s}"
+        print(f"{method:10s} | {len(events):22d} | {len(events):20d} | {delay} | {(stable == truth).mean():6.0%}")
+
+
+if __name__ == "__main__":
+    simulate()
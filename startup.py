@@ -0,0 +1,301 @@
+"""
+Démarrage rapide de l'application : imports différés et préchauffage
+
+La page d'accueil de `music.py` n'a besoin que de Streamlit. Les modules
+lourds (streamlit_webrtc/aiortc, av, cv2, MediaPipe) ne sont importés
+qu'après le clic sur « Commencer », et `Warmup` prépare en arrière-plan,
+dès l'arrivée du premier utilisateur :
+- "imports"      : les modules du traitement vidéo ;
+- "model"        : le classifieur NumPy, sa réduction et ses labels (version
+                   active du registre `models/`, sinon model.npz), suivis
+                   d'une prédiction factice (allocation des tampons, BLAS),
+                   puis surveillés pour le rechargement à chaud ;
+- "mediapipe"    : le pool Holistic, chaque worker traitant une image
+                   factice (chargement des graphes TFLite) ;
+- "recommenders" : les backends de recommandation (cache, catalogue).
+
+Quand l'utilisateur arrive sur la page principale, ces ressources sont
+déjà prêtes ; sinon la page attend seulement ce qui reste à charger.
+
+Usage (imports à froid, premier affichage, première prédiction, avant/après) :
+    python startup.py measure [répétitions]
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+import metrics
+from numpy_model import H5_PATH, NPZ_PATH
+from reduction import REDUCTION_PATH
+
+# Modules du traitement vidéo, importés en arrière-plan
+HEAVY_MODULES = ("streamlit_webrtc", "processor", "roi")
+
+# Imports exécutés avant le premier élément de la page d'accueil
+IMPORTS_BEFORE = (
+    "streamlit", "streamlit_webrtc", "metrics", "emotion_state", "holistic_pool", "numpy_model",
+    "processor", "recommend", "reduction", "roi", "scheduler", "smoothing", "search_cache",
+)
+IMPORTS_AFTER = ("streamlit", "metrics", "emotion_state", "startup")
+
+
+def import_heavy_modules():
+    import importlib
+
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+
+def model_variant():
+    """Variante des poids (float32, float16, int8) et mode compact choisis par configuration."""
+    # EMOTION_MODEL_COMPACT=1 garde les poids int8 en int8 en mémoire
+    return os.environ.get("EMOTION_MODEL_VARIANT", "float32"), os.environ.get("EMOTION_MODEL_COMPACT") == "1"
+
+
+def load_classifier(npz_path=NPZ_PATH, labels_path="labels.npy", reduction_path=REDUCTION_PATH):
+    """Charge le classifieur choisi par configuration et le préchauffe ; retourne (model, label, reducer)."""
+    from numpy_model import NumpyModel, export_h5, export_variants, variant_path
+    from reduction import FeatureReducer
+
+    # Inférence NumPy pure : TensorFlow n'est importé que pour exporter
+    # une première fois les poids de model.h5 si model.npz est absent
+    if not os.path.exists(npz_path):
+        export_h5(H5_PATH, npz_path)
+    variant, compact = model_variant()
+    path = variant_path(variant, npz_path)
+    if not os.path.exists(path):
+        export_variants(npz_path)
+    model = NumpyModel.load(path, compact=compact)
+    label = np.load(labels_path)
+    # Réduction des features apprise avec le modèle (identité si absente)
+    reducer = FeatureReducer.load(reduction_path) if os.path.exists(reduction_path) else FeatureReducer()
+
+    # Prédiction factice : la première vraie frame ne paie pas les allocations
+    from features import N_FEATURES
+
+    model.predict(reducer.transform(np.zeros(N_FEATURES, dtype=np.float32)))
+    return model, label, reducer
+
+
+def load_model_reloader():
+    """
+    Version active du registre des modèles, surveillée en arrière-plan ;
+    model.npz/labels.npy servent tant que le registre est vide.
+    """
+    from registry import REGISTRY_DIR, ModelRegistry, ModelReloader
+
+    variant, compact = model_variant()
+    registry = ModelRegistry(os.environ.get("EMOTION_MODEL_REGISTRY", REGISTRY_DIR))
+    interval = float(os.environ.get("EMOTION_MODEL_RELOAD_INTERVAL", "5"))
+    return ModelReloader(registry, load_classifier, interval, variant, compact).start()
+
+
+def warm_pool(pool, size=(64, 64)):
+    """Fait traiter une image noire à chaque worker pour charger son graphe."""
+    blank = np.zeros((*size, 3), dtype=np.uint8)
+    leases = [pool.lease() for _ in range(pool.size)]
+    try:
+        for lease in leases:
+            lease.process(blank, timeout=None)
+    finally:
+        for lease in leases:
+            lease.release()
+
+
+def load_pool():
+    from holistic_pool import HolisticPool
+
+    pool = HolisticPool()
+    warm_pool(pool)
+    return pool
+
+
+def load_recommenders():
+    """Backends de recommandation : YouTube (derrière le cache de recherche) et, s'il existe, le catalogue local."""
+    from recommend import CATALOG_PATH, LocalCatalogBackend, PytubeBackend
+    from search_cache import SearchCache
+
+    backends = [PytubeBackend(SearchCache())]
+    catalog_path = os.environ.get("MUSIC_CATALOG", CATALOG_PATH)
+    if os.path.exists(catalog_path):
+        backends.insert(0, LocalCatalogBackend.load(catalog_path))
+    return {backend.name: backend for backend in backends}
+
+
+class Warmup:
+    """Chargement en arrière-plan des ressources partagées de l'application."""
+
+    def __init__(self, loaders=None):
+        self.loaders = loaders or {
+            "imports": import_heavy_modules,
+            "model": load_model_reloader,
+            "mediapipe": load_pool,
+            "recommenders": load_recommenders,
+        }
+        self.started = None
+        self.timings = {}  # tâche -> durée (s)
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started = time.perf_counter()
+        executor = ThreadPoolExecutor(len(self.loaders), thread_name_prefix="warmup")
+        for name, loader in self.loaders.items():
+            self._futures[name] = executor.submit(self._run, name, loader)
+        executor.shutdown(wait=False)
+        return self
+
+    def _run(self, name, loader):
+        start = time.perf_counter()
+        try:
+            return loader()
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.timings[name] = elapsed
+            metrics.histogram("load_seconds", "Durée de chargement des ressources partagées", resource=name).observe(elapsed)
+
+    def retry(self, name):
+        """
+        Relance une tâche terminée en échec (les autres gardent leur
+        résultat) ; renvoie True si elle a été relancée.
+        """
+        with self._lock:
+            future = self._futures[name]
+            if not future.done() or future.exception() is None:
+                return False
+            executor = ThreadPoolExecutor(1, thread_name_prefix="warmup")
+            self._futures[name] = executor.submit(self._run, name, self.loaders[name])
+            executor.shutdown(wait=False)
+            return True
+
+    def ready(self, name=None):
+        names = [name] if name else list(self._futures)
+        return all(self._futures[n].done() for n in names)
+
+    def wait(self, names=None, timeout=None):
+        """Attend la fin des tâches (toutes par défaut), sans relancer leurs exceptions."""
+        wait([self._futures[n] for n in (names or self._futures)], timeout)
+
+    def result(self, name, timeout=None):
+        """Résultat d'une tâche (attend sa fin ; relance son exception éventuelle)."""
+        return self._futures[name].result(timeout)
+
+    def stats(self):
+        with self._lock:
+            timings = dict(self.timings)
+        return {
+            "elapsed": time.perf_counter() - self.started if self.started else 0.0,
+            "ready": [n for n in self._futures if self._futures[n].done()],
+            "timings": timings,
+        }
+
+
+def _subprocess_seconds(code, runs):
+    """Médiane de la durée affichée par `code` exécuté dans un interpréteur neuf."""
+    import subprocess
+
+    values = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        if out.returncode != 0:
+            return None, out.stderr.strip().splitlines()[-1] if out.stderr else "erreur"
+        values.append(float(out.stdout.strip().splitlines()[-1]))
+    return float(np.median(values)), None
+
+
+def _import_code(modules):
+    lines = ["import time", "t = time.perf_counter()"]
+    lines += [f"import {m}" for m in modules]
+    lines.append("print(time.perf_counter() - t)")
+    return "\n".join(lines)
+
+
+def _first_prediction(mode):
+    """
+    Durée jusqu'à la première prédiction sur une frame :
+    - "cold" : ancien comportement, tout est chargé à la première frame ;
+    - "warm" : après `Warmup`, seule la frame elle-même est traitée.
+    """
+    from features import N_FEATURES
+
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    features = np.zeros(N_FEATURES, dtype=np.float32)
+    if mode == "warm":
+        warmup = Warmup({k: v for k, v in Warmup().loaders.items() if k != "recommenders"}).start()
+        current = warmup.result("model").current
+        model, reducer = current.model, current.reducer
+        pool = warmup.result("mediapipe")
+        warmup.result("imports")
+        print(f"préchauffage: {warmup.stats()['elapsed']:.3f} s", file=sys.stderr)
+        start = time.perf_counter()
+    else:
+        start = time.perf_counter()
+        import_heavy_modules()
+        from numpy_model import NumpyModel
+        from reduction import FeatureReducer
+
+        model = NumpyModel.load(NPZ_PATH)
+        reducer = FeatureReducer.load(REDUCTION_PATH) if os.path.exists(REDUCTION_PATH) else FeatureReducer()
+        from holistic_pool import HolisticPool
+
+        pool = HolisticPool()
+    lease = pool.lease()
+    lease.process(frame, timeout=None)
+    model.predict(reducer.transform(features))
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return elapsed
+
+
+def measure(runs=3):
+    print(f"{'mesure':36s} | {'avant':>10s} | {'après':>10s}")
+
+    def row(name, before, after):
+        def fmt(value):
+            seconds, error = value
+            return f"{seconds:8.3f} s" if error is None else f"{'n/d':>10s}"
+
+        print(f"{name:36s} | {fmt(before)} | {fmt(after)}")
+        for _, error in (before, after):
+            if error:
+                print(f"    n/d : {error}")
+
+    # Imports exécutés avant le premier élément de la page d'accueil
+    before = _subprocess_seconds(_import_code(IMPORTS_BEFORE), runs)
+    after = _subprocess_seconds(_import_code(IMPORTS_AFTER), runs)
+    row("imports à froid (page d'accueil)", before, after)
+
+    # Premier affichage : exécution complète du script jusqu'à la page d'accueil
+    paint = (
+        "import time\nt = time.perf_counter()\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "AppTest.from_file('music.py', default_timeout=120).run()\n"
+        "print(time.perf_counter() - t)"
+    )
+    after_paint = _subprocess_seconds(paint, runs)
+    before_paint = (
+        (before[0] + after_paint[0] - after[0], None)
+        if before[1] is None and after_paint[1] is None and after[1] is None
+        else (None, "imports ou streamlit indisponibles")
+    )
+    row("premier affichage (estimé avant)", before_paint, after_paint)
+
+    first = "from startup import _first_prediction\nprint(_first_prediction('{}'))"
+    row(
+        "première prédiction (1re frame)",
+        _subprocess_seconds(first.format("cold"), runs),
+        _subprocess_seconds(first.format("warm"), runs),
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "measure":
+        sys.exit("Usage: python startup.py measure [répétitions]")
+    measure(int(sys.argv[2]) if len(sys.argv) > 2 else 3)
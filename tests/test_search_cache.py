@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from search_cache import SearchCache, Track
+
+
+class LocalBackend:
+    """Backend simulé : latence injectée, résultats déterministes, appels comptés."""
+
+    def __init__(self, latency=0.01):
+        self.latency = latency
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def __call__(self, query):
+        time.sleep(self.latency)
+        with self._lock:
+            self.queries.append(query)
+        return [Track(f"{query}-{i}", f"{query} #{i}") for i in range(5)]
+
+
+@pytest.fixture
+def backend():
+    return LocalBackend()
+
+
+def test_memory_hit(backend):
+    cache = SearchCache(backend, disk_path=None)
+    first = cache.get("English", "happy", "Adele")
+    second = cache.get("english", "Happy", " adele ")
+    assert first == second
+    assert len(backend.queries) == 1
+    stats = cache.stats()
+    assert stats["memory"]["hits"] == 1
+    assert stats["backend"]["misses"] == 0
+    cache.close()
+
+
+def test_disk_hit_after_restart(backend, tmp_path):
+    path = str(tmp_path / "search_cache.sqlite")
+    cache = SearchCache(backend, disk_path=path)
+    tracks = cache.get("English", "sad", "Adele")
+    cache.close()
+
+    cache = SearchCache(backend, disk_path=path)
+    assert cache.get("English", "sad", "Adele") == tracks
+    assert len(backend.queries) == 1
+    assert cache.stats()["disk"]["hits"] == 1
+    cache.close()
+
+
+def test_ttl_expiry(backend, tmp_path):
+    cache = SearchCache(backend, ttl=0.05, disk_path=str(tmp_path / "search_cache.sqlite"))
+    cache.get("English", "happy", "Adele")
+    time.sleep(0.1)
+    # Les deux niveaux sont périmés : le backend est interrogé à nouveau
+    assert not cache.contains("English", "happy", "Adele")
+    cache.get("English", "happy", "Adele")
+    assert len(backend.queries) == 2
+    cache.close()
+
+
+def test_lru_eviction(backend):
+    cache = SearchCache(backend, max_entries=2, disk_path=None)
+    cache.get("English", "happy", "Adele")
+    cache.get("English", "sad", "Adele")
+    cache.get("English", "happy", "Adele")  # happy devient la plus récente
+    cache.get("English", "angry", "Adele")  # sad est évincée
+    assert cache.stats()["memory"]["entries"] == 2
+    assert cache.contains("English", "happy", "Adele")
+    assert not cache.contains("English", "sad", "Adele")
+    cache.close()
+
+
+def test_prefetch_fills_cache(backend):
+    cache = SearchCache(backend, disk_path=None)
+    emotions = ["angry", "happy", "neutral", "sad", "surprise"]
+    futures = cache.prefetch("English", "Adele", emotions)
+    assert len(futures) == len(emotions)
+    for future in futures:
+        future.result(timeout=5)
+    assert all(cache.contains("English", emotion, "Adele") for emotion in emotions)
+    # Déjà en cache : rien à relancer, et le clic ne touche pas le backend
+    assert cache.prefetch("English", "Adele", emotions) == []
+    cache.get("English", "happy", "Adele")
+    assert len(backend.queries) == len(emotions)
+    cache.close()
+
+
+def test_variants_are_cached_separately(backend):
+    cache = SearchCache(backend, disk_path=None)
+    base = cache.get("English", "happy", "Adele")
+    variant = cache.get("English", "happy", "Adele", term="upbeat", query="English upbeat Adele song")
+    assert base != variant
+    assert cache.contains("English", "happy", "Adele", term="upbeat")
+    assert backend.queries == ["English happy Adele song", "English upbeat Adele song"]
+    cache.close()
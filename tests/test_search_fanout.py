@@ -0,0 +1,140 @@
+import threading
+import time
+
+from search_cache import SearchCache, Track, build_query
+from search_fanout import FanOutSearch, SearchQuery, query_variants, rank
+
+
+class LocalBackend:
+    """Backend simulé : latence injectée par requête, résultats fixés par requête."""
+
+    def __init__(self, results, latency=0.01, latencies=None):
+        self.results = results
+        self.latency = latency
+        self.latencies = latencies or {}
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def __call__(self, query):
+        with self._lock:
+            self.queries.append(query)
+        time.sleep(self.latencies.get(query, self.latency))
+        return [Track(video_id, f"{query} {video_id}") for video_id in self.results.get(query, [])]
+
+
+def make_search(backend, **kwargs):
+    return FanOutSearch(SearchCache(backend, disk_path=None), **kwargs)
+
+
+def test_query_variants():
+    variants = query_variants("French", "Happy", "Adele")
+    assert variants[0] == SearchQuery("happy", "Adele", "French happy Adele song", 1.0)
+    # Formulation dans la langue choisie, puis synonymes, puis sans l'artiste
+    assert variants[1].text == "Adele chanson joyeuse"
+    assert [v.weight for v in variants] == sorted((v.weight for v in variants), reverse=True)
+    assert any(v.artist == "" for v in variants)
+    assert len({v.text for v in variants}) == len(variants)
+    assert len(query_variants("French", "happy", "Adele", max_queries=3)) == 3
+
+
+def test_rank_merges_and_deduplicates():
+    base = SearchQuery("happy", "Adele", "q1", 1.0)
+    synonym = SearchQuery("upbeat", "Adele", "q2", 0.6)
+    results = [
+        (base, [Track("a", "A"), Track("b", "B"), Track("c", "C")]),
+        (synonym, [Track("c", "C"), Track("d", "D"), Track("a", "A")]),
+    ]
+    ranked = rank(results)
+    assert [t.video_id for t in ranked] == ["a", "c", "b", "d"]
+    assert len({t.video_id for t in ranked}) == len(ranked)
+    assert [t.video_id for t in rank(results, k=2)] == ["a", "c"]
+
+
+def test_rank_artist_bonus():
+    query = SearchQuery("upbeat", "", "q", 0.6)
+    results = [(query, [Track("x", "Some song"), Track("y", "Adele - Hello")])]
+    assert [t.video_id for t in rank(results)] == ["x", "y"]
+    assert [t.video_id for t in rank(results, artist="Adele")] == ["y", "x"]
+
+
+def test_stream_yields_partial_then_final():
+    lang, emotion, artist = "English", "happy", "Adele"
+    variants = query_variants(lang, emotion, artist)
+    base = variants[0].text
+    results = {v.text: [f"{i}-{j}" for j in range(3)] for i, v in enumerate(variants)}
+    # La requête d'origine répond vite, les autres plus tard
+    latencies = {v.text: 0.2 for v in variants[1:]}
+    backend = LocalBackend(results, latency=0.01, latencies=latencies)
+    search = make_search(backend, timeout=2.0)
+
+    start = time.monotonic()
+    rankings = []
+    for ranked in search.stream(emotion, lang, artist, k=10):
+        rankings.append((time.monotonic() - start, [t.video_id for t in ranked]))
+
+    first_at, first = rankings[0]
+    assert first == ["0-0", "0-1", "0-2"]
+    assert first_at < 0.15
+    assert len(rankings) >= 2
+    final = rankings[-1][1]
+    assert len(final) == 10 and len(set(final)) == 10
+    assert base in backend.queries
+    assert search.stats()["ok"] == len(variants)
+    search.close()
+
+
+def test_slow_variant_times_out_without_blocking():
+    lang, emotion, artist = "English", "sad", "Adele"
+    variants = query_variants(lang, emotion, artist)
+    slow = variants[-1].text
+    results = {v.text: [f"{i}"] for i, v in enumerate(variants)}
+    backend = LocalBackend(results, latency=0.01, latencies={slow: 1.0})
+    search = make_search(backend, timeout=0.2)
+
+    start = time.monotonic()
+    final = search.search(emotion, lang, artist, k=10)
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 0.6
+    assert len(final) == len(variants) - 1
+    assert str(len(variants) - 1) not in {t.video_id for t in final}
+    assert search.stats()["timeout"] == 1
+    # La requête abandonnée se termine en arrière-plan et reste en cache
+    time.sleep(1.0)
+    assert search.cache.contains(lang, emotion, variants[-1].artist, variants[-1].term)
+    search.close()
+
+
+def test_errors_and_empty_results():
+    lang, emotion, artist = "English", "angry", ""
+    variants = query_variants(lang, emotion, artist)
+    failing = variants[1].text
+
+    def backend(query):
+        if query == failing:
+            raise ConnectionError("réseau indisponible")
+        return [Track("only", query)] if query == build_query(lang, emotion, artist) else []
+
+    search = make_search(backend)
+    assert [t.video_id for t in search.search(emotion, lang, artist)] == ["only"]
+    stats = search.stats()
+    assert stats["error"] == 1 and stats["ok"] == 1 and stats["empty"] == len(variants) - 2
+    search.close()
+
+
+def test_stream_without_results_yields_empty_list():
+    search = make_search(LocalBackend({}))
+    assert list(search.stream("neutral", "English", "Nobody")) == [[]]
+    search.close()
+
+
+def test_prefetch_warms_every_variant():
+    lang, artist = "Spanish", "Shakira"
+    emotions = ["happy", "sad"]
+    backend = LocalBackend({}, latency=0.0)
+    search = make_search(backend)
+    for future in search.prefetch(lang, artist, emotions):
+        future.result(timeout=5)
+    expected = {v.text for emotion in emotions for v in query_variants(lang, emotion, artist)}
+    assert set(backend.queries) == expected
+    search.close()
@@ -0,0 +1,108 @@
+"""
+Construction et entraînement du classifieur dense (Keras)
+
+Partagé par `data_training.py` (entraînement du modèle de l'application),
+`hyperparam_search.py` (recherche d'hyperparamètres) et `registry.py`
+(ajout incrémental d'une classe) :
+- `build_model` : réseau Input -> Dense ReLU x N -> softmax ;
+- `fit_model`   : entraînement par lots mélangés (`batch_generator`), avec
+  validation sur des lignes mises de côté, arrêt anticipé sur la précision
+  de validation et sauvegarde des meilleurs poids (checkpoint) à chaque
+  amélioration ; un entraînement interrompu reprend depuis ce checkpoint ;
+- `warm_start`  : part des poids d'un modèle existant (entraînement
+  incrémental, voir `registry.extend`).
+
+Keras n'est importé qu'à l'appel de ces fonctions.
+"""
+
+import os
+
+import numpy as np
+
+from data_loader import batch_generator, steps_per_epoch
+
+DEFAULT_LAYERS = (512, 256)
+DEFAULT_OPTIMIZER = "rmsprop"
+# Suffixe imposé par Keras 3 pour les checkpoints de poids seuls
+CHECKPOINT_PATH = "checkpoint.weights.h5"
+
+
+def build_model(input_dim, n_classes, layers=DEFAULT_LAYERS, optimizer=DEFAULT_OPTIMIZER,
+                learning_rate=None):
+    import keras
+    from keras.layers import Dense, Input
+    from keras.models import Model
+
+    ip = Input(shape=(input_dim,))
+    m = ip
+    # Couches cachées avec activation ReLU
+    for units in layers:
+        m = Dense(units, activation="relu")(m)
+    # Couche de sortie avec softmax (classification multi-classe)
+    op = Dense(n_classes, activation="softmax")(m)
+    model = Model(inputs=ip, outputs=op)
+
+    if learning_rate is not None:
+        optimizer = keras.optimizers.get({"class_name": optimizer, "config": {"learning_rate": learning_rate}})
+    model.compile(optimizer=optimizer, loss="categorical_crossentropy", metrics=["acc"])
+    return model
+
+
+def fit_model(model, X, y, n_classes, train=None, val=None, epochs=50, batch_size=32,
+              patience=None, checkpoint=None, resume=False, verbose=1):
+    """
+    Entraîne `model` sur les lignes `train` de X ; retourne l'historique Keras.
+
+    Avec `val`, la précision de validation est suivie à chaque époque :
+    `patience` arrête l'entraînement après autant d'époques sans progrès
+    (en restaurant les meilleurs poids) et `checkpoint` reçoit les meilleurs
+    poids. Sans `val`, `checkpoint` reçoit les poids de chaque époque.
+    """
+    from keras.callbacks import EarlyStopping, ModelCheckpoint
+
+    train = np.arange(len(X)) if train is None else np.asarray(train)
+    callbacks = []
+    validation = None
+    if val is not None and len(val):
+        val = np.sort(val)
+        validation = (np.asarray(X[val], dtype=np.float32), np.eye(n_classes, dtype=np.float32)[y[val]])
+        if patience:
+            callbacks.append(EarlyStopping(monitor="val_acc", mode="max", patience=patience,
+                                           restore_best_weights=True))
+        if checkpoint:
+            callbacks.append(ModelCheckpoint(checkpoint, monitor="val_acc", mode="max",
+                                             save_best_only=True, save_weights_only=True))
+    elif checkpoint:
+        callbacks.append(ModelCheckpoint(checkpoint, save_weights_only=True))
+
+    if resume and checkpoint and os.path.exists(checkpoint):
+        model.load_weights(checkpoint)
+
+    batches = batch_generator(X, y, n_classes, batch_size=batch_size, indices=train)
+    try:
+        history = model.fit(
+            batches, steps_per_epoch=steps_per_epoch(len(train), batch_size), epochs=epochs,
+            validation_data=validation, callbacks=callbacks, verbose=verbose,
+        )
+    finally:
+        batches.close()
+    return history.history
+
+
+def warm_start(model, weights, biases):
+    """
+    Initialise les couches Dense de `model` avec des poids existants.
+
+    Les blocs communs sont copiés ; les lignes ou colonnes en plus (nouvelle
+    classe en sortie, par exemple) gardent leur initialisation Keras.
+    """
+    layers = [layer for layer in model.layers if layer.get_weights()]
+    if len(layers) != len(weights):
+        raise ValueError(f"{len(weights)} couches à copier pour {len(layers)} couches Dense")
+    for layer, W, b in zip(layers, weights, biases):
+        W_new, b_new = layer.get_weights()
+        rows, cols = min(W.shape[0], W_new.shape[0]), min(W.shape[1], W_new.shape[1])
+        W_new[:rows, :cols] = W[:rows, :cols]
+        b_new[:cols] = b[:cols]
+        layer.set_weights([W_new, b_new])
+    return model